@@ -0,0 +1,60 @@
+"""
+Output sink benchmark.
+
+Converts copies of einstein.ttl once per sink and reports rows/sec and output size:
+a plain text file written row by row (the previous behaviour), the buffered sink
+without compression, and the buffered sink with gzip, bz2 and xz.
+
+Run from the repository root:
+    python -m benchmarks.bench_sink [--copies 5] [--sinks text buffered gzip bz2 xz]
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from ttl_converter import ExpansionCache, convert_and_write_to_file, split_by_sections
+from ttl_sink import COMPRESSION_SUFFIXES, open_sink
+
+SINKS = ('text', 'buffered', 'gzip', 'bz2', 'xz')
+
+
+def open_output(sink: str, directory: str):
+    if sink == 'text':
+        path = os.path.join(directory, 'output.txt')
+        return path, open(path, 'w', encoding='utf-8')
+    compression = None if sink == 'buffered' else sink
+    path = os.path.join(directory, 'output.txt' + COMPRESSION_SUFFIXES.get(compression, ''))
+    return path, open_sink(path, compression)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='einstein.ttl', help='Base TTL document to replicate')
+    parser.add_argument('--copies', type=int, default=5, help='Copies of the document to convert')
+    parser.add_argument('--sinks', nargs='+', choices=SINKS, default=list(SINKS), help='Sinks to compare')
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as input_file:
+        base_text = input_file.read()
+    sections, _ = split_by_sections(base_text, {})
+    subjects = list(sections) * args.copies
+    rows_out = io.StringIO()
+    convert_and_write_to_file(sections, rows_out, subjects)
+    rows = rows_out.getvalue().count('\n')
+
+    print(f"{'sink':>9} {'rows':>9} {'seconds':>8} {'rows/s':>10} {'MB out':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for sink in args.sinks:
+            path, output_file = open_output(sink, directory)
+            start_time = time.perf_counter()
+            with output_file:
+                convert_and_write_to_file(sections, output_file, subjects, cache=ExpansionCache())
+            elapsed = time.perf_counter() - start_time
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{sink:>9} {rows:>9} {elapsed:8.3f} {rows / elapsed:10.0f} {size_mb:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
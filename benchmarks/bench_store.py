@@ -0,0 +1,34 @@
+"""
+Memory per triple of the interned TripleStore against the Dict[str, List[List[str]]]
+sections built by split_by_sections.
+
+Run from the repository root:
+    python -m benchmarks.bench_store [--input einstein.ttl]
+"""
+import argparse
+import io
+
+from ttl_converter import load_store, split_by_sections
+from ttl_store import sections_memory_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='einstein.ttl', help='TTL document to load')
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as input_file:
+        ttl_text = input_file.read()
+
+    dictionary_of_sections = {}
+    sections, _ = split_by_sections(ttl_text, dictionary_of_sections)
+    sections.update(dictionary_of_sections)
+    store, _ = load_store(io.StringIO(ttl_text))
+
+    print(f"{'structure':>10} {'triples':>8} {'bytes':>10} {'bytes/triple':>13}")
+    for name, report in (('dict', sections_memory_report(sections)), ('store', store.memory_report())):
+        print(f"{name:>10} {report['triples']:>8} {report['total_bytes']:>10} {report['bytes_per_triple']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
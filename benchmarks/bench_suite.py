@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark suite.
+
+Generates synthetic Wikidata-like dumps of increasing size (benchmarks.generate_ttl)
+and converts each one with the command line converter (default, --stream and
+--workers) and through the /convert endpoint of both API servers. Every run is a
+fresh process, so the peak RSS reported is that run's own; seconds cover the
+conversion only, not interpreter start-up or server set-up.
+
+For each target and size it reports seconds, input MB/s, output rows/s and peak
+RSS, then how each target scales from the smallest to the largest size: a
+throughput ratio near 1 means time grows linearly with the input, and a ratio
+below --min-scaling is flagged as super-linear.
+
+--save writes the results as a baseline; --baseline compares against one and
+flags a target whose throughput dropped by more than --max-slowdown or whose
+peak RSS grew by more than --max-rss-growth. Flagged regressions make the exit
+status 1, so the suite can gate a change.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--entities 100 1000 5000] [--targets cli cli-stream api api-mp]
+        [--repeat 1] [--save baseline.json] [--baseline baseline.json]
+        [--max-slowdown 0.2] [--max-rss-growth 0.25] [--min-scaling 0.5]
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+from benchmarks.generate_ttl import write_ttl
+
+# Command line options of each converter target
+CLI_TARGETS = {
+    'cli': [],
+    'cli-stream': ['--stream'],
+    'cli-workers': ['--workers', str(os.cpu_count() or 2)],
+}
+
+# Server module of each API target
+API_TARGETS = {
+    'api': 'ttl_converter_ftp_api',
+    'api-mp': 'ttl_converter_ftp_api_multiprocessed',
+}
+
+TARGETS = tuple(CLI_TARGETS) + tuple(API_TARGETS)
+
+
+def count_lines(path: str) -> int:
+    with open(path, 'rb') as output_file:
+        return sum(block.count(b'\n') for block in iter(lambda: output_file.read(1 << 20), b''))
+
+
+def run_target(target: str, input_path: str, directory: str) -> Dict:
+    """
+    Convert the input with one target in this process; called in the child process.
+    """
+    if target in CLI_TARGETS:
+        import ttl_converter
+        output_path = os.path.join(directory, 'output.txt')
+        sys.argv = ['ttl_converter.py', input_path, '-o', output_path] + CLI_TARGETS[target]
+        with redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            ttl_converter.main()
+            seconds = time.perf_counter() - start_time
+        return {'seconds': seconds, 'rows': count_lines(output_path)}
+
+    # The servers read these on import; a fresh cache makes every request a miss
+    os.environ['TTL_CACHE_DIR'] = os.path.join(directory, 'cache')
+    os.environ['TTL_JOBS_DIR'] = os.path.join(directory, 'jobs')
+    from fastapi.testclient import TestClient
+    server = importlib.import_module(API_TARGETS[target])
+    with TestClient(server.app) as client, open(input_path, 'rb') as input_file:
+        start_time = time.perf_counter()
+        response = client.post('/convert', files={'file': (os.path.basename(input_path), input_file)})
+        seconds = time.perf_counter() - start_time
+    response.raise_for_status()
+    return {'seconds': seconds, 'rows': response.content.count(b'\n')}
+
+
+def measure(target: str, input_path: str) -> Dict:
+    """
+    Run one target in a child process and return its timing, output rows and peak RSS in bytes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_suite', '--child', target, input_path, directory],
+            stdout=subprocess.PIPE
+        )
+        output = process.stdout.read()
+        process.stdout.close()
+        # wait4 returns the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{target} failed on {input_path} with exit status {process.returncode}")
+    result = json.loads(output)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    result['peak_rss'] = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return result
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], max_slowdown: float,
+            max_rss_growth: float) -> List[str]:
+    """
+    Regressions of the results against a baseline, one message each.
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        throughput = result['mb_per_second'] / previous['mb_per_second']
+        if throughput < 1 - max_slowdown:
+            regressions.append(f"{key}: throughput {result['mb_per_second']:.2f} MB/s is "
+                               f"{(1 - throughput) * 100:.0f}% below the baseline's {previous['mb_per_second']:.2f}")
+        rss = result['peak_rss'] / previous['peak_rss']
+        if rss > 1 + max_rss_growth:
+            regressions.append(f"{key}: peak RSS {result['peak_rss'] / 1e6:.1f} MB is "
+                               f"{(rss - 1) * 100:.0f}% above the baseline's {previous['peak_rss'] / 1e6:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='Sizes of the generated dumps, in items')
+    parser.add_argument('--statements', type=int, default=20, help='Statements per item')
+    parser.add_argument('--qualifiers', type=int, default=2, help='Qualifiers per statement')
+    parser.add_argument('--references', type=int, default=1, help='References per statement')
+    parser.add_argument('--nesting', type=int, default=2, help='Blank-node nesting depth')
+    parser.add_argument('--tricky', type=float, default=0.1, help='Share of tricky literals')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the generator')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS), help='Converters to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per target and size; the fastest is kept')
+    parser.add_argument('--save', help='Write the results to this baseline file')
+    parser.add_argument('--baseline', help='Compare the results with this baseline file')
+    parser.add_argument('--max-slowdown', type=float, default=0.2,
+                        help='Flag a throughput drop larger than this fraction of the baseline')
+    parser.add_argument('--max-rss-growth', type=float, default=0.25,
+                        help='Flag peak RSS growth larger than this fraction of the baseline')
+    parser.add_argument('--min-scaling', type=float, default=0.5,
+                        help='Flag a target whose throughput at the largest size falls below this fraction '
+                             'of its throughput at the smallest')
+    parser.add_argument('--child', nargs=3, metavar=('TARGET', 'INPUT', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_target(*args.child)))
+        return
+
+    options = dict(statements=args.statements, qualifiers=args.qualifiers, references=args.references,
+                   nesting=args.nesting, tricky=args.tricky, seed=args.seed)
+    sizes = sorted(set(args.entities))
+    results = {}
+    print(f"{'target':>12} {'entities':>9} {'MB in':>8} {'seconds':>8} {'MB/s':>7} {'rows/s':>10} {'RSS MB':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for entities in sizes:
+            input_path = os.path.join(directory, f'synthetic-{entities}.ttl')
+            with open(input_path, 'w', encoding='utf-8') as input_file:
+                write_ttl(input_file, entities, **options)
+            size_mb = os.path.getsize(input_path) / 1e6
+            for target in args.targets:
+                runs = [measure(target, input_path) for _ in range(args.repeat)]
+                best = min(runs, key=lambda run: run['seconds'])
+                result = {
+                    'target': target,
+                    'entities': entities,
+                    'input_mb': size_mb,
+                    'seconds': best['seconds'],
+                    'rows': best['rows'],
+                    'mb_per_second': size_mb / best['seconds'],
+                    'peak_rss': min(run['peak_rss'] for run in runs),
+                }
+                results[f'{target}/{entities}'] = result
+                print(f"{target:>12} {entities:>9} {size_mb:8.2f} {result['seconds']:8.3f} "
+                      f"{result['mb_per_second']:7.2f} {result['rows'] / result['seconds']:10.0f} "
+                      f"{result['peak_rss'] / 1e6:7.1f}")
+
+    regressions = []
+    if len(sizes) > 1:
+        smallest, largest = sizes[0], sizes[-1]
+        print(f"\nScaling from {smallest} to {largest} entities:")
+        print(f"{'target':>12} {'throughput':>11} {'peak RSS':>9}")
+        for target in args.targets:
+            first, last = results[f'{target}/{smallest}'], results[f'{target}/{largest}']
+            throughput = last['mb_per_second'] / first['mb_per_second']
+            rss = last['peak_rss'] / first['peak_rss']
+            print(f"{target:>12} {throughput:10.2f}x {rss:8.2f}x")
+            if throughput < args.min_scaling:
+                regressions.append(f"{target}: throughput at {largest} entities is {throughput:.2f}x "
+                                   f"the throughput at {smallest}, time grows faster than the input")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['options'] != options:
+            print(f"\nWarning: the baseline was generated with {baseline['options']}")
+        regressions += compare(results, baseline['results'], args.max_slowdown, args.max_rss_growth)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as save_file:
+            json.dump({'options': options, 'results': results}, save_file, indent=2)
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Tokenizer scaling benchmark.
+
+Parses 1x, 10x and 100x copies of einstein.ttl with the single-pass tokenizer and
+reports throughput per size; linear scaling shows up as a flat MB/s column. The
+regex splitters the tokenizer replaced are kept here for comparison on the small
+sizes only, since they are quadratic in the document length.
+
+Run from the repository root:
+    python -m benchmarks.bench_tokenizer [--copies 1 10 100] [--legacy-max 2]
+"""
+import argparse
+import re
+import time
+
+from ttl_tokenizer import tokenize
+
+
+def legacy_split(text: str) -> int:
+    """
+    The previous preprocess + split_by_sections pipeline, without bracket handling.
+    """
+    text = re.sub(
+        r'\s+|([;,])(?!\s)|(?<=[^;\s])\s*\.',
+        lambda m: ' ' if m.group(0).isspace() else f'{m.group(1)} ' if m.group(1) else '.',
+        text
+    ).rstrip(' .')
+    statements = 0
+    for section in re.split(r'\.\s+(?=(?:[^"]*"[^"]*")*[^"]*$)', text):
+        for statement in re.split(r';\s*(?=(?:[^"]*"[^"]*")*[^"]*$)', section):
+            re.findall(r'"(?:\\.|[^"\\])*"[^\s]*|"(?:\\.|[^"\\])*"|[^\s"]+', statement)
+            statements += 1
+    return statements
+
+
+def time_call(function, text: str) -> float:
+    start_time = time.perf_counter()
+    function(text)
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='einstein.ttl', help='Base TTL document to replicate')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 10, 100], help='Replication factors')
+    parser.add_argument('--legacy-max', type=int, default=2, help='Largest factor to run the regex splitters on')
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as input_file:
+        base_text = input_file.read()
+
+    print(f"{'copies':>6} {'MB':>8} {'tokenizer s':>12} {'MB/s':>8} {'legacy s':>10}")
+    for copies in args.copies:
+        text = "\n".join([base_text] * copies)
+        size_mb = len(text.encode('utf-8')) / 1e6
+        elapsed = time_call(tokenize, text)
+        legacy = f"{time_call(legacy_split, text):10.2f}" if copies <= args.legacy_max else f"{'-':>10}"
+        print(f"{copies:>6} {size_mb:8.1f} {elapsed:12.3f} {size_mb / elapsed:8.1f} {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Synthetic Wikidata-like TTL generator.
+
+Writes entities shaped like the Wikidata RDF dump: each item has labels,
+descriptions, direct claims and one statement node per claim, followed by the
+statement nodes with their qualifiers, the reference and value nodes they point
+to (references are shared between statements, as in the dump, and written once),
+and a `wdno:` class per property holding a chain of nested blank nodes.
+A share of the literals is tricky for a tokenizer: embedded escaped quotes,
+`;` and `.` inside strings, single-quoted and multi-line long strings.
+
+Output is deterministic for a given seed; an output name ending in .gz, .bz2 or
+.xz is compressed.
+
+Run from the repository root:
+    python -m benchmarks.generate_ttl -o synthetic.ttl [--entities 1000] [--statements 20]
+        [--qualifiers 2] [--references 1] [--nesting 2] [--tricky 0.1] [--seed 0]
+"""
+import argparse
+import hashlib
+import random
+import sys
+from typing import Iterator, List, TextIO
+
+from ttl_sink import compression_for_path, open_sink
+
+PREFIXES = (
+    ('wd', 'http://www.wikidata.org/entity/'),
+    ('wdt', 'http://www.wikidata.org/prop/direct/'),
+    ('wdno', 'http://www.wikidata.org/prop/novalue/'),
+    ('p', 'http://www.wikidata.org/prop/'),
+    ('ps', 'http://www.wikidata.org/prop/statement/'),
+    ('psv', 'http://www.wikidata.org/prop/statement/value/'),
+    ('pq', 'http://www.wikidata.org/prop/qualifier/'),
+    ('pqv', 'http://www.wikidata.org/prop/qualifier/value/'),
+    ('pr', 'http://www.wikidata.org/prop/reference/'),
+    ('prv', 'http://www.wikidata.org/prop/reference/value/'),
+    ('s', 'http://www.wikidata.org/entity/statement/'),
+    ('ref', 'http://www.wikidata.org/reference/'),
+    ('v', 'http://www.wikidata.org/value/'),
+    ('prov', 'http://www.w3.org/ns/prov#'),
+    ('rdfs', 'http://www.w3.org/2000/01/rdf-schema#'),
+    ('schema1', 'http://schema.org/'),
+    ('skos', 'http://www.w3.org/2004/02/skos/core#'),
+    ('owl', 'http://www.w3.org/2002/07/owl#'),
+    ('wikibase', 'http://wikiba.se/ontology#'),
+    ('xsd', 'http://www.w3.org/2001/XMLSchema#'),
+)
+
+LANGUAGES = ('en', 'de', 'fr', 'es', 'ru', 'ja', 'ar', 'zh-hans')
+WORDS = ('theory', 'physicist', 'relativity', 'river', 'city', 'album', 'painting', 'protein',
+         'galaxy', 'novel', 'bridge', 'election', 'species', 'mountain', 'university', 'film')
+TRICKY_LITERALS = (
+    '"He said \\"stop; go.\\" and left."',
+    '"ends with a period."',
+    '"a; b; c"',
+    '"#not a comment . ; ,"',
+    "'single quoted; with. punctuation'",
+    '"""multi-line\nlong string; with. text"""',
+    '"Entity[\\"Person\\", \\"X::1\\"]"',
+    '"ünïcödé — 日本語; ٣."',
+)
+
+# Number of distinct properties claims are drawn from
+PROPERTY_COUNT = 400
+
+# Share of references taken from those already written instead of new ones
+REFERENCE_REUSE = 0.3
+
+
+def node_hash(*parts) -> str:
+    return hashlib.sha1(':'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+
+class Generator:
+    """
+    Generates the entities of one synthetic dump from a seeded random source.
+    """
+
+    def __init__(self, statements: int = 20, qualifiers: int = 2, references: int = 1, nesting: int = 2,
+                 tricky: float = 0.1, seed: int = 0):
+        self.statements = statements
+        self.qualifiers = qualifiers
+        self.references = references
+        self.nesting = nesting
+        self.tricky = tricky
+        self.random = random.Random(seed)
+        self.written_references: List[str] = []
+
+    def literal(self) -> str:
+        if self.random.random() < self.tricky:
+            return self.random.choice(TRICKY_LITERALS)
+        words = self.random.sample(WORDS, 3)
+        return f'"{" ".join(words)}"'
+
+    def date(self) -> str:
+        return f'"{self.random.randint(1000, 2024)}-{self.random.randint(1, 12):02d}-01T00:00:00Z"^^xsd:dateTime'
+
+    def value(self, number: int, lines: List[str]) -> str:
+        """
+        Append a time value node and return its name.
+        """
+        name = f'v:{node_hash("value", number, self.random.random())}'
+        lines.append(f'{name} a wikibase:TimeValue ;\n'
+                     f'    wikibase:timeValue {self.date()} ;\n'
+                     f'    wikibase:timePrecision 11 ;\n'
+                     f'    wikibase:timeCalendarModel wd:Q1985727 .\n')
+        return name
+
+    def reference(self, number: int, lines: List[str]) -> str:
+        """
+        Return a reference, appending its node (and its value) unless it was already written.
+        """
+        if self.written_references and self.random.random() < REFERENCE_REUSE:
+            return self.random.choice(self.written_references)
+        name = f'ref:{node_hash("reference", number, len(self.written_references))}'
+        value_lines: List[str] = []
+        value = self.value(number, value_lines)
+        lines.append(f'{name} a wikibase:Reference ;\n'
+                     f'    pr:P248 wd:Q{self.random.randint(1, 10 ** 7)} ;\n'
+                     f'    pr:P813 {self.date()} ;\n'
+                     f'    prv:P813 {value} .\n')
+        lines.extend(value_lines)
+        self.written_references.append(name)
+        return name
+
+    def entity(self, number: int) -> str:
+        """
+        The TTL of one item, its statement nodes and the nodes they reference.
+        """
+        rand = self.random
+        item = f'wd:Q{number}'
+        labels = ',\n        '.join(f'{self.literal()}@{language}' for language in rand.sample(LANGUAGES, 3))
+        claims = []
+        statement_lines: List[str] = []
+        node_lines: List[str] = []
+        for claim in range(self.statements):
+            prop = f'P{rand.randint(1, PROPERTY_COUNT)}'
+            kind = rand.random()
+            if kind < 0.5:
+                obj = f'wd:Q{rand.randint(1, 10 ** 7)}'
+            elif kind < 0.8:
+                obj = self.literal()
+            else:
+                obj = self.date()
+            statement = f's:Q{number}-{node_hash(number, claim)[:32]}'
+            claims.append(f'    wdt:{prop} {obj} ;\n    p:{prop} {statement}')
+
+            parts = [f'{statement} a wikibase:BestRank,\n        wikibase:Statement',
+                     '    wikibase:rank wikibase:NormalRank',
+                     f'    ps:{prop} {obj}']
+            if obj.endswith('xsd:dateTime'):
+                parts.append(f'    psv:{prop} {self.value(number, node_lines)}')
+            for _ in range(self.qualifiers):
+                qualifier = f'P{rand.randint(1, PROPERTY_COUNT)}'
+                if rand.random() < 0.5:
+                    parts.append(f'    pq:{qualifier} {self.date()}')
+                    parts.append(f'    pqv:{qualifier} {self.value(number, node_lines)}')
+                else:
+                    parts.append(f'    pq:{qualifier} {self.literal()}')
+            for _ in range(self.references):
+                parts.append(f'    prov:wasDerivedFrom {self.reference(number, node_lines)}')
+            statement_lines.append(' ;\n'.join(parts) + ' .\n')
+
+        entity = (f'{item} a wikibase:Item ;\n'
+                  f'    rdfs:label {labels} ;\n'
+                  f'    schema1:description {self.literal()}@en ;\n'
+                  + ' ;\n'.join(claims) + ' .\n')
+        return entity + ''.join(statement_lines) + ''.join(node_lines)
+
+    def novalue_class(self, prop: str) -> str:
+        """
+        A `wdno:` class with nesting levels of blank nodes, as the dump writes them.
+        """
+        inner = 'owl:Thing'
+        for level in range(self.nesting):
+            inner = f'[ a owl:Restriction ;\n    owl:onProperty wdt:{prop} ;\n    owl:someValuesFrom {inner} ]'
+        return f'wdno:{prop} a owl:Class ;\n    owl:complementOf {inner} .\n'
+
+    def generate(self, entities: int) -> Iterator[str]:
+        yield ''.join(f'@prefix {prefix}: <{iri}> .\n' for prefix, iri in PREFIXES)
+        for number in range(1, entities + 1):
+            yield self.entity(number)
+        if self.nesting:
+            for prop in range(1, min(PROPERTY_COUNT, entities) + 1):
+                yield self.novalue_class(f'P{prop}')
+
+
+def write_ttl(output: TextIO, entities: int, **options):
+    for text in Generator(**options).generate(entities):
+        output.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='-', help='Output file, or - for standard output')
+    parser.add_argument('--entities', type=int, default=1000, help='Number of items')
+    parser.add_argument('--statements', type=int, default=20, help='Statements per item')
+    parser.add_argument('--qualifiers', type=int, default=2, help='Qualifiers per statement')
+    parser.add_argument('--references', type=int, default=1, help='References per statement')
+    parser.add_argument('--nesting', type=int, default=2, help='Blank-node nesting depth of the wdno: classes')
+    parser.add_argument('--tricky', type=float, default=0.1, help='Share of literals with embedded quotes, ; and .')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    options = dict(statements=args.statements, qualifiers=args.qualifiers, references=args.references,
+                   nesting=args.nesting, tricky=args.tricky, seed=args.seed)
+    if args.output == '-':
+        write_ttl(sys.stdout, args.entities, **options)
+    else:
+        with open_sink(args.output, compression_for_path(args.output)) as output:
+            write_ttl(output, args.entities, **options)
+
+
+if __name__ == "__main__":
+    main()
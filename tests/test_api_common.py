@@ -0,0 +1,35 @@
+import gzip
+
+from ttl_api_common import cache_options, converter, convert_member, filter_query
+from ttl_converter import split_by_sections
+
+TEXT = ("@prefix ex: <http://example.org/> .\n@prefix s: <http://example.org/statement/> .\n"
+        'ex:a ex:p s:n1 ; ex:q [ ex:r "x"@en ] .\ns:n1 ex:q "val" .\nex:a ex:p 2 .\n')
+
+
+def command_line_text(text):
+    sections = {}
+    converted, _ = split_by_sections(text, sections)
+    sections.update(converted)
+    return converter.convert_to_text(sections)
+
+
+def test_batch_member_converts_as_the_command_line():
+    assert convert_member(('a.ttl', TEXT.encode())) == ('a.ttl', command_line_text(TEXT), None)
+    assert convert_member(('a.ttl.gz', gzip.compress(TEXT.encode())))[1] == command_line_text(TEXT)
+
+
+def test_batch_member_errors_are_returned():
+    name, text, error = convert_member(('bad.ttl', b' '))
+    assert (name, text) == ('bad.ttl', '')
+    assert 'TTL text cannot be empty' in error
+    assert 'Unterminated string' in convert_member(('bad.ttl', b'ex:a ex:p "x .\n'))[2]
+
+
+def test_filter_query_and_cache_options():
+    assert filter_query([], [], [], [], [], []) is None
+    options = {'converter': 'test'}
+    assert cache_options(options, None) == options
+    triple_filter = filter_query([], [], ['ex:p'], [], ['en'], [])
+    assert cache_options(options, triple_filter) != options
+    assert cache_options(options, triple_filter) == cache_options(options, filter_query([], [], ['ex:p'], [], ['en'], []))
@@ -0,0 +1,25 @@
+import io
+
+from ttl_binary import BinaryOutput, BinaryOutputWriter
+
+TEXT = ('@prefix ex: <http://example.org/> .\n'
+        'ex:a <ex:p>[1] """line one\nline two\n\nline four"""@en\n'
+        'ex:a <ex:q|ex:r>[1,2] 5\n'
+        '@prefix ex2: <http://example.org/2/> .\n'
+        'ex:b <ex:p>[1] "short"\n')
+
+
+def test_multi_line_literal_round_trips_as_one_row(tmp_path):
+    path = str(tmp_path / 'out.bin')
+    with BinaryOutputWriter(path) as writer:
+        # Written in pieces that split lines, as the sinks do
+        for start in range(0, len(TEXT), 7):
+            writer.write(TEXT[start:start + 7])
+    with BinaryOutput(path) as output:
+        assert len(output) == 3
+        assert output.row(0) == ('ex:a', 'ex:p', '1', '"""line one\nline two\n\nline four"""@en')
+        assert output.row(1) == ('ex:a', 'ex:q|ex:r', '1,2', '5')
+        assert output.row(2) == ('ex:b', 'ex:p', '1', '"short"')
+        dumped = io.StringIO()
+        output.dump(dumped)
+    assert dumped.getvalue() == TEXT
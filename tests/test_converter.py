@@ -0,0 +1,120 @@
+import io
+
+from ttl_converter import Converter, StreamingConverter, load_store, parallel_convert, split_by_sections
+from ttl_filter import TripleFilter
+from ttl_tokenizer import TTLTokenizer
+
+PREFIXES = "@prefix ex: <http://example.org/> .\n@prefix s: <http://example.org/statement/> .\n"
+
+# Enough unrelated blocks to put the text around them in different shards
+PADDING = "".join(f"ex:pad{i} ex:p {i} .\n" for i in range(200))
+
+
+def default_rows(text):
+    sections = {}
+    converted, _ = split_by_sections(text, sections)
+    sections.update(converted)
+    return Converter().convert_to_text(sections).splitlines()
+
+
+def parallel_rows(text, workers=2):
+    buffer = io.StringIO()
+    parallel_convert(text, buffer, workers, Converter())
+    return [line for line in buffer.getvalue().splitlines() if not line.startswith('@')]
+
+
+def stream_rows(text):
+    buffer = io.StringIO()
+    Converter().stream(io.StringIO(text), buffer, chunk_size=64)
+    return [line for line in buffer.getvalue().splitlines() if not line.startswith('@')]
+
+
+def limited_stream_rows(text, max_shared_nodes):
+    converter = Converter()
+    buffer = io.StringIO()
+    streaming = StreamingConverter(lambda sections, subject: converter.convert(sections, buffer, [subject]),
+                                   max_shared_nodes=max_shared_nodes)
+    tokenizer = TTLTokenizer()
+    for block in tokenizer.feed(text) + tokenizer.close():
+        streaming.add_block(*block)
+    streaming.close()
+    return buffer.getvalue().splitlines()
+
+
+def compact_rows(text):
+    store, _ = load_store(io.StringIO(text), chunk_size=64)
+    return Converter().convert_to_text(store).splitlines()
+
+
+def test_statement_node_shared_across_shards():
+    text = (PREFIXES + 'ex:a ex:p s:n1 .\ns:n1 ex:q "val" .\n' + PADDING + 'ex:c ex:p s:n1 .\n')
+    rows = parallel_rows(text)
+    assert 'ex:a <ex:p|ex:q>[1,1] "val"' in rows
+    assert 'ex:c <ex:p|ex:q>[1,1] "val"' in rows
+    assert rows == default_rows(text)
+
+
+def test_repeated_subject_blocks_are_joined():
+    text = PREFIXES + 'ex:s ex:p 1 .\nex:t ex:p 2 .\nex:s ex:q 3 ; ex:p 4 .\n'
+    assert default_rows(text) == ['ex:s <ex:p>[1] 1', 'ex:s <ex:q>[1] 3', 'ex:s <ex:p>[1] 4', 'ex:t <ex:p>[1] 2']
+
+
+def test_repeated_subject_gives_the_same_rows_in_every_mode():
+    text = (PREFIXES + 'ex:s ex:p [ ex:b "first" ] ; ex:r s:n1 .\ns:n1 ex:q 1 .\n' + PADDING
+            + 'ex:s ex:p [ ex:b "second" ] ; ex:r 3 .\n')
+    expected = default_rows(text)
+    assert 'ex:s <ex:p|ex:b>[1,1] "first"' in expected
+    assert 'ex:s <ex:p|ex:b>[1,1] "second"' in expected
+    assert compact_rows(text) == expected
+    # Streaming and shards write each block where it appears, so only the order differs
+    assert sorted(stream_rows(text)) == sorted(expected)
+    assert sorted(parallel_rows(text)) == sorted(expected)
+
+
+def test_evicted_shared_nodes_are_read_back_when_streaming():
+    text = (PREFIXES + '@prefix v: <http://example.org/value/> .\n@prefix ref: <http://example.org/reference/> .\n'
+            'ex:e1 ex:p s:1 .\ns:1 ex:v v:a ; ex:ref ref:r .\nv:a ex:amount 5 .\nref:r ex:source "x" .\n'
+            'ex:e2 ex:p s:2 .\ns:2 ex:v v:b .\nv:b ex:amount 6 .\n'
+            'ex:e3 ex:p s:3 .\ns:3 ex:v v:a ; ex:ref ref:r .\n')
+    expected = default_rows(text)
+    assert 'ex:e3 <ex:p|ex:v|ex:amount>[1,1,1] 5' in expected
+    assert 'ex:e3 <ex:p|ex:ref|ex:source>[1,1,1] "x"' in expected
+    assert limited_stream_rows(text, max_shared_nodes=1) == expected
+    assert stream_rows(text) == expected
+
+
+def test_expansions_cut_at_a_cycle_are_not_reused():
+    text = (PREFIXES + 'ex:a ex:p s:1 .\nex:b ex:p s:2 .\n'
+            's:1 ex:q s:2 ; ex:u "one" .\ns:2 ex:r s:1 ; ex:t "leaf" .\n')
+    expected = default_rows(text)
+    assert 'ex:b <ex:p|ex:r|ex:u>[1,1,1] "one"' in expected
+    assert stream_rows(text) == expected
+
+
+def test_expansions_cut_at_the_depth_limit_are_not_reused():
+    text = (PREFIXES + 'ex:a ex:p s:1 .\nex:b ex:p s:3 .\n'
+            's:1 ex:q s:2 .\ns:2 ex:q s:3 .\ns:3 ex:q s:4 .\ns:4 ex:t "leaf" .\n')
+    sections = {}
+    converted, _ = split_by_sections(text, sections)
+    sections.update(converted)
+    converter = Converter(max_depth=3)
+    # Each subject on its own, so no expansion is shared between them
+    alone = [row for subject in ('ex:a', 'ex:b') for row in converter.convert_to_text(sections, [subject]).splitlines()]
+    assert 'ex:b <ex:p|ex:q|ex:t>[1,1,1] "leaf"' in alone
+    assert converter.convert_to_text(sections).splitlines() == alone
+
+
+def test_nodes_of_rejected_subjects_are_bounded_when_streaming():
+    text = PREFIXES + "".join(f'ex:e{i} ex:p s:{i} .\ns:{i} ex:q "{i}" .\n' for i in range(100))
+    triple_filter = TripleFilter(include_subjects=['ex:e1'], node_prefix=Converter().statement_prefix)
+    buffer = io.StringIO()
+    streaming = StreamingConverter(lambda sections, subject: Converter().convert(sections, buffer, [subject]),
+                                   max_shared_nodes=4)
+    tokenizer = TTLTokenizer(triple_filter=triple_filter)
+    sizes = []
+    for block in tokenizer.feed(text) + tokenizer.close():
+        streaming.add_block(*block)
+        sizes.append(len(streaming.nodes))
+    streaming.close()
+    assert max(sizes) <= 4
+    assert buffer.getvalue() == 'ex:e1 <ex:p|ex:q>[1,1] "1"\n'
@@ -0,0 +1,61 @@
+import io
+
+from ttl_converter import Converter, split_by_sections
+from ttl_incremental import IncrementalState, block_hash, convert_incremental, dirty_subjects
+
+PREFIXES = ("@prefix ex: <http://example.org/> .\n@prefix s: <http://example.org/statement/> .\n"
+            "@prefix v: <http://example.org/value/> .\n")
+
+FIRST = (PREFIXES
+         + 'ex:a ex:p s:1 .\ns:1 ex:v v:x .\nv:x ex:amount 5 .\n'
+         + 'ex:b ex:p s:2 .\ns:2 ex:v v:y .\nv:y ex:amount 6 .\n'
+         + 'ex:c ex:p "plain" .\n'
+         + 'ex:d ex:p s:3 , s:4 .\ns:3 ex:q "gone" .\ns:4 ex:q "kept" .\n')
+
+# v:x is edited and s:3 is removed
+SECOND = FIRST.replace('v:x ex:amount 5 .', 'v:x ex:amount 7 .').replace('s:3 ex:q "gone" .\n', '')
+
+
+def sections_of(text):
+    sections = {}
+    converted, _ = split_by_sections(text, sections)
+    sections.update(converted)
+    return sections
+
+
+def incremental_run(text, state_path, converter):
+    state = IncrementalState.load(state_path, converter.options())
+    buffer = io.StringIO()
+    convert_incremental(converter, sections_of(text), buffer, state)
+    state.save()
+    return buffer.getvalue(), state
+
+
+def test_incremental_run_matches_a_full_run(tmp_path):
+    converter = Converter()
+    state_path = str(tmp_path / 'state.json')
+    text, state = incremental_run(FIRST, state_path, converter)
+    assert text == converter.convert_to_text(sections_of(FIRST))
+    assert (state.converted, state.reused) == (4, 0)
+
+    text, state = incremental_run(SECOND, state_path, converter)
+    assert text == converter.convert_to_text(sections_of(SECOND))
+    assert 'ex:a <ex:p|ex:v|ex:amount>[1,1,1] 7' in text
+    assert 'gone' not in text
+    assert (state.converted, state.reused) == (2, 2)
+
+
+def test_only_subjects_reaching_a_change_are_dirty():
+    converter = Converter()
+    previous = {key: block_hash(statements) for key, statements in sections_of(FIRST).items()}
+    sections = sections_of(SECOND)
+    hashes = {key: block_hash(statements) for key, statements in sections.items()}
+    assert dirty_subjects(sections, hashes, previous, converter) == {'ex:a', 'ex:d'}
+    assert dirty_subjects(sections, hashes, hashes, converter) == set()
+
+
+def test_state_of_other_options_is_ignored(tmp_path):
+    state_path = str(tmp_path / 'state.json')
+    incremental_run(FIRST, state_path, Converter())
+    _, state = incremental_run(FIRST, state_path, Converter(max_depth=4))
+    assert (state.converted, state.reused) == (4, 0)
@@ -0,0 +1,19 @@
+import io
+
+from ttl_converter import Converter
+from ttl_index import IndexingSink, SubjectIndex
+from ttl_sink import open_sink
+
+TEXT = ('@prefix ex: <http://example.org/> .\n'
+        'ex:a ex:p """one\nsee <ex:b> for more""" ; ex:q 1 .\n'
+        'ex:b ex:p 2 .\n')
+
+
+def test_multi_line_literal_stays_in_its_subject(tmp_path):
+    output_path = str(tmp_path / 'out.txt')
+    with IndexingSink(open_sink(output_path), output_path + '.idx') as sink:
+        Converter().stream(io.StringIO(TEXT), sink)
+    with SubjectIndex(output_path) as index:
+        assert index.rows('ex:a') == 'ex:a <ex:p>[1] """one\nsee <ex:b> for more"""\nex:a <ex:q>[1] 1\n'
+        assert index.rows('ex:b') == 'ex:b <ex:p>[1] 2\n'
+        assert 'see' not in index
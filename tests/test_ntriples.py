@@ -0,0 +1,59 @@
+from ttl_converter import Converter, split_by_sections
+from ttl_filter import TripleFilter
+from ttl_ntriples import read_ntriples
+
+PREFIXES = {'ex': 'http://example.org/', 's': 'http://example.org/statement/'}
+
+# ex:a's triples are on the first and the last lines, so every split of the lines spreads it
+NTRIPLES = '''<http://example.org/a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/T> .
+<http://example.org/a> <http://example.org/p> <http://example.org/statement/1> .
+# a comment
+<http://example.org/b> <http://example.org/p> "x"@en .
+<http://example.org/b> <http://example.org/q> "y"@de .
+<http://example.org/statement/1> <http://example.org/v> "5"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<http://example.org/c> <http://example.org/p> "z" .
+<http://example.org/statement/2> <http://example.org/v> "2.5"^^<http://www.w3.org/2001/XMLSchema#decimal> .
+<http://example.org/a> <http://example.org/p> <http://example.org/statement/2> .
+'''
+
+TURTLE = '''@prefix ex: <http://example.org/> .
+@prefix s: <http://example.org/statement/> .
+ex:a a ex:T ; ex:p s:1 , s:2 .
+ex:b ex:p "x"@en ; ex:q "y"@de .
+s:1 ex:v 5 .
+ex:c ex:p "z" .
+s:2 ex:v 2.5 .
+'''
+
+
+def turtle_text(triple_filter=None):
+    sections = {}
+    converted, _ = split_by_sections(TURTLE, sections, triple_filter)
+    sections.update(converted)
+    return Converter().convert_to_text(sections)
+
+
+def ntriples_text(workers, triple_filter=None):
+    sections, _ = read_ntriples(NTRIPLES, workers, PREFIXES, triple_filter)
+    return Converter().convert_to_text(sections)
+
+
+def test_ntriples_convert_like_the_equivalent_turtle():
+    expected = turtle_text()
+    assert 'ex:a <ex:p|ex:v>[2,1] 2.5' in expected
+    for workers in (1, 2, 3):
+        assert ntriples_text(workers) == expected
+
+
+def test_filter_counts_a_subject_spread_over_workers_once():
+    def options():
+        return dict(exclude_subjects=['ex:a'], exclude_predicates=['ex:q'],
+                    exclude_languages=['en'], node_prefix=Converter().statement_prefix)
+
+    turtle_filter = TripleFilter(**options())
+    expected = turtle_text(turtle_filter)
+    assert turtle_filter.counts() == {'skipped_subjects': 1, 'skipped_statements': 1, 'skipped_literals': 1}
+    for workers in (1, 2, 3):
+        triple_filter = TripleFilter(**options())
+        assert ntriples_text(workers, triple_filter) == expected
+        assert triple_filter.counts() == turtle_filter.counts()
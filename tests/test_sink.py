@@ -0,0 +1,16 @@
+from ttl_sink import parse_row, row_subject
+
+
+def test_parse_row():
+    assert parse_row('wd:Q1 <p:P31|ps:P31>[1,2] wd:Q5') == ('wd:Q1', 'p:P31|ps:P31', '1,2', 'wd:Q5')
+    assert parse_row('<http://a> <<http://b>>[1] <http://c>') == ('<http://a>', '<http://b>', '1', '<http://c>')
+    assert parse_row('wd:Q1 <schema:description>[1] """two\nlines"""@en\n') == \
+        ('wd:Q1', 'schema:description', '1', '"""two\nlines"""@en\n')
+    assert parse_row('@prefix wd: <http://www.wikidata.org/entity/> .') is None
+
+
+def test_row_subject_skips_directives_and_continuation_lines():
+    assert row_subject('wd:Q1 <rdfs:label>[1] "x"@en\n') == 'wd:Q1'
+    assert row_subject('@prefix wd: <http://www.wikidata.org/entity/> .\n') is None
+    assert row_subject('see <this> too"""@en\n') is None
+    assert row_subject('\n') is None
@@ -0,0 +1,65 @@
+import random
+
+from ttl_sort import MAX_OPEN_RUNS, SortingSink, read_rows
+
+
+class Collector:
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def close(self):
+        self.closed = True
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+HEADER = '@prefix ex: <http://example.org/> .\n'
+
+
+def generated_rows(count=600):
+    shuffled = random.Random(7)
+    rows = []
+    for i in range(count):
+        subject = f'ex:s{shuffled.randrange(40):02d}'
+        obj = f'"""{i} first\nsecond <ex:x> line"""' if i % 50 == 0 else f'"{i}"'
+        rows.append(f'{subject} <ex:p{i % 3}>[1] {obj}\n')
+    return rows
+
+
+def sorted_text(key, memory_budget, rows, pieces=5):
+    collector = Collector()
+    sink = SortingSink(collector, key=key, memory_budget=memory_budget)
+    text = HEADER + ''.join(rows)
+    # Written in pieces that split lines, as the converter's buffered sinks do
+    for start in range(0, len(text), pieces):
+        sink.write(text[start:start + pieces])
+    sink.close()
+    assert collector.closed
+    return collector.text(), sink.runs_spilled
+
+
+def test_spilled_runs_merge_into_a_stable_sort():
+    rows = generated_rows()
+    text, runs_spilled = sorted_text('subject', 512, rows)
+    # More runs than can be open at once, so they are also merged in between
+    assert runs_spilled > MAX_OPEN_RUNS
+    assert text.startswith(HEADER)
+    written = list(read_rows(text[len(HEADER):].splitlines(keepends=True)))
+    # Python's sort is stable, so this is the order a stable external sort must give
+    assert written == sorted(rows, key=lambda row: row.partition(' ')[0])
+    assert sum('\nsecond <ex:x> line"""\n' in row for row in written) == len(rows) // 50
+
+
+def test_every_key_spilled_or_not_gives_the_same_output():
+    rows = generated_rows(200)
+    for key in ('subject', 'chain', 'object'):
+        in_memory, runs_spilled = sorted_text(key, 1 << 20, rows)
+        assert runs_spilled == 0
+        spilled, runs_spilled = sorted_text(key, 256, rows)
+        assert runs_spilled > 0
+        assert spilled == in_memory
@@ -0,0 +1,32 @@
+from ttl_converter import Converter
+from ttl_store import TripleStore
+
+
+class CountingStore(TripleStore):
+    def __init__(self):
+        super().__init__()
+        self.lookups = {}
+
+    def __getitem__(self, subject):
+        self.lookups[subject] = self.lookups.get(subject, 0) + 1
+        return super().__getitem__(subject)
+
+
+def test_expansion_looks_up_each_node_once():
+    store = CountingStore()
+    store.add('ex:a', [['ex:p', 's:1'], ['ex:q', 's:2']])
+    store.add('s:1', [[f'ex:p{i}', str(i)] for i in range(50)] + [['ex:r', 's:2']])
+    store.add('s:2', [['ex:v', '"x"'], ['ex:w', '1', '2']])
+    rows = Converter().convert_to_text(store).splitlines()
+    assert len(rows) == 50 + 3 + 3
+    assert 'ex:a <ex:p|ex:r|ex:w>[1,1,2] 2' in rows
+    assert store.lookups == {'ex:a': 1, 's:1': 1, 's:2': 1}
+
+
+def test_repeated_subject_keeps_every_block():
+    store = TripleStore()
+    store.add('ex:s', [['ex:p', '1']])
+    store.add('ex:t', [['ex:p', '2']])
+    store.add('ex:s', [['ex:q', '3', '4']])
+    assert store['ex:s'] == [['ex:p', '1'], ['ex:q', '3', '4']]
+    assert list(store) == ['ex:s', 'ex:t']
@@ -0,0 +1,117 @@
+import io
+
+import pytest
+
+from ttl_converter import Converter, parallel_convert
+from ttl_tokenizer import TTLSyntaxError, TTLTokenizer, find_block_boundaries, tokenize
+
+PREFIXES = "@prefix ex: <http://example.org/> .\n"
+
+# Enough unrelated blocks to put the text around them in different shards
+PADDING = "".join(f"ex:pad{i} ex:p {i} .\n" for i in range(200))
+
+
+def test_repeated_subject_blocks_get_distinct_blank_node_labels():
+    blocks, _ = tokenize(PREFIXES + 'ex:s ex:p [ ex:b "first" ] .\nex:s ex:p [ ex:b "second" ] .\n')
+    labels = [label for _, _, blank_nodes in blocks for label in blank_nodes]
+    assert len(labels) == 2
+    assert len(set(labels)) == 2
+
+
+def test_blank_node_labels_are_deterministic():
+    text = PREFIXES + 'ex:s ex:p [ ex:b [ ex:c 1 ] ] , [ ex:b 2 ] .\n[ ex:d 3 ] ex:p 4 .\n'
+    assert tokenize(text) == tokenize(text)
+
+
+def _parallel_rows(text, workers=2):
+    buffer = io.StringIO()
+    parallel_convert(text, buffer, workers, Converter())
+    return [line for line in buffer.getvalue().splitlines() if not line.startswith('@')]
+
+
+def test_repeated_subject_keeps_blank_nodes_within_a_shard():
+    text = PREFIXES + 'ex:s ex:p [ ex:b "first" ] .\nex:s ex:p [ ex:b "second" ] .\n' + PADDING
+    rows = _parallel_rows(text)
+    assert 'ex:s <ex:p|ex:b>[1,1] "first"' in rows
+    assert 'ex:s <ex:p|ex:b>[1,1] "second"' in rows
+
+
+def test_repeated_subject_keeps_blank_nodes_across_shards():
+    text = PREFIXES + 'ex:s ex:p [ ex:b "first" ] .\n' + PADDING + 'ex:s ex:p [ ex:b "second" ] .\n'
+    rows = _parallel_rows(text)
+    assert 'ex:s <ex:p|ex:b>[1,1] "first"' in rows
+    assert 'ex:s <ex:p|ex:b>[1,1] "second"' in rows
+
+
+def test_block_boundaries_skip_periods_inside_long_strings():
+    long_block = 'ex:l ex:p """inside .\nex:fake ex:p 1 .\nstill inside""" .\n'
+    text = PREFIXES + PADDING + long_block * 20 + PADDING
+    boundaries = find_block_boundaries(text, 8)
+    assert boundaries
+    for boundary in boundaries:
+        assert text[:boundary].count('"""') % 2 == 0
+
+
+# Line, column and byte offset of each error in its text; ü is two bytes
+ERRORS = [
+    ('ex:ü ex:p <http://example.org/x y> .\n', "Unexpected character '<'", 1, 11, 11),
+    ('ex:ü ex:p "open .\n', "Unterminated string", 1, 11, 11),
+    ('ex:ü ex:p """open .\n', "Unterminated string", 1, 11, 11),
+    ('ex:ü ex:p ] .\n', "Unbalanced ']' outside of a blank node", 1, 11, 11),
+    ('ex:ü ex:p [ ex:q 1 .\n', "Period inside a blank node", 1, 20, 20),
+    ('ex:ü ex:p [ ex:q [ ex:r 1 ] ;\n  ex:s 2\n', "Unbalanced '[': blank node is never closed", 1, 11, 11),
+]
+
+
+def _error(callable_, *args):
+    with pytest.raises(TTLSyntaxError) as raised:
+        callable_(*args)
+    error = raised.value
+    return error.message, error.line, error.column, error.offset
+
+
+def _fed_in_pieces(text, size=3):
+    tokenizer = TTLTokenizer()
+    for start in range(0, len(text), size):
+        tokenizer.feed(text[start:start + size])
+    tokenizer.close()
+
+
+def _located_after(before, message, line, column, offset):
+    return message, line + before.count('\n'), column, offset + len(before.encode('utf-8'))
+
+
+def test_errors_are_located_at_their_cause():
+    before = PREFIXES + 'ex:é ex:p "ü" .\n'
+    for text, *location in ERRORS:
+        expected = _located_after(before, *location)
+        assert _error(tokenize, before + text) == expected
+        assert _error(_fed_in_pieces, before + text) == expected
+
+
+def test_errors_in_a_later_shard_are_located_in_the_whole_text():
+    before = PREFIXES + 'ex:é ex:p "ü" .\n' + PADDING
+    for text, *location in ERRORS:
+        assert _error(_parallel_rows, before + text, 4) == _located_after(before, *location)
+
+
+def test_tracked_subjects_are_bounded():
+    blocks = ''.join(f'ex:s{i} ex:p [ ex:b {i} ] .\n' for i in range(10)) + 'ex:s0 ex:p [ ex:b 10 ] .\n'
+    bounded = TTLTokenizer(max_tracked_subjects=4)
+    labels = [label for _, _, blank_nodes in bounded.feed(PREFIXES + blocks) for label in blank_nodes]
+    assert len(bounded._occurrences) == 4
+    # ex:s0 was forgotten, so its second block is numbered as its first was
+    assert labels[0] == labels[-1] == 'blank-node:ex:s0-1-1'
+    blocks, _ = tokenize(PREFIXES + blocks)
+    assert list(blocks[-1][2]) == ['blank-node:ex:s0-2-1']
+
+
+def test_streamed_subject_repeated_after_the_tracked_ones_keeps_both_blocks():
+    # More blocks between the repeats than the streaming converter lets wait
+    padding = ''.join(f'ex:pad{i} ex:p [ ex:b {i} ] .\n' for i in range(10002))
+    text = PREFIXES + 'ex:s ex:p [ ex:b "first" ] .\n' + padding + 'ex:s ex:p [ ex:b "second" ] .\n'
+    streamed = io.StringIO()
+    Converter().stream(io.StringIO(text), streamed)
+    rows = streamed.getvalue().splitlines()
+    assert 'ex:s <ex:p|ex:b>[1,1] "first"' in rows
+    assert 'ex:s <ex:p|ex:b>[1,1] "second"' in rows
@@ -0,0 +1,157 @@
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import Query
+from pydantic import BaseModel, field_validator
+
+from ttl_batch import Result, decode_member, write_batch
+from ttl_converter import MAX_CHAIN_DEPTH, STATEMENT_PREFIX, Converter, ExpansionCache, split_by_sections
+from ttl_filter import TripleFilter
+
+
+class TTLInput(BaseModel):
+    ttl_text: str
+
+    @field_validator('ttl_text')
+    @classmethod
+    def validate_ttl_text(cls, v: str) -> str:
+        # The syntax is checked by the tokenizer, which reports where the input goes wrong
+        # isspace() rather than strip(), which would copy the whole upload
+        if not v or v.isspace():
+            raise ValueError('TTL text cannot be empty')
+        return v
+
+
+# The command line's statement prefixes and depth, so both servers write its rows.
+# The converter holds only configuration, so concurrent requests and pool workers share it safely
+converter = Converter(STATEMENT_PREFIX, max_depth=MAX_CHAIN_DEPTH)
+
+
+def parse_sections(ttl_text: str, triple_filter: Optional[TripleFilter] = None) -> Dict:
+    """
+    Split the Turtle text into the sections the converter takes, with the command line's split_by_sections.
+
+    Args:
+    ttl_text (str): The input Turtle format text.
+    triple_filter (TripleFilter, optional): Leaves out the subjects, statements and literals it rejects.
+
+    Returns:
+    Dict: A dictionary with subjects and blank-node labels as keys and lists of statement parts as values.
+    """
+    sections = {}
+    subjects, _ = split_by_sections(ttl_text, sections, triple_filter)
+    sections.update(subjects)
+    return sections
+
+
+def filter_query(include_subject: List[str] = Query([]), exclude_subject: List[str] = Query([]),
+                 include_predicate: List[str] = Query([]), exclude_predicate: List[str] = Query([]),
+                 include_language: List[str] = Query([]), exclude_language: List[str] = Query([])
+                 ) -> Optional[TripleFilter]:
+    """
+    The filter the /convert query parameters ask for, as a FastAPI dependency.
+
+    Args:
+    include_subject, exclude_subject (List[str]): Subject patterns to keep or skip.
+    include_predicate, exclude_predicate (List[str]): Predicate patterns to keep or skip.
+    include_language, exclude_language (List[str]): Language tags of the literals to keep or skip.
+
+    Returns:
+    TripleFilter: A new filter for this request, since it counts what it skips, or None when no pattern was given.
+    """
+    return TripleFilter(include_subject, exclude_subject, include_predicate, exclude_predicate,
+                        include_language, exclude_language, node_prefix=converter.statement_prefix) or None
+
+
+def log_filter(triple_filter: Optional[TripleFilter], metrics, logger):
+    """
+    Report and count what a request's filter left out.
+
+    Args:
+    triple_filter (TripleFilter, optional): The filter the conversion used, if any.
+    metrics (ConversionMetrics): The server's metrics.
+    logger (logging.Logger): The server's logger.
+    """
+    if triple_filter is None:
+        return
+    for name, value in triple_filter.counts().items():
+        metrics.filtered.inc(value, name[len('skipped_'):])
+    logger.info(f"Filter skipped {triple_filter.skipped_subjects} subjects, {triple_filter.skipped_statements} "
+                f"statements and {triple_filter.skipped_literals} literals")
+
+
+def cache_options(options: Dict, triple_filter: Optional[TripleFilter]) -> Dict:
+    """
+    The options a cached result is keyed by.
+
+    Args:
+    options (Dict): The server's converter options.
+    triple_filter (TripleFilter, optional): The request's filter; results under other filters are different results.
+
+    Returns:
+    Dict: The options with the filter's patterns added.
+    """
+    return {**options, **triple_filter.options()} if triple_filter else options
+
+
+def log_cuts(cache: ExpansionCache, logger):
+    """
+    Report the paths a conversion cut, if any.
+
+    Args:
+    cache (ExpansionCache): The cache whose counters the conversion updated.
+    logger (logging.Logger): The server's logger.
+    """
+    if cache.cycles_cut or cache.depth_cut:
+        logger.warning(f"Traversal cut {cache.cycles_cut} paths at cycles and {cache.depth_cut} at the depth limit")
+
+
+def convert_member(member: Tuple[str, bytes]) -> Result:
+    """
+    Convert one file of a batch archive, in the server or in a pool worker.
+
+    Args:
+    member (Tuple[str, bytes]): The member name and its (possibly compressed) bytes.
+
+    Returns:
+    Tuple[str, str, Optional[str]]: The name, the converted text and an error message,
+    returned rather than raised so one bad file doesn't abort the batch.
+    """
+    name, data = member
+    try:
+        ttl_text = decode_member(data)
+        TTLInput(ttl_text=ttl_text)
+        return name, converter.convert_to_text(parse_sections(ttl_text)), None
+    except Exception as e:
+        return name, "", str(e)
+
+
+def stream_batch(results: Iterable[Result], batch_format: str, metrics, logger) -> Iterator[bytes]:
+    """
+    Stream a converted batch, count its files and log its completion.
+
+    Args:
+    results (Iterable): The (name, text, error) of each member, in archive order.
+    batch_format (str): tar, zip or text.
+    metrics (ConversionMetrics): The server's metrics.
+    logger (logging.Logger): The server's logger.
+
+    Yields:
+    bytes: The response body.
+    """
+    start_time = time.time()
+    counts = {'files': 0, 'failed': 0}
+
+    def counted():
+        for name, text, error in results:
+            counts['files'] += 1
+            if error is not None:
+                counts['failed'] += 1
+                metrics.errors.inc(1, 'batch')
+            metrics.triples.inc(text.count("\n"))
+            yield name, text, error
+
+    with metrics.in_flight.track():
+        yield from write_batch(counted(), batch_format)
+    logger.info(f"Batch of {counts['files']} files ({counts['failed']} failed) converted in "
+                f"{time.time() - start_time:.2f} seconds")
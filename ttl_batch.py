@@ -0,0 +1,147 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import time
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+from ttl_sink import COMPRESSION_EXTENSIONS
+from ttl_source import detect_compression
+
+# Response formats: a tar or zip archive with one output file per member, or the
+# outputs concatenated, each preceded by a `# file: <name>` marker line
+BATCH_FORMATS = ('tar', 'zip', 'text')
+BATCH_MEDIA_TYPES = {'tar': 'application/x-tar', 'zip': 'application/zip', 'text': 'text/plain'}
+BATCH_FILENAMES = {'tar': 'converted_ttl.tar', 'zip': 'converted_ttl.zip', 'text': 'converted_ttl.txt'}
+
+_DECOMPRESS = {'gzip': gzip.decompress, 'bz2': bz2.decompress, 'xz': lzma.decompress}
+
+# The outcome of converting one member: (member name, converted text, error message or None)
+Result = Tuple[str, str, Optional[str]]
+
+
+def check_batch_format(batch_format: str):
+    if batch_format not in BATCH_FORMATS:
+        raise ValueError(f"Unknown format {batch_format!r}, expected one of {', '.join(BATCH_FORMATS)}")
+
+
+def open_archive(upload: BinaryIO) -> Iterator[Tuple[str, bytes]]:
+    """
+    Open a zip or tar archive (tar may be gzip, bz2 or xz compressed) and return an
+    iterator over its regular files as (name, bytes), read lazily in archive order.
+
+    The archive is opened eagerly, so an upload that is neither raises ValueError
+    before anything is streamed.
+    """
+    position = upload.tell()
+    if zipfile.is_zipfile(upload):
+        upload.seek(position)
+        return _zip_members(zipfile.ZipFile(upload))
+    upload.seek(position)
+    try:
+        archive = tarfile.open(fileobj=upload, mode='r:*')
+    except tarfile.TarError as e:
+        raise ValueError("Upload is not a tar or zip archive") from e
+    return _tar_members(archive)
+
+
+def _zip_members(archive: zipfile.ZipFile) -> Iterator[Tuple[str, bytes]]:
+    with archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, archive.read(info)
+
+
+def _tar_members(archive: tarfile.TarFile) -> Iterator[Tuple[str, bytes]]:
+    with archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member).read()
+
+
+def decode_member(data: bytes) -> str:
+    """
+    The text of an archive member, decompressing .gz, .bz2 and .xz members.
+    """
+    compression = detect_compression(data[:6])
+    if compression:
+        data = _DECOMPRESS[compression](data)
+    return data.decode('utf-8')
+
+
+def output_name(name: str) -> str:
+    """
+    The name of a member's output: `entities/Q937.ttl.gz` becomes `entities/Q937.txt`.
+    """
+    root, extension = os.path.splitext(name)
+    if extension.lower() in COMPRESSION_EXTENSIONS:
+        root, extension = os.path.splitext(root)
+    return root + '.txt'
+
+
+class _ByteBuffer:
+    """
+    Write-only stream the archive writers write into, drained after every member.
+    It has no seek(), which makes zipfile write streaming data descriptors.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_batch(results: Iterable[Result], batch_format: str = 'tar') -> Iterator[bytes]:
+    """
+    Stream converted members as a tar or zip archive or as marked, concatenated text.
+
+    A member that failed to convert gets a `<name>.error` file holding the message
+    in archives, and a `# error: <message>` line after its marker in text.
+    """
+    if batch_format == 'text':
+        for name, text, error in results:
+            marker = f'# file: {name}\n'
+            if error is not None:
+                marker += f"# error: {' '.join(error.split())}\n"
+            yield (marker + text).encode('utf-8')
+        return
+
+    buffer = _ByteBuffer()
+    if batch_format == 'zip':
+        archive = zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+    else:
+        archive = tarfile.open(fileobj=buffer, mode='w|')
+    with archive:
+        for name, text, error in results:
+            if error is None:
+                member_name, data = output_name(name), text.encode('utf-8')
+            else:
+                member_name, data = output_name(name)[:-len('.txt')] + '.error', error.encode('utf-8')
+            if batch_format == 'zip':
+                archive.writestr(zipfile.ZipInfo(member_name, time.localtime()[:6]), data,
+                                 compress_type=zipfile.ZIP_DEFLATED)
+            else:
+                info = tarfile.TarInfo(member_name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                archive.addfile(info, io.BytesIO(data))
+            yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,288 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ttl_sink import parse_row, row_subject
+
+MAGIC = b'TTLCHAIN'
+VERSION = 1
+
+# magic, version, reserved, rows, then the offsets of terms, chains, indexes, lines and columns
+_HEADER = struct.Struct('<8sIIQQQQQQ')
+
+# Lines written by the converter that are neither rows nor the continuation of one
+_DIRECTIVES = ('@prefix ', '@base ')
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, string: str) -> int:
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+
+def _pad(output_file):
+    output_file.write(b'\0' * (-output_file.tell() % 8))
+
+
+def _write_strings(output_file, strings: List[str]):
+    blobs = [string.encode('utf-8') for string in strings]
+    offsets = array('Q', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    output_file.write(struct.pack('<Q', len(blobs)))
+    _write_array(output_file, offsets)
+    output_file.write(b''.join(blobs))
+
+
+def _write_array(output_file, values: array):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    output_file.write(values.tobytes())
+
+
+class BinaryOutputWriter:
+    """
+    Output file with the interface of a text sink, writing the binary format.
+
+    Instead of repeating `subject <p1|p2|p3>[1,2,1] object` on every row, the file
+    holds three string dictionaries (terms, distinct predicate chains and distinct
+    index tuples) and four fixed-width uint32 columns with one entry per row. Every
+    section is at an offset given in the header, so a consumer can mmap the file
+    and scan the columns without parsing. Layout, little-endian:
+
+        header     magic, version, row count and the offsets of the sections below
+        terms      string table of subjects and objects
+        chains     string table of predicate chains, e.g. `p:P31|ps:P31`
+        indexes    string table of index tuples, e.g. `1,1`
+        lines      uint64 count, uint64 row positions, string table of non-row lines
+        columns    subject, chain, index and object ids, uint32[rows] each
+
+    A string table is a uint64 count, uint64 offsets[count + 1] into a UTF-8 blob,
+    and the blob. Sections start on 8-byte boundaries.
+
+    The converter writes text rows into it unchanged; each complete row, with the
+    continuation lines of a multi-line literal joined into its object, is split once
+    into its four parts and interned, and the file is written on close. Lines that
+    are not rows, such as prefix directives, are kept with their position so dumping
+    the file reproduces the text output byte for byte.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.terms = _StringTable()
+        self.chains = _StringTable()
+        self.indexes = _StringTable()
+        self.lines: List[Tuple[int, str]] = []
+        self.subjects = array('I')
+        self.chain_ids = array('I')
+        self.index_ids = array('I')
+        self.objects = array('I')
+        self._partial = ''
+        self._row: Optional[str] = None
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line)
+        return len(text)
+
+    def _add_line(self, line: str):
+        if row_subject(line) is None:
+            if self._row is not None and not line.startswith(_DIRECTIVES):
+                # The continuation of a multi-line literal
+                self._row += '\n' + line
+                return
+            self._add_row()
+            self.lines.append((len(self.subjects), line))
+            return
+        self._add_row()
+        self._row = line
+
+    def _add_row(self):
+        if self._row is None:
+            return
+        subject, chain, indexes, obj = parse_row(self._row)
+        self._row = None
+        self.subjects.append(self.terms.intern(subject))
+        self.chain_ids.append(self.chains.intern(chain))
+        self.index_ids.append(self.indexes.intern(indexes))
+        self.objects.append(self.terms.intern(obj))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ''
+        self._add_row()
+        with open(self.path, 'wb') as output_file:
+            output_file.write(b'\0' * _HEADER.size)
+            offsets = []
+            for table in (self.terms, self.chains, self.indexes):
+                _pad(output_file)
+                offsets.append(output_file.tell())
+                _write_strings(output_file, table.strings)
+
+            _pad(output_file)
+            offsets.append(output_file.tell())
+            output_file.write(struct.pack('<Q', len(self.lines)))
+            _write_array(output_file, array('Q', [position for position, _ in self.lines]))
+            _write_strings(output_file, [line for _, line in self.lines])
+
+            _pad(output_file)
+            offsets.append(output_file.tell())
+            for column in (self.subjects, self.chain_ids, self.index_ids, self.objects):
+                _write_array(output_file, column)
+
+            output_file.seek(0)
+            output_file.write(_HEADER.pack(MAGIC, VERSION, 0, len(self.subjects), *offsets))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _MappedStrings:
+    """
+    A string table read lazily from the mapped file.
+    """
+
+    def __init__(self, reader: 'BinaryOutput', offset: int):
+        count, = struct.unpack_from('<Q', reader.view, offset)
+        self.offsets = reader.slice(offset + 8, offset + 8 + 8 * (count + 1), 'Q')
+        self.blob = reader.slice(offset + 8 + 8 * (count + 1), len(reader.view))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, string_id: int) -> str:
+        return str(self.blob[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+
+
+class BinaryOutput:
+    """
+    Memory-mapped reader of the binary format.
+
+    The id columns are exposed as uint32 memoryviews over the mapping (subjects,
+    chains, indexes, objects), and strings are decoded only when looked up.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._mmap)
+        self._views: List[memoryview] = []
+        magic, version, _, rows, *offsets = _HEADER.unpack_from(self.view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} binary output file")
+        terms_offset, chains_offset, indexes_offset, lines_offset, columns_offset = offsets
+
+        self.rows = rows
+        self.terms = _MappedStrings(self, terms_offset)
+        self.chain_names = _MappedStrings(self, chains_offset)
+        self.index_names = _MappedStrings(self, indexes_offset)
+
+        line_count, = struct.unpack_from('<Q', self.view, lines_offset)
+        self.line_positions = self.slice(lines_offset + 8, lines_offset + 8 + 8 * line_count, 'Q')
+        self.lines = _MappedStrings(self, lines_offset + 8 + 8 * line_count)
+
+        self.subjects, self.chains, self.indexes, self.objects = [
+            self.slice(columns_offset + 4 * rows * k, columns_offset + 4 * rows * (k + 1), 'I') for k in range(4)
+        ]
+
+    def slice(self, start: int, end: int, typecode: str = 'B'):
+        """
+        A view of part of the mapping, cast to an integer column unless bytes are asked for.
+        """
+        view = self.view[start:end]
+        if typecode == 'B':
+            self._views.append(view)
+            return view
+        if sys.byteorder == 'little':
+            column = view.cast(typecode)
+            self._views.extend((view, column))
+            return column
+        column = array(typecode, view.tobytes())
+        column.byteswap()
+        view.release()
+        return column
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def row(self, row: int) -> Tuple[str, str, str, str]:
+        """
+        The subject, predicate chain, index tuple and object of a row.
+        """
+        return (self.terms[self.subjects[row]], self.chain_names[self.chains[row]],
+                self.index_names[self.indexes[row]], self.terms[self.objects[row]])
+
+    def text_lines(self) -> Iterator[str]:
+        """
+        The file in the text output format, one line at a time without line breaks.
+        """
+        line = 0
+        for row in range(self.rows):
+            while line < len(self.line_positions) and self.line_positions[line] == row:
+                yield self.lines[line]
+                line += 1
+            subject, chain, indexes, obj = self.row(row)
+            yield f'{subject} <{chain}>[{indexes}] {obj}'
+        for line in range(line, len(self.line_positions)):
+            yield self.lines[line]
+
+    def dump(self, output_file):
+        """
+        Write the file back in the text output format.
+        """
+        for line in self.text_lines():
+            output_file.write(line + '\n')
+
+    def close(self):
+        # Views over the mapping must be released before it can be closed
+        for view in reversed(self._views):
+            view.release()
+        self.view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump a binary output file in the text output format.")
+    parser.add_argument('input', help="Binary output file written with --format binary")
+    parser.add_argument('-o', '--output', help="Text output file (default: standard output)")
+    args = parser.parse_args()
+
+    with BinaryOutput(args.input) as binary_output:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output_file:
+                binary_output.dump(output_file)
+        else:
+            binary_output.dump(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Iterable, Iterator, Mapping, Optional
+
+# Bump when a converter change alters the output for the same input and options
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 1 << 30
+READ_CHUNK_SIZE = 1 << 20
+
+_RESULT_SUFFIX = '.txt'
+_PARTIAL_SUFFIX = '.tmp'
+
+
+def cache_key(upload: BinaryIO, options: Mapping) -> str:
+    """
+    SHA-256 of the uploaded bytes, the cache version and the converter options.
+
+    The upload is read from its current position in chunks and rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': CACHE_VERSION, **options}, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    position = upload.tell()
+    for chunk in iter(lambda: upload.read(READ_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    upload.seek(position)
+    return digest.hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header value lists the ETag (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in (candidate[2:] if candidate.startswith('W/') else candidate
+                                         for candidate in candidates)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of converted output on local disk.
+
+    Each result is a file named after its cache key. Entries are evicted least
+    recently used first once their total size exceeds max_bytes; a hit refreshes
+    the file's mtime, so the order survives a restart. A result is only added once
+    its conversion has streamed to the end, so aborted requests leave no entry.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+
+    def load(self):
+        """
+        Create the directory, drop partial results and index the existing ones.
+        Called when the server starts rather than on import, so worker processes
+        importing the server module never touch the cache.
+        """
+        directory = self.directory
+        os.makedirs(directory, exist_ok=True)
+        results = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(_PARTIAL_SUFFIX):
+                os.unlink(path)
+            elif name.endswith(_RESULT_SUFFIX):
+                stat = os.stat(path)
+                results.append((stat.st_mtime, name[:-len(_RESULT_SUFFIX)], stat.st_size))
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            for _, key, size in sorted(results):
+                self._entries[key] = size
+                self._size += size
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _RESULT_SUFFIX)
+
+    def get(self, key: str) -> Optional[Iterator[str]]:
+        """
+        The cached result as text chunks, or None on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                try:
+                    # Opened under the lock so a concurrent eviction can't remove it first
+                    result_file = open(self._path(key), 'rb')
+                except FileNotFoundError:
+                    self._size -= self._entries.pop(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    os.utime(self._path(key))
+                    return self._read(result_file)
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def _read(result_file: BinaryIO) -> Iterator[str]:
+        with io.TextIOWrapper(result_file, encoding='utf-8', newline='') as text:
+            yield from iter(lambda: text.read(READ_CHUNK_SIZE), '')
+
+    def store(self, key: str, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Pass converted chunks through while writing them to the cache.
+        """
+        fd, partial_path = tempfile.mkstemp(suffix=_PARTIAL_SUFFIX, dir=self.directory)
+        complete = False
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as partial_file:
+                for chunk in chunks:
+                    partial_file.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                self._add(key, partial_path)
+            else:
+                os.unlink(partial_path)
+
+    def _add(self, key: str, partial_path: str):
+        size = os.path.getsize(partial_path)
+        if size > self.max_bytes:
+            os.unlink(partial_path)
+            return
+        with self._lock:
+            os.replace(partial_path, self._path(key))
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
@@ -1,384 +1,857 @@
-import re
-from typing import Dict, List, Tuple
-import uuid
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from collections import ChainMap, OrderedDict, deque
+from multiprocessing import Pool
+import argparse
+import io
+import pickle
+import tempfile
 import time
 
+from ttl_binary import BinaryOutputWriter
+from ttl_filter import TripleFilter
+from ttl_incremental import IncrementalState, convert_incremental
+from ttl_index import INDEX_SUFFIX, IndexingSink
+from ttl_ntriples import INPUT_FORMATS, LINE_FORMATS, input_format_for_path, read_ntriples
+from ttl_profile import CLI_HOT_FUNCTIONS, Profiler
+from ttl_sink import COMPRESSIONS, compression_for_path, open_sink
+from ttl_sort import DEFAULT_MEMORY_BUDGET, SORT_KEYS, SortingSink
+from ttl_source import open_source
+from ttl_store import TripleStore
+from ttl_tokenizer import TTLSyntaxError, TTLTokenizer, find_block_boundaries, tokenize
+
 # Statement prefixes used to identify special statements in the TTL format
-STATEMENT_PREFIX = ["s:", "v:", "ref:", "blank-node:"]
+STATEMENT_PREFIX = ("s:", "v:", "ref:", "blank-node:")
 
-def preprocess_ttl(ttl_text: str) -> str:
-    """
-    Preprocesses a TTL (Turtle) text by normalizing whitespace and punctuation.
-    """
-    # Use regex to normalize whitespace and ensure proper spacing around punctuation
-    preprocessed = re.sub(
-        r'\s+|([;,])(?!\s)|(?<=[^;\s])\s*\.',
-        lambda m: ' ' if m.group(0).isspace() else f'{m.group(1)} ' if m.group(1) else '.',
-        ttl_text
-    )
-    # Remove trailing spaces and periods
-    return preprocessed.rstrip(' .')
-
-def split_by_periods_keep_quotes(text: str) -> List[str]:
-    """
-    Split the text by periods, but keep quoted content intact.
-    """
-    # Regex pattern to split by periods outside of quoted content
-    pattern = r'\.\s+(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    sections = re.split(pattern, text)
-    # Strip leading and trailing whitespace from each section
-    return [section.strip() for section in sections]
+# Prefix of the labels the tokenizer gives blank nodes, which are always expanded in place
+BLANK_NODE_PREFIX = "blank-node:"
+
+# Statement nodes that may be referenced from several statements (values and references)
+SHARED_NODE_PREFIX = ("v:", "ref:")
+
+# Maximum number of statement node expansions kept by ExpansionCache
+EXPANSION_CACHE_SIZE = 100000
+
+# Maximum number of predicates in an emitted chain; deeper paths are cut
+MAX_CHAIN_DEPTH = 32
 
-def split_by_semicolons_keep_quotes(text: str) -> List[str]:
+# Size of the chunks read from the input in streaming mode
+STREAM_CHUNK_SIZE = 1 << 20
+
+def split_by_sections(ttl_text: str, dictionary_of_sections: Dict[str, List[List[str]]],
+                      triple_filter: Optional[TripleFilter] = None) -> Tuple[Dict[str, List[List[str]]], str]:
     """
-    Split the text by semicolons, but keep quoted content intact.
+    Split the text into subject sections in a single tokenizer pass.
+    Blank-node sections are stored in dictionary_of_sections.
+    Subjects, statements and literals the triple_filter rejects are left out.
     """
-    # Regex pattern to split by semicolons outside of quoted content
-    pattern = r';\s*(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    statements = re.split(pattern, text)
-    # Strip leading and trailing whitespace from each statement
-    return [statement.strip() for statement in statements]
+    blocks, prefixes = tokenize(ttl_text, triple_filter=triple_filter)
+    result = {}
+
+    for subject, statements, blank_nodes in blocks:
+        dictionary_of_sections.update(blank_nodes)
+        if subject in result:
+            # Turtle allows a subject to open several blocks; their statements are joined
+            result[subject].extend(statements)
+        else:
+            result[subject] = statements
 
-def split_by_spaces_keep_quotes(text: str) -> List[str]:
+    return result, "\n".join(prefixes)
+
+class ExpansionCache:
     """
-    Split the text by spaces, but keep quoted content and URIs intact.
+    Bounded LRU of expanded statement nodes, with hit and miss counters.
+
+    A node's expansion is the list of (predicate chain, index chain, object, depth)
+    rows it produces, relative to the node. It doesn't depend on the referencing
+    subject, so it is computed once and spliced under every statement that reaches
+    the node. Expansions the traversal cut short depend on the path and aren't cached.
+    The cache also counts the paths the traversal cut, either because they
+    led back to a node on the current path or because they exceeded the chain depth.
     """
-    # Regex pattern to split by spaces, but keep quoted content intact
-    pattern = r'"(?:\\.|[^"\\])*"[^\s]*|"(?:\\.|[^"\\])*"|[^\s"]+'
-    return re.findall(pattern, text)
 
-def check_for_brackets(section: str, dictionary_of_sections: Dict[str, List[List[str]]]) -> str:
+    def __init__(self, max_size: int = EXPANSION_CACHE_SIZE):
+        self.max_size = max_size
+        self.rows: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.cycles_cut = 0
+        self.depth_cut = 0
+
+    def get(self, node: str) -> Optional[List[Tuple[str, str, str, int]]]:
+        rows = self.rows.get(node)
+        if rows is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.rows.move_to_end(node)
+        return rows
+
+    def put(self, node: str, rows: List[Tuple[str, str, str, int]]):
+        self.rows[node] = rows
+        if len(self.rows) > self.max_size:
+            self.rows.popitem(last=False)
+
+    def counts(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'cycles_cut': self.cycles_cut, 'depth_cut': self.depth_cut}
+
+    def add_counts(self, counts: Dict[str, int]):
+        """
+        Accumulate the counters of another cache, e.g. one used by a worker process.
+        """
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def print_report(self):
+        print(f"Expansion cache: {self.hits} hits, {self.misses} misses.")
+        print(f"Traversal cut {self.cycles_cut} paths at cycles and {self.depth_cut} at the depth limit.")
+
+class Converter:
     """
-    Process a section of text, replacing bracketed content with UUIDs.
+    The conversion algorithm and its configuration, shared by the command line and both API servers.
+
+    Subjects starting with statement_prefix (statement, value and reference nodes)
+    are not written themselves but expanded under the triples that reach them; blank
+    nodes always are. A triple is followed into its objects when its first object is
+    such a node. Objects of a followed triple that aren't in the sections are
+    dropped; predicate chains longer than max_depth and paths that revisit a node
+    are cut.
+
+    A converter only holds its configuration: every conversion keeps its state in
+    local variables and in the ExpansionCache passed to it, so one instance can
+    run any number of conversions concurrently in threads.
     """
 
-    def process_brackets(text: str, start: int) -> Tuple[str, int]:
+    def __init__(self, statement_prefix: Iterable[str] = STATEMENT_PREFIX, max_depth: int = MAX_CHAIN_DEPTH):
+        statement_prefix = tuple(statement_prefix)
+        if BLANK_NODE_PREFIX not in statement_prefix:
+            statement_prefix += (BLANK_NODE_PREFIX,)
+        self.statement_prefix = statement_prefix
+        self.max_depth = max_depth
+
+    def options(self) -> Dict:
+        """
+        The configuration, e.g. for keying cached results.
+        """
+        return {'statement_prefix': self.statement_prefix, 'max_depth': self.max_depth}
+
+    def is_node(self, subject: str) -> bool:
+        """
+        Whether a subject is only written as part of the subjects reaching it.
+        """
+        return subject.startswith(self.statement_prefix)
+
+    def follows(self, triple: List[str]) -> bool:
+        """
+        Whether a triple's objects are expanded rather than written as they are.
+        """
+        return len(triple) > 1 and triple[1].startswith(self.statement_prefix)
+
+    def convert(self, sections: Mapping[str, List[List[str]]], output_file, subjects: Optional[Iterable[str]] = None,
+                cache: Optional[ExpansionCache] = None):
         """
-        Find the matching closing bracket for an opening bracket.
+        Convert sections to the required format and write to file.
+        Only the given subjects are converted when subjects is set. Node expansions are
+        kept in cache, which can be shared between calls on the same sections.
         """
-        stack = 1
-        end = start + 1
-        # Iterate through the text to find the matching closing bracket
-        while stack > 0 and end < len(text):
-            if text[end] == '[':
-                stack += 1
-            elif text[end] == ']':
-                stack -= 1
-            end += 1
-        # Return the content inside the brackets and the position after the closing bracket
-        return text[start + 1:end - 1].strip(), end
-
-    def recursive_process(text: str) -> str:
+        if cache is None:
+            cache = ExpansionCache()
+        max_depth = self.max_depth
+        follows = self.follows
+
+        def expand(root: str) -> List[Tuple[str, str, str, int]]:
+            """
+            Expand a statement node into rows relative to it, reusing cached expansions.
+
+            Uses an explicit stack of [node, triple position, object position, rows, cut,
+            triples] frames; a frame is resumed once the child it is waiting for is expanded.
+            A node's triples are looked up once per frame, since a TripleStore builds them
+            on every lookup. An expansion cut at a cycle or at the depth limit depends on
+            the path that led to it, so it is neither cached nor reused but computed again
+            on every path.
+            """
+            rows = cache.get(root)
+            if rows is not None:
+                return rows
+
+            def splice(frame, child_rows):
+                # Add a child's rows under the predicate and object position the frame is at
+                _, position, object_position, rows, _, triples = frame
+                predicate = triples[position][0]
+                for chain, indexes, leaf, depth in child_rows:
+                    if depth < max_depth:
+                        rows.append((f'{predicate}|{chain}', f'{object_position},{indexes}', leaf, depth + 1))
+                    else:
+                        cache.depth_cut += 1
+                frame[2] = object_position + 1
+
+            expanded = {}
+            on_path = {root}
+            stack = [[root, 0, 1, [], False, sections[root]]]
+            while stack:
+                frame = stack[-1]
+                node, position, object_position, rows, cut, triples = frame
+
+                if position == len(triples):
+                    stack.pop()
+                    on_path.discard(node)
+                    if not cut:
+                        expanded[node] = rows
+                        cache.put(node, rows)
+                    if not stack:
+                        return rows
+                    splice(stack[-1], rows)
+                    if cut:
+                        stack[-1][4] = True
+                    continue
+
+                triple = triples[position]
+                if not triple:  # Skip empty triples
+                    print(f"Warning: Empty triple found for object {node}")
+                    frame[1], frame[2] = position + 1, 1
+                    continue
+
+                if not (follows(triple) and node != triple[1]):
+                    predicate = triple[0]
+                    for i, obj in enumerate(triple[1:], start=1):
+                        obj = obj[:-1] if obj.endswith(',') else obj
+                        rows.append((predicate, str(i), obj, 1))
+                    frame[1], frame[2] = position + 1, 1
+                    continue
+
+                if object_position == len(triple):
+                    frame[1], frame[2] = position + 1, 1
+                    continue
+
+                obj = triple[object_position]
+                obj = obj[:-1] if obj.endswith(',') else obj
+                if obj not in sections:
+                    frame[2] = object_position + 1
+                    continue
+
+                child_rows = expanded.get(obj)
+                if child_rows is not None:
+                    cache.hits += 1
+                else:
+                    child_rows = cache.get(obj)
+                if child_rows is not None:
+                    splice(frame, child_rows)
+                elif obj in on_path:
+                    cache.cycles_cut += 1
+                    frame[2], frame[4] = object_position + 1, True
+                elif len(stack) >= max_depth:
+                    cache.depth_cut += 1
+                    frame[2], frame[4] = object_position + 1, True
+                else:
+                    # Expand the child first; its rows are spliced here when its frame is popped
+                    on_path.add(obj)
+                    stack.append([obj, 0, 1, [], False, sections[obj]])
+
+        def recursive_conversion(predicate_chain, index_chain, object, subject, lines):
+            """
+            Add the expansion of a nested structure under the subject's chains to lines.
+            """
+            if object not in sections:
+                return
+
+            predicates = "|".join(predicate_chain)
+            indexes = ",".join(index_chain)
+            for chain, index, obj, depth in expand(object):
+                if depth + len(predicate_chain) > max_depth:
+                    cache.depth_cut += 1
+                    continue
+                lines.append(f'{subject} <{predicates}|{chain}>[{indexes},{index}] {obj}\n')
+
+        for subject in (sections if subjects is None else subjects):
+            if subject.startswith(self.statement_prefix):
+                continue
+
+            # The rows of a subject are written in one call rather than one per row
+            lines = []
+            for triple in sections[subject]:
+                if not triple:
+                    print(f"Warning: Empty triple found for subject {subject}")
+                    continue
+
+                predicate_chain = [triple[0]]
+                followed = follows(triple) and triple[1] != subject
+
+                for i, obj in enumerate(triple[1:], start=1):
+                    obj = obj[:-1] if obj.endswith(',') else obj
+
+                    if followed:
+                        recursive_conversion(predicate_chain, [str(i)], obj, subject, lines)
+                    else:
+                        predicate = triple[0]
+                        lines.append(f'{subject} <{predicate}>[{i}] {obj}\n')
+            output_file.write("".join(lines))
+
+    def convert_to_text(self, sections: Mapping[str, List[List[str]]], subjects: Optional[Iterable[str]] = None,
+                        cache: Optional[ExpansionCache] = None) -> str:
         """
-        Recursively process the text, handling nested brackets.
+        The converted rows of the subjects, each ending in a newline.
         """
-        while '[' in text:
-            start = text.find('[')
-            content, end = process_brackets(text, start)
-            # Recursively process any nested brackets
-            processed_content = recursive_process(content)
-            # Generate a new UUID for this bracketed content
-            new_uuid = f"blank-node:{uuid.uuid4()}"
-            # Split the processed content into statements and store in dictionary
-            statements = split_by_semicolons_keep_quotes(processed_content)
-            dictionary_of_sections[new_uuid] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-            # Replace the original bracketed content with the new UUID
-            text = text[:start] + new_uuid + text[end:]
-        return text
-
-    return recursive_process(section)
-
-def split_by_sections(preprocessed_text: str, dictionary_of_sections: Dict[str, List[List[str]]]) -> Tuple[Dict[str, List[List[str]]], str]:
+        buffer = io.StringIO()
+        self.convert(sections, buffer, subjects, cache)
+        return buffer.getvalue()
+
+    def stream(self, input_file, output_file, chunk_size: int = STREAM_CHUNK_SIZE,
+               triple_filter: Optional[TripleFilter] = None) -> ExpansionCache:
+        """
+        Read the input incrementally and write each subject as soon as it can be converted.
+        Returns a cache holding the summed counters of all conversions.
+        """
+        totals = ExpansionCache(max_size=0)
+
+        def convert_subject(sections, subject):
+            # Nodes come and go while streaming, so expansions are only shared within a subject
+            cache = ExpansionCache()
+            self.convert(sections, output_file, [subject], cache=cache)
+            totals.add_counts(cache.counts())
+
+        converter = StreamingConverter(convert_subject, statement_prefix=self.statement_prefix)
+        # A subject's earlier block is written before more than max_pending blocks follow it
+        tokenizer = TTLTokenizer(triple_filter=triple_filter, max_tracked_subjects=converter.max_pending + 1)
+        written_prefixes = None
+
+        def write_blocks(blocks):
+            nonlocal written_prefixes
+            for block in blocks:
+                if written_prefixes is None:
+                    output_file.write("\n".join(tokenizer.prefixes) + "\n")
+                    written_prefixes = len(tokenizer.prefixes)
+                converter.add_block(*block)
+
+        for chunk in iter(lambda: input_file.read(chunk_size), ''):
+            write_blocks(tokenizer.feed(chunk))
+            # Directives seen after the first block are written where they appear
+            if written_prefixes is not None and written_prefixes < len(tokenizer.prefixes):
+                output_file.write("\n".join(tokenizer.prefixes[written_prefixes:]) + "\n")
+                written_prefixes = len(tokenizer.prefixes)
+        write_blocks(tokenizer.close())
+        if written_prefixes is None:
+            output_file.write("\n".join(tokenizer.prefixes) + "\n")
+        converter.close()
+        return totals
+
+def convert_and_write_to_file(sections: Dict[str, List[List[str]]], output_file, subjects: Optional[Iterable[str]] = None,
+                              cache: Optional[ExpansionCache] = None, max_depth: int = MAX_CHAIN_DEPTH):
     """
-    Split the text into sections by periods.
+    Convert sections with the command line's configuration; see Converter.convert.
+    """
+    Converter(max_depth=max_depth).convert(sections, output_file, subjects, cache)
+
+class _NodeSpill:
+    """
+    Statement nodes evicted from memory, pickled to an anonymous temporary file.
+    Only each node's offset and length stay in memory.
     """
-    sections = split_by_periods_keep_quotes(preprocessed_text)
-    result = {}
-    prefixes = []
-    
-    for section in sections:
-        if section.startswith("@prefix"):
-            # Collect prefix definitions, ensuring the full URI is preserved
-            prefixes.append(section + ' .')
-        else:
-            # Process bracketed content
-            section = check_for_brackets(section, dictionary_of_sections)
-            stripped_section = section.strip()
-            statements = split_by_semicolons_keep_quotes(stripped_section)
-            # Extract subject and process statements
-            subject = statements[0].split(" ")[0]
-            statements[0] = statements[0].replace(subject + " ", "")
-            result[subject] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-    
-    return result, "\n".join(prefixes)
 
-def convert_and_write_to_file(sections: Dict[str, List[List[str]]], output_file):
+    def __init__(self):
+        self.file = None
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.offsets
+
+    def put(self, node: str, statements: List[List[str]]):
+        if node in self.offsets:
+            return
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        data = pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = self.file.seek(0, io.SEEK_END)
+        self.file.write(data)
+        self.offsets[node] = (offset, len(data))
+
+    def get(self, node: str) -> List[List[str]]:
+        offset, length = self.offsets[node]
+        self.file.seek(offset)
+        return pickle.loads(self.file.read(length))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.offsets.clear()
+
+class StreamingConverter:
     """
-    Convert sections to the required format and write to file.
+    Convert subject blocks as they are parsed, keeping only unresolved ones in memory.
+
+    convert_subject(sections, subject) is called for each subject as soon as every
+    statement node it reaches (transitively) has been seen, in input order. Statement
+    and blank nodes are dropped once the subjects using them are written. Nodes no
+    waiting subject holds, such as value and reference nodes later subjects may reach
+    again or the statement nodes of subjects a filter rejected, are kept in an LRU of
+    at most max_shared_nodes entries. The least recently used value and reference nodes
+    are spilled to a temporary file, from which a later reference reads them back;
+    other nodes are dropped, so a statement node parsed more than max_shared_nodes
+    nodes before the subject reaching it is lost. For dumps grouped by entity, memory is
+    therefore bounded by the largest entity rather than by the file size. At most
+    max_pending subjects wait for missing nodes; beyond that the oldest is written
+    without them.
     """
-    def recursive_conversion(predicate_chain, index_chain, object, subject):
+
+    def __init__(self, convert_subject: Callable[[Mapping[str, List[List[str]]], str], None],
+                 statement_prefix: Tuple[str, ...] = STATEMENT_PREFIX,
+                 max_shared_nodes: int = 100000, max_pending: int = 10000):
+        self.convert_subject = convert_subject
+        self.statement_prefix = statement_prefix
+        self.max_shared_nodes = max_shared_nodes
+        self.max_pending = max_pending
+        self.nodes: Dict[str, List[List[str]]] = {}
+        # Nodes in memory that no waiting subject holds, least recently used first
+        self.unheld = OrderedDict()
+        self.spill = _NodeSpill()
+        self.pending = deque()
+        self.waiting: Dict[str, List[dict]] = {}
+        self.holds: Dict[str, int] = {}
+
+    def add_block(self, subject: str, statements: List[List[str]], blank_nodes: Dict[str, List[List[str]]]):
         """
-        Recursively convert nested structures and write to file.
+        Register a parsed block and write every subject it completes.
         """
-        if object not in sections:
-            return
+        for label, node_statements in blank_nodes.items():
+            self._add_node(label, node_statements)
 
-        for triple in sections[object]:
-            if not triple:  # Skip empty triples
-                print(f"Warning: Empty triple found for object {object}")
-                continue
-            
-            new_predicate_chain = predicate_chain + [triple[0]]
-            
-            if len(triple) > 1 and triple[1].startswith(tuple(STATEMENT_PREFIX)) and object != triple[1]:
-                for i, obj in enumerate(triple[1:], start=1):
-                    obj = obj[:-1] if obj.endswith(',') else obj
-                    new_index = index_chain + [str(i)]
-                    recursive_conversion(new_predicate_chain, new_index, obj, subject)
+        if subject.startswith(self.statement_prefix):
+            self._add_node(subject, statements)
+        else:
+            entry = {'subject': subject, 'statements': statements, 'seen': set(), 'missing': set()}
+            self._reach(entry, statements)
+            self.pending.append(entry)
+        # Only now, so the block's own nodes aren't evicted before its subject reaches them
+        self._evict_unheld_nodes()
+
+        while self.pending and (not self.pending[0]['missing'] or len(self.pending) > self.max_pending):
+            self._write(self.pending.popleft())
+
+    def close(self):
+        """
+        Write the subjects still waiting for nodes that never appeared.
+        """
+        while self.pending:
+            self._write(self.pending.popleft())
+        self.waiting.clear()
+        self.spill.close()
+
+    def _add_node(self, node: str, statements: List[List[str]]):
+        self.nodes[node] = statements
+        if node not in self.holds:
+            self.unheld[node] = None
+        for entry in self.waiting.pop(node, []):
+            entry['missing'].discard(node)
+            self._reach(entry, statements)
+
+    def _reach(self, entry: dict, statements: List[List[str]]):
+        """
+        Walk the statement nodes reachable from statements, recording the missing ones.
+        """
+        stack = [statements]
+        while stack:
+            for triple in stack.pop():
+                for obj in triple[1:]:
+                    if not obj.startswith(self.statement_prefix) or obj in entry['seen']:
+                        continue
+                    entry['seen'].add(obj)
+                    self.holds[obj] = self.holds.get(obj, 0) + 1
+                    self.unheld.pop(obj, None)
+                    node_statements = self.nodes.get(obj)
+                    if node_statements is None and obj in self.spill:
+                        node_statements = self.nodes[obj] = self.spill.get(obj)
+                    if node_statements is not None:
+                        stack.append(node_statements)
+                    else:
+                        entry['missing'].add(obj)
+                        self.waiting.setdefault(obj, []).append(entry)
+
+    def _write(self, entry: dict):
+        subject = entry['subject']
+        for node in entry['missing']:
+            waiting = [other for other in self.waiting[node] if other is not entry]
+            if waiting:
+                self.waiting[node] = waiting
             else:
-                predicates = "|".join(new_predicate_chain)
-                for i, obj in enumerate(triple[1:], start=1):
-                    obj = obj[:-1] if obj.endswith(',') else obj
-                    new_index = index_chain + [str(i)]
-                    indexes = ",".join(new_index)
-                    output_file.write(f'{subject} <{predicates}>[{indexes}] {obj}\n')
+                del self.waiting[node]
+        self.convert_subject(ChainMap({subject: entry['statements']}, self.nodes), subject)
 
-    for subject, triples in sections.items():
-        if subject.startswith(tuple(STATEMENT_PREFIX)):
-            continue
-        
-        for triple in triples:
-            if not triple:
-                print(f"Warning: Empty triple found for subject {subject}")
+        for node in entry['seen']:
+            self.holds[node] -= 1
+            if self.holds[node]:
+                continue
+            del self.holds[node]
+            if node not in self.nodes:
                 continue
+            if node.startswith(SHARED_NODE_PREFIX):
+                self.unheld[node] = None
+            else:
+                del self.nodes[node]
+        self._evict_unheld_nodes()
+
+    def _evict_unheld_nodes(self):
+        # Held nodes are never in the LRU, so eviction pops from its front without scanning
+        while len(self.unheld) > self.max_shared_nodes:
+            node, _ = self.unheld.popitem(last=False)
+            statements = self.nodes.pop(node)
+            if node.startswith(SHARED_NODE_PREFIX):
+                self.spill.put(node, statements)
+
+def load_store(input_file, chunk_size: int = STREAM_CHUNK_SIZE,
+               triple_filter: Optional[TripleFilter] = None) -> Tuple[TripleStore, str]:
+    """
+    Parse the input incrementally into an interned TripleStore.
+    Only one chunk's worth of token lists is alive at a time.
+    """
+    tokenizer = TTLTokenizer(triple_filter=triple_filter)
+    store = TripleStore()
 
-            predicate_chain = [triple[0]]
+    def add_blocks(blocks):
+        for subject, statements, blank_nodes in blocks:
+            store.add(subject, statements)
+            store.update(blank_nodes)
 
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                
-                if len(triple) > 1 and triple[1].startswith(tuple(STATEMENT_PREFIX)) and triple[1] != subject:
-                    recursive_conversion(predicate_chain, [str(i)], obj, subject)
+    for chunk in iter(lambda: input_file.read(chunk_size), ''):
+        add_blocks(tokenizer.feed(chunk))
+    add_blocks(tokenizer.close())
+    return store, "\n".join(tokenizer.prefixes)
+
+def reachable_nodes(statements: List[List[str]], sections: Mapping[str, List[List[str]]],
+                    statement_prefix: Tuple[str, ...] = STATEMENT_PREFIX) -> Tuple[set, set]:
+    """
+    Collect the statement nodes reachable from statements, split into present and missing.
+    """
+    seen, missing = set(), set()
+    stack = [statements]
+    while stack:
+        for triple in stack.pop():
+            for obj in triple[1:]:
+                if not obj.startswith(statement_prefix) or obj in seen or obj in missing:
+                    continue
+                if obj in sections:
+                    seen.add(obj)
+                    stack.append(sections[obj])
                 else:
-                    predicate = triple[0]
-                    output_file.write(f'{subject} <{predicate}>[{i}] {obj}\n')
+                    missing.add(obj)
+    return seen, missing
+
+def convert_shard(shard: Tuple[int, str, Converter, Optional[TripleFilter]]):
+    """
+    Parse one shard and convert every subject whose statement nodes are all in it.
+
+    Returns the shard's prefixes, its output in input order (converted text, or a
+    (subject, statements) pair for subjects that reference nodes of other shards),
+    the nodes other shards may need (statement nodes and the blank nodes of deferred subjects),
+    the expansion counters and the filter counters.
+    """
+    shard_number, shard_text, converter, triple_filter = shard
+    try:
+        blocks, prefixes = tokenize(shard_text, label_prefix=f"{shard_number}.", triple_filter=triple_filter)
+    except TTLSyntaxError as error:
+        # Located in the shard; parallel_convert knows where the shard starts
+        error.shard = shard_number
+        raise
+    nodes = {}
+    roots = []
+    for subject, statements, blank_nodes in blocks:
+        nodes.update(blank_nodes)
+        if converter.is_node(subject):
+            nodes[subject] = statements
+        else:
+            roots.append((subject, statements))
+
+    items = []
+    used = set()
+    cache = ExpansionCache()
+    buffer = io.StringIO()
+    for subject, statements in roots:
+        seen, missing = reachable_nodes(statements, nodes, converter.statement_prefix)
+        if missing:
+            if buffer.tell():
+                items.append(buffer.getvalue())
+                buffer = io.StringIO()
+            items.append((subject, statements))
+            continue
+        converter.convert(ChainMap({subject: statements}, nodes), buffer, [subject], cache=cache)
+        used |= seen
+    if buffer.tell():
+        items.append(buffer.getvalue())
+
+    # Any statement node may be referenced from another shard as well; a blank node can only be
+    # reached from its own block, so it is needed later only if that subject was deferred
+    exports = {node: statements for node, statements in nodes.items()
+               if not node.startswith(BLANK_NODE_PREFIX) or node not in used}
+    return prefixes, items, exports, cache.counts(), triple_filter.counts() if triple_filter else {}
+
+def parallel_convert(ttl_text: str, output_file, workers: int, converter: Optional[Converter] = None,
+                     triple_filter: Optional[TripleFilter] = None) -> ExpansionCache:
+    """
+    Shard the text at block boundaries, convert the shards in a process pool and join them.
+
+    Subjects whose statement nodes live in other shards are converted in the join
+    phase, once the exported nodes of every shard are known. Returns the join
+    phase cache, holding the summed counters of every shard; the shards' filter
+    counters are summed into triple_filter.
+    """
+    converter = converter or Converter()
+    boundaries = [0] + find_block_boundaries(ttl_text, workers) + [len(ttl_text)]
+    shards = [(number, ttl_text[start:end], converter, triple_filter)
+              for number, (start, end) in enumerate(zip(boundaries, boundaries[1:]))]
+    with Pool(processes=workers) as pool:
+        try:
+            results = pool.map(convert_shard, shards, chunksize=1)
+        except TTLSyntaxError as error:
+            # Shards start at the beginning of a line, so only the line and offset move
+            start = boundaries[error.shard]
+            raise TTLSyntaxError(error.message, error.line + ttl_text.count('\n', 0, start), error.column,
+                                 error.offset + len(ttl_text[:start].encode('utf-8', 'surrogatepass'))) from None
+
+    nodes = {}
+    prefixes = []
+    cache = ExpansionCache()
+    for shard_prefixes, _, exports, counts, filter_counts in results:
+        prefixes.extend(shard_prefixes)
+        nodes.update(exports)
+        cache.add_counts(counts)
+        if triple_filter is not None:
+            triple_filter.add_counts(filter_counts)
+
+    output_file.write("\n".join(prefixes) + "\n")
+    for _, items, _, _, _ in results:
+        for item in items:
+            if isinstance(item, str):
+                output_file.write(item)
+            else:
+                subject, statements = item
+                converter.convert(ChainMap({subject: statements}, nodes), output_file, [subject], cache=cache)
+    return cache
+
+def open_output(path: str, output_format: str = 'text', compression: Optional[str] = None, index: bool = False,
+                sort: Optional[str] = None, sort_memory: int = DEFAULT_MEMORY_BUDGET):
+    """
+    Open the output file as a buffered, optionally compressed, text sink or as a binary output writer.
+    With index, the text sink also writes the subject offset index of ttl_index.py. With sort, rows
+    are sorted by that field with an external merge sort holding about sort_memory bytes.
+    """
+    if output_format == 'binary':
+        output_file = BinaryOutputWriter(path)
+    elif index:
+        output_file = IndexingSink(open_sink(path), path + INDEX_SUFFIX)
+    else:
+        output_file = open_sink(path, compression)
+    if sort:
+        return SortingSink(output_file, sort, sort_memory)
+    return output_file
 
 def main():
     """
     Main function to read input, process TTL, and write output.
     """
+    parser = argparse.ArgumentParser(description="Convert a TTL file to the indexed predicate chain format.")
+    parser.add_argument('input', nargs='?', default='einstein.ttl',
+                        help="Input TTL file, optionally gzip, bz2 or xz compressed")
+    parser.add_argument('--input-format', choices=INPUT_FORMATS,
+                        help="Syntax of the input; by default N-Triples for .nt, N-Quads for .nq and Turtle otherwise")
+    parser.add_argument('-o', '--output', default='output.txt',
+                        help="Output file; a .gz, .bz2 or .xz extension compresses it")
+    parser.add_argument('--compression', choices=COMPRESSIONS,
+                        help="Compress the output regardless of its extension")
+    parser.add_argument('--format', choices=('text', 'binary'), default='text',
+                        help="Write the text format or the memory-mappable binary format of ttl_binary.py")
+    parser.add_argument('--index', action='store_true',
+                        help=f"Write a sidecar index of each subject's byte range next to the output ({INDEX_SUFFIX})")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read the input incrementally and write subjects as soon as they are complete")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Split the input at subject boundaries and convert the shards in this many processes")
+    parser.add_argument('--max-depth', type=int, default=MAX_CHAIN_DEPTH,
+                        help="Cut predicate chains longer than this many predicates")
+    parser.add_argument('--compact', action='store_true',
+                        help="Hold the parsed input in an interned, array-backed store and report its memory per triple")
+    parser.add_argument('--sort', choices=SORT_KEYS,
+                        help="Write the rows sorted by subject, predicate chain or object")
+    parser.add_argument('--sort-memory', type=int, default=DEFAULT_MEMORY_BUDGET >> 20, metavar='MB',
+                        help="Megabytes of rows held in memory while sorting before a sorted run is spilled "
+                             "to a temporary file")
+    parser.add_argument('--incremental', metavar='STATE',
+                        help="Reuse the rows of subjects whose blocks are unchanged since the run that wrote STATE, "
+                             "then update STATE")
+    parser.add_argument('--include-subject', action='append', default=[], metavar='PATTERN',
+                        help="Only write subjects matching PATTERN; a pattern ending in ':' or '*' matches a prefix. "
+                             "Repeatable")
+    parser.add_argument('--exclude-subject', action='append', default=[], metavar='PATTERN',
+                        help="Skip subjects matching PATTERN. Repeatable")
+    parser.add_argument('--include-predicate', action='append', default=[], metavar='PATTERN',
+                        help="Only write the statements of written subjects whose predicate matches PATTERN. "
+                             "Repeatable")
+    parser.add_argument('--exclude-predicate', action='append', default=[], metavar='PATTERN',
+                        help="Skip the statements of written subjects whose predicate matches PATTERN. Repeatable")
+    parser.add_argument('--include-language', action='append', default=[], metavar='TAG',
+                        help="Only keep literals without a language tag or tagged TAG (e.g. en, or en* for en-gb). "
+                             "Repeatable")
+    parser.add_argument('--exclude-language', action='append', default=[], metavar='TAG',
+                        help="Skip literals tagged TAG. Repeatable")
+    parser.add_argument('--profile', action='store_true',
+                        help="Report the time spent in each stage and hot function and the peak traced memory")
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help="With --profile, also write the cProfile statistics to PATH")
+    args = parser.parse_args()
+    if args.stream + (args.workers > 1) + args.compact > 1:
+        parser.error("--stream, --workers and --compact can't be combined")
+    args.input_format = args.input_format or input_format_for_path(args.input)
+    if args.input_format in LINE_FORMATS and (args.stream or args.compact):
+        parser.error("N-Triples and N-Quads input is read in memory, without --stream or --compact")
+    if args.incremental and (args.stream or args.workers > 1 or args.compact):
+        parser.error("--incremental can't be combined with --stream, --workers or --compact")
+    if args.format == 'binary' and args.compression:
+        parser.error("The binary format is memory-mapped and can't be compressed")
+    if args.index and (args.format == 'binary' or args.compression or compression_for_path(args.output)):
+        parser.error("--index needs uncompressed text output")
+    if args.sort_memory < 1:
+        parser.error("--sort-memory must be at least 1 MB")
+    if args.profile_output and not args.profile:
+        parser.error("--profile-output needs --profile")
+
+    converter = Converter(max_depth=args.max_depth)
+    triple_filter = TripleFilter(args.include_subject, args.exclude_subject,
+                                 args.include_predicate, args.exclude_predicate,
+                                 args.include_language, args.exclude_language,
+                                 node_prefix=converter.statement_prefix) or None
+    profiler = Profiler(CLI_HOT_FUNCTIONS)
     try:
-        with open('einstein.ttl', 'r', encoding='utf-8') as input_file:
+        if not args.profile:
+            run(args, converter, profiler, triple_filter)
+        else:
+            with profiler:
+                run(args, converter, profiler, triple_filter)
+    except TTLSyntaxError as e:
+        parser.exit(1, f"Invalid input: {e}\n")
+    if triple_filter is not None:
+        triple_filter.print_report()
+    if args.profile:
+        profiler.print_report()
+        if args.profile_output:
+            profiler.dump(args.profile_output)
+            print(f"cProfile statistics written to {args.profile_output}.")
+
+def run(args, converter: Converter, profiler: Profiler, triple_filter: Optional[TripleFilter] = None):
+    """
+    Convert the input as the command line options ask, timing each stage with the profiler
+    and leaving out what triple_filter rejects.
+    """
+    def output():
+        return open_output(args.output, args.format, args.compression, args.index, args.sort, args.sort_memory << 20)
+
+    if args.stream:
+        start_time = time.time()
+        try:
+            with open_source(args.input) as input_file, \
+                    output() as output_file, \
+                    profiler.stage('stream'):
+                cache = converter.stream(input_file, output_file, triple_filter=triple_filter)
+        except FileNotFoundError:
+            print("Input file not found.")
+            return
+        except IOError as e:
+            print(f"Error writing to output file: {e}")
+            return
+        end_time = time.time()
+        print(f"Streaming conversion executed in {end_time - start_time} seconds.")
+        cache.print_report()
+        return
+
+    if args.compact:
+        start_time = time.time()
+        try:
+            with open_source(args.input) as input_file, profiler.stage('load_store'):
+                store, prefixes = load_store(input_file, triple_filter=triple_filter)
+        except FileNotFoundError:
+            print("Input file not found.")
+            return
+        end_time = time.time()
+        print(f"Preprocessing executed in {end_time - start_time} seconds.")
+        report = store.memory_report()
+        print(f"Store holds {report['triples']} triples and {report['terms']} terms "
+              f"in {report['total_bytes']} bytes ({report['bytes_per_triple']:.1f} bytes per triple).")
+
+        cache = ExpansionCache()
+        start_time = time.time()
+        try:
+            with output() as output_file, \
+                    profiler.stage('convert'):
+                output_file.write(prefixes + "\n")
+                converter.convert(store, output_file, cache=cache)
+        except IOError as e:
+            print(f"Error writing to output file: {e}")
+            return
+        end_time = time.time()
+        print(f"Conversion executed in {end_time - start_time} seconds.")
+        cache.print_report()
+        return
+
+    try:
+        with open_source(args.input) as input_file, profiler.stage('read_input'):
             ttl_text = input_file.read()
     except FileNotFoundError:
         print("Input file not found.")
         return
+
+    if args.workers > 1 and args.input_format not in LINE_FORMATS:
+        start_time = time.time()
+        try:
+            # The profiler only sees this process: the shards' conversion is timed as a whole
+            with output() as output_file, \
+                    profiler.stage('parallel_convert'):
+                cache = parallel_convert(ttl_text, output_file, args.workers, converter, triple_filter)
+        except IOError as e:
+            print(f"Error writing to output file: {e}")
+            return
+        end_time = time.time()
+        print(f"Parallel conversion executed in {end_time - start_time} seconds.")
+        cache.print_report()
+        return
     
     dictionary_of_sections = {}
     
     start_time = time.time()
-    preprocessed_ttl = preprocess_ttl(ttl_text)
-    sections, prefixes = split_by_sections(preprocessed_ttl, dictionary_of_sections)
+    if args.input_format in LINE_FORMATS:
+        # Lines don't depend on each other, so --workers parses them in parallel
+        with profiler.stage('read_ntriples'):
+            sections, prefixes = read_ntriples(ttl_text, args.workers, triple_filter=triple_filter)
+    else:
+        with profiler.stage('split_by_sections'):
+            sections, prefixes = split_by_sections(ttl_text, dictionary_of_sections, triple_filter)
     end_time = time.time()
     print(f"Preprocessing executed in {end_time - start_time} seconds.")
     
     sections.update(dictionary_of_sections)
     
+    if args.incremental:
+        # Rows written under other filters can't be reused
+        options = converter.options()
+        if triple_filter is not None:
+            options.update(triple_filter.options())
+        state = IncrementalState.load(args.incremental, options)
+
+    cache = ExpansionCache()
     start_time = time.time()
     try:
-        with open('output.txt', 'w', encoding='utf-8') as output_file:
+        with output() as output_file, \
+                profiler.stage('convert'):
             output_file.write(prefixes + "\n")
-            convert_and_write_to_file(sections, output_file)
+            if args.incremental:
+                convert_incremental(converter, sections, output_file, state, cache)
+            else:
+                converter.convert(sections, output_file, cache=cache)
+        if args.incremental:
+            state.save()
     except IOError as e:
         print(f"Error writing to output file: {e}")
         return
     end_time = time.time()
     print(f"Conversion executed in {end_time - start_time} seconds.")
+    cache.print_report()
+    if args.incremental:
+        state.print_report()
 
 if __name__ == "__main__":
     main()
-
-# import re
-# from typing import Dict, List, Tuple
-# import uuid
-# import time
-
-# # Statement prefixes used to identify special statements in the TTL format
-# STATEMENT_PREFIX = ["s:", "v:", "ref:", "blank-node:"]
-
-# def preprocess_ttl(ttl_text: str) -> str:
-#     """
-#     Preprocesses a TTL (Turtle) text by normalizing whitespace and punctuation.
-#     """
-#     # Use regex to normalize whitespace and ensure proper spacing around punctuation
-#     preprocessed = re.sub(
-#         r'\s+|([;,])(?!\s)|(?<=[^;\s])\s*\.',
-        
-#         lambda m: ' ' if m.group(0).isspace() else f'{m.group(1)} ' if m.group(1) else '.',
-#         ttl_text
-#     )
-#     # Remove trailing spaces and periods
-#     return preprocessed.rstrip(' .')
-
-# def split_by_periods_keep_quotes(text: str) -> List[str]:
-#     # Split the text by periods, but keep quoted content intact
-#     pattern = r'\.\s+(?=(?:[^"]*"[^"]*")*[^"]*$)'
-#     sections = re.split(pattern, text)
-#     return [section.strip() for section in sections]
-
-# def split_by_semicolons_keep_quotes(text: str) -> List[str]:
-#     # Split the text by semicolons, but keep quoted content intact
-#     pattern = r';\s*(?=(?:[^"]*"[^"]*")*[^"]*$)'
-#     statements = re.split(pattern, text)
-#     return [statement.strip() for statement in statements]
-
-# def split_by_spaces_keep_quotes(text: str) -> List[str]:
-#     # Split the text by spaces, but keep quoted content and URIs intact
-#     pattern = r'"(?:\\.|[^"\\])*"[^\s]*|"(?:\\.|[^"\\])*"|[^\s"]+'
-#     return re.findall(pattern, text)
-
-# def check_for_brackets(section: str, dictionary_of_sections: Dict[str, List[List[str]]]) -> str:
-#     # Process a section of text, replacing bracketed content with UUIDs
-
-#     def process_brackets(text: str, start: int) -> Tuple[str, int]:
-#         # Find the matching closing bracket for an opening bracket
-#         stack = 1
-#         end = start + 1
-#         while stack > 0 and end < len(text):
-#             if text[end] == '[':
-#                 stack += 1
-#             elif text[end] == ']':
-#                 stack -= 1
-#             end += 1
-#         return text[start+1:end-1].strip(), end
-
-#     def recursive_process(text: str) -> str:
-#         # Recursively process the text, handling nested brackets
-#         while '[' in text:
-#             start = text.find('[')
-#             content, end = process_brackets(text, start)
-            
-#             # Recursively process any nested brackets
-#             processed_content = recursive_process(content)
-            
-#             # Generate a new UUID for this bracketed content
-#             new_uuid = f"blank-node:{uuid.uuid4()}"
-            
-#             # Split the processed content into statements and store in dictionary
-#             statements = split_by_semicolons_keep_quotes(processed_content)
-#             dictionary_of_sections[new_uuid] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-            
-#             # Replace the original bracketed content with the new UUID
-#             text = text[:start] + new_uuid + text[end:]
-#         return text
-
-#     # Start the recursive processing of the input section
-#     return recursive_process(section)
-
-# def split_by_sections(preprocessed_text: str, dictionary_of_sections: Dict[str, List[List[str]]]):
-#     # Split the text into sections by periods
-#     sections = split_by_periods_keep_quotes(preprocessed_text)
-#     result = {}
-#     prefixes = []
-    
-#     for section in sections:    
-#         if section.startswith("@prefix"):
-#             # Collect prefix definitions, ensuring the full URI is preserved
-#             prefixes.append(section + ' .')
-#         else:
-#             # Process bracketed content
-#             section = check_for_brackets(section, dictionary_of_sections)
-#             stripped_section = section.strip()
-#             statements = split_by_semicolons_keep_quotes(stripped_section)
-            
-#             # Extract subject and process statements
-#             subject = statements[0].split(" ")[0]
-#             statements[0] = statements[0].replace(subject + " ", "")
-#             result[subject] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-    
-#     return result, "\n".join(prefixes)
-
-# def convert_and_write_to_file(sections: Dict[str, List[List[str]]], output_file):
-#     def recursive_conversion(predicate_chain, index_chain, object, subject):
-#         if object not in sections:
-#             return
-
-#         for triple in sections[object]:
-#             if not triple:  # Skip empty triples
-#                 print(f"Warning: Empty triple found for object {object}")
-#                 continue
-            
-#             new_predicate_chain = predicate_chain + [triple[0]]
-            
-#             if len(triple) > 1 and triple[1].startswith(tuple(STATEMENT_PREFIX)) and object != triple[1]:
-#                 # Handle nested statements
-#                 for i, obj in enumerate(triple[1:], start=1):
-#                     obj = obj[:-1] if obj.endswith(',') else obj
-#                     new_index = index_chain + [str(i)]
-#                     recursive_conversion(new_predicate_chain, new_index, obj, subject)
-#             else:
-#                 # Create new format entries
-#                 predicates = "|".join(new_predicate_chain)
-#                 for i, obj in enumerate(triple[1:], start=1):
-#                     obj = obj[:-1] if obj.endswith(',') else obj
-#                     new_index = index_chain + [str(i)]
-#                     indexes = ",".join(new_index)
-#                     output_file.write(f'{subject} <{predicates}>[{indexes}] {obj}\n')
-
-#     for subject, triples in sections.items():
-#         # Skip special statements
-#         if subject.startswith(tuple(STATEMENT_PREFIX)):
-#             continue
-        
-#         for triple in triples:
-#             if not triple:
-#                 print(f"Warning: Empty triple found for subject {subject}")
-#                 continue
-
-#             predicate_chain = [triple[0]]
-
-#             for i, obj in enumerate(triple[1:], start=1):
-#                 # Remove trailing comma if present
-#                 obj = obj[:-1] if obj.endswith(',') else obj
-                
-#                 if len(triple) > 1 and triple[1].startswith(tuple(STATEMENT_PREFIX)) and triple[1] != subject:
-#                     # Handle nested structures
-#                     recursive_conversion(predicate_chain, [str(i)], obj, subject)
-#                 else:
-#                     # Create new format entry
-#                     predicate = triple[0]
-#                     output_file.write(f'{subject} <{predicate}>[{i}] {obj}\n')
-
-# def main():
-#     # Read input file
-
-#     with open('einstein.ttl', 'r', encoding='utf-8') as input_file:
-#         ttl_text = input_file.read()
-    
-#     # Process the TTL text
-#     dictionary_of_sections = {}
-    
-#     start_time = time.time()
-#     preprocessed_ttl = preprocess_ttl(ttl_text)
-#     sections, prefixes = split_by_sections(preprocessed_ttl, dictionary_of_sections)
-#     end_time = time.time()
-#     execution_time = end_time - start_time
-#     print(f"Preprocessing executed in {execution_time} seconds.")
-    
-#     # Merge processed sections
-#     sections.update(dictionary_of_sections)
-    
-#     start_time = time.time()
-#     # Write output file
-#     with open('output.txt', 'w', encoding='utf-8') as output_file:
-#         # Write prefixes
-#         output_file.write(prefixes + "\n")
-        
-#         # Convert and write directly to file
-#         convert_and_write_to_file(sections, output_file)
-#     end_time = time.time()
-#     execution_time = end_time - start_time
-#     print(f"Conversion executed in {execution_time} seconds.")
-
-# if __name__ == "__main__":
-#     main()
@@ -1,15 +1,29 @@
+import io
 import os
-import re
 import time
+import codecs
 import logging
-import tempfile
-from typing import Dict, List
+from contextlib import asynccontextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, field_validator
+from fastapi import Depends, FastAPI, File, Header, Query, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from logging.handlers import RotatingFileHandler
 
+from ttl_api_common import (TTLInput, cache_options, converter, convert_member, filter_query, log_cuts, log_filter,
+                            parse_sections, stream_batch)
+from ttl_batch import BATCH_FILENAMES, BATCH_MEDIA_TYPES, check_batch_format, open_archive
+from ttl_cache import DEFAULT_MAX_BYTES, ResultCache, cache_key, etag_matches
+from ttl_converter import ExpansionCache, StreamingConverter
+from ttl_filter import TripleFilter
+from ttl_jobs import DONE, Job, JobManager, JobQueueFull, ProgressReader
+from ttl_metrics import CONTENT_TYPE, ConversionMetrics
+from ttl_profile import Profiler
+from ttl_sink import COMPRESSION_MEDIA_TYPES, COMPRESSION_SUFFIXES, buffered_chunks, check_compression
+from ttl_source import open_binary_source
+from ttl_tokenizer import TTLTokenizer
+
 
 # Set up logging
 log_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,231 +39,424 @@ handler.setFormatter(formatter)
 
 logger.addHandler(handler)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Disk state is set up when the server starts rather than on import
+    result_cache.load()
+    job_manager.start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Size of the chunks the upload is read and converted in
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Characters of converted text collected into each (optionally compressed) response chunk
+RESPONSE_BUFFER_SIZE = 1 << 16
+
+# Converted results are cached on disk, keyed by the upload and everything that shapes the output
+CACHE_DIR = os.environ.get('TTL_CACHE_DIR', os.path.join(log_dir, 'cache', 'ttl_converter_ftp_api'))
+CACHE_MAX_BYTES = int(os.environ.get('TTL_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+CACHE_OPTIONS = {'converter': 'ttl_converter_ftp_api', **converter.options()}
+result_cache = ResultCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+# Queued jobs are converted by a fixed number of worker threads; further submissions get 429
+JOBS_DIR = os.environ.get('TTL_JOBS_DIR', os.path.join(log_dir, 'jobs', 'ttl_converter_ftp_api'))
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 16
+
+# Functions reported on their own for requests sent with an X-Profile header
+PROFILED_FUNCTIONS = (
+    'ttl_tokenizer._scan',
+    'ttl_tokenizer._finish_block',
+    'ttl_converter.split_by_sections',
+    'ttl_converter_ftp_api.convert_to_new_format',
+    'ttl_converter.convert',
+    'ttl_converter.expand',
+    'ttl_converter.recursive_conversion',
+)
+
+# Served at /metrics; the gauges and cache counters are read when scraped
+metrics = ConversionMetrics(
+    queued=lambda: job_manager.stats()['queued'],
+    cache_hits=lambda: result_cache.hits,
+    cache_misses=lambda: result_cache.misses,
+)
 
-class TTLInput(BaseModel):
-    ttl_text: str
+def convert_to_new_format(sections: Dict[str, List[List[str]]]) -> str:
+    """
+    Convert the parsed sections to the new format.
 
-    @field_validator('ttl_text')
-    @classmethod
-    def validate_ttl_text(cls, v: str) -> str:
-        if not v.strip():
-            raise ValueError('TTL text cannot be empty')
-        if not re.search(r'\w+:\w+', v):
-            raise ValueError('Invalid TTL format')
-        return v
+    Args:
+    sections (Dict[str, List[List[str]]]): The dictionary of parsed sections.
 
+    Returns:
+    str: The converted text in the new format, one line per triple.
+    """
+    cache = ExpansionCache()
+    text = converter.convert_to_text(sections, cache=cache)
+    log_cuts(cache, logger)
+    return text
 
-# Statement prefixes
-# STATEMENT_PREFIX = ("v:", "s:")
-# TRIPLE_STATEMENT_PREFIX = ("p:", "psv:")
-STATEMENT_PREFIX = ["s:", "v:", "ref:"]
-TRIPLE_STATEMENT_PREFIX = ["p:", "ps:", "psv:", "pq:", "pqv:", "pr:", "prv:", "wdt:"]
 
-def preprocess_ttl(ttl_text: str) -> str:
+def stream_conversion(upload: BinaryIO, first_chunk: str, decoder,
+                      triple_filter: Optional[TripleFilter] = None) -> Iterator[str]:
     """
-    Preprocess the Turtle format text by removing line breaks and excess spaces.
-    
+    Convert an upload incrementally, yielding converted lines as subjects complete.
+
+    The first chunk is tokenized before this returns, so a syntax error in it raises
+    TTLSyntaxError, with its line, column and byte offset, while the request can
+    still be answered with a 400.
+
     Args:
-    ttl_text (str): The input Turtle format text.
-    
+    upload (BinaryIO): The (decompressed) uploaded file, positioned after the first chunk.
+    first_chunk (str): The already decoded first chunk of the upload.
+    decoder: The incremental UTF-8 decoder used for the first chunk.
+    triple_filter (TripleFilter, optional): Leaves out the subjects, statements and literals it rejects.
+
     Returns:
-    str: Preprocessed text as a single line.
+    Iterator[str]: Blocks of converted lines.
     """
-    preprocessed = re.sub(r'\s+', ' ', ttl_text)
-    preprocessed = re.sub(r'([;,])(?!\s)', r'\1 ', preprocessed)
-    preprocessed = re.sub(r'\s+\.', ' .', preprocessed)
-    preprocessed = preprocessed.strip()
-    if preprocessed.endswith('.'):
-        preprocessed = preprocessed[:-1]
-    return preprocessed
-
+    start_time = time.time()
+    timer = metrics.timer()
+    answer = io.StringIO()
+    totals = ExpansionCache(max_size=0)
+
+    def convert_subject(sections, subject):
+        # Nodes come and go while streaming, so expansions are only shared within a subject
+        cache = ExpansionCache()
+        converter.convert(sections, answer, [subject], cache=cache)
+        totals.add_counts(cache.counts())
+
+    streaming = StreamingConverter(convert_subject, statement_prefix=converter.statement_prefix)
+    # A subject's earlier block is written before more than max_pending blocks follow it
+    tokenizer = TTLTokenizer(triple_filter=triple_filter, max_tracked_subjects=streaming.max_pending + 1)
+
+    def read() -> bytes:
+        with timer.stage('read_upload'):
+            return upload.read(UPLOAD_CHUNK_SIZE)
+
+    def split(text: str, final: bool = False) -> list:
+        with timer.stage('split_by_sections'):
+            blocks = tokenizer.feed(text)
+            return blocks + tokenizer.close() if final else blocks
+
+    def drain(blocks, final: bool = False) -> str:
+        with timer.stage('convert_to_new_format'):
+            for block in blocks:
+                streaming.add_block(*block)
+            if final:
+                streaming.close()
+            text = answer.getvalue()
+            answer.seek(0)
+            answer.truncate()
+        metrics.triples.inc(text.count("\n"))
+        return text
 
-def split_by_periods_keep_quotes(text: str) -> List[str]:
+    try:
+        first_blocks = split(first_chunk)
+    except Exception:
+        upload.close()
+        timer.observe()
+        raise
+
+    def converted() -> Iterator[str]:
+        with metrics.in_flight.track():
+            try:
+                text = drain(first_blocks)
+                if text:
+                    yield text
+                for chunk in iter(read, b''):
+                    text = drain(split(decoder.decode(chunk)))
+                    if text:
+                        yield text
+                text = drain(split(decoder.decode(b'', final=True), final=True), final=True)
+                if text:
+                    yield text
+            except Exception as e:
+                # The status line is already sent, so the only signal left is an aborted body
+                logger.error(f"Conversion failed: {str(e)}", exc_info=True)
+                raise
+            finally:
+                # Stops the decompression thread if the client went away mid-stream
+                upload.close()
+                timer.observe()
+
+        log_cuts(totals, logger)
+        log_filter(triple_filter, metrics, logger)
+        logger.info(f"Conversion completed in {time.time() - start_time:.2f} seconds")
+
+    return converted()
+
+
+def profile_conversion(upload: BinaryIO, include_summary: bool = False,
+                       triple_filter: Optional[TripleFilter] = None) -> Dict:
     """
-    Split the text by periods, preserving quoted content.
+    Convert an upload in the calling thread under a Profiler and report where the time went.
 
     Args:
-    text (str): The input text to split.
+    upload (BinaryIO): The uploaded file, optionally compressed.
+    include_summary (bool): Add the cProfile listing of the most expensive functions.
+    triple_filter (TripleFilter, optional): Leaves out the subjects, statements and literals it rejects.
 
     Returns:
-    List[str]: A list of sections split by periods.
+    Dict: Seconds per stage, calls and seconds per hot function, the peak traced memory
+    and the number of triples and bytes the conversion produced.
     """
-    pattern = r'\.\s+(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    sections = re.split(pattern, text)
-    return [section.strip() for section in sections]
-
-
-def split_by_semicolons_keep_quotes(text: str) -> List[str]:
+    with Profiler(PROFILED_FUNCTIONS) as profiler:
+        with profiler.stage('read_upload'):
+            source = open_binary_source(upload)
+            try:
+                ttl_text = source.read().decode("utf-8")
+            finally:
+                source.close()
+        TTLInput(ttl_text=ttl_text)
+        with profiler.stage('split_by_sections'):
+            sections = parse_sections(ttl_text, triple_filter)
+        with profiler.stage('convert_to_new_format'):
+            text = convert_to_new_format(sections)
+    log_filter(triple_filter, metrics, logger)
+    report = profiler.report()
+    report['triples'] = text.count("\n")
+    report['output_bytes'] = len(text.encode("utf-8"))
+    if include_summary:
+        report['cprofile'] = profiler.summary()
+    return report
+
+
+def run_job(job: Job) -> Iterator[str]:
     """
-    Split the text by semicolons, preserving quoted content.
+    Convert the upload of a queued job, reporting the bytes read as its progress.
 
     Args:
-    text (str): The input text to split.
+    job (Job): The job, whose upload has been saved to job.input_path.
 
-    Returns:
-    List[str]: A list of statements split by semicolons.
+    Yields:
+    str: Blocks of converted lines.
     """
-    pattern = r';\s*(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    statements = re.split(pattern, text)
-    return [statement.strip() for statement in statements]
+    try:
+        with open(job.input_path, 'rb') as raw_upload:
+            upload = ProgressReader(open_binary_source(raw_upload), job)
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            first_chunk = decoder.decode(upload.read(UPLOAD_CHUNK_SIZE))
+            TTLInput(ttl_text=first_chunk)
+            yield from stream_conversion(upload, first_chunk, decoder)
+    except Exception:
+        metrics.errors.inc(1, 'jobs')
+        raise
+
 
+job_manager = JobManager(run_job, JOBS_DIR, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE)
 
-def split_by_spaces_keep_quotes(text: str) -> List[str]:
+
+@app.post("/convert")
+async def convert_ttl(file: UploadFile = File(...), compression: Optional[str] = None,
+                      triple_filter: Optional[TripleFilter] = Depends(filter_query),
+                      if_none_match: Optional[str] = Header(None),
+                      x_profile: Optional[str] = Header(None)) -> Response:
     """
-    Split the text by spaces, preserving quoted content and handling special cases.
+    Convert uploaded TTL file to the new format.
+
+    The upload is read in chunks and the converted lines are streamed back as soon
+    as each subject is complete, so memory stays bounded per request. Uploads
+    compressed with gzip, bz2 or xz are detected and decompressed on the fly.
+    Results are cached on disk by upload hash and served again with an ETag.
+
+    With an X-Profile header the upload is converted under the profiler instead, bypassing
+    the cache, and the profile is returned as JSON rather than the converted file.
+
+    The include and exclude parameters can be repeated. Subject and predicate patterns
+    select the written subjects and their statements, language tags select literals; a
+    pattern ending in ':' or '*' matches a prefix.
 
     Args:
-    text (str): The input text to split.
+    file (UploadFile): The uploaded TTL file.
+    compression (str, optional): Compress the response with gzip, bz2 or xz.
+    triple_filter (TripleFilter, optional): Built by filter_query from the include and exclude parameters.
+    if_none_match (str, optional): ETags the client already holds the result for.
+    x_profile (str, optional): Any value profiles the conversion; `cprofile` adds the cProfile listing.
 
     Returns:
-    List[str]: A list of tokens split by spaces.
+    Response: The converted file as a downloadable response, 304 Not Modified, or the profile.
     """
-    pattern = r'"(?:\\.|[^"\\])*"[^\s]*|"(?:\\.|[^"\\])*"|[^\s"]+'
-    return re.findall(pattern, text)
+    try:
+        logger.info(f"Received file: {file.filename}")
+        metrics.requests.inc(1, 'convert')
+        metrics.input_bytes.inc(file.size or 0, 'convert')
+        check_compression(compression)
+
+        if x_profile:
+            logger.info("Profiling TTL conversion")
+            report = await run_in_threadpool(profile_conversion, file.file, x_profile.lower() == 'cprofile',
+                                             triple_filter)
+            return JSONResponse(report)
+
+        # Results are keyed by the upload and the options, filters included
+        key = await run_in_threadpool(cache_key, file.file, cache_options(CACHE_OPTIONS, triple_filter))
+        etag = f'"{key}{COMPRESSION_SUFFIXES.get(compression, "")}"'
+        if etag_matches(if_none_match, etag):
+            result_cache.revalidations += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        headers = {
+            "Content-Disposition": f'attachment; filename="converted_ttl.txt{COMPRESSION_SUFFIXES.get(compression, "")}"',
+            "ETag": etag,
+        }
+
+        cached = result_cache.get(key)
+        if cached is not None:
+            logger.info("Serving cached conversion")
+            return StreamingResponse(
+                metrics.metered(buffered_chunks(cached, compression, RESPONSE_BUFFER_SIZE), 'convert'),
+                media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+                headers={**headers, "X-Cache": "HIT"}
+            )
+        
+        # Compressed uploads are decompressed in a background thread while the text is parsed
+        upload = open_binary_source(file.file)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        first_chunk = decoder.decode(await run_in_threadpool(upload.read, UPLOAD_CHUNK_SIZE))
+        
+        TTLInput(ttl_text=first_chunk)
+        
+        logger.info("Starting TTL conversion")
+        converted = await run_in_threadpool(stream_conversion, upload, first_chunk, decoder, triple_filter)
+        return StreamingResponse(
+            metrics.metered(buffered_chunks(result_cache.store(key, converted),
+                                            compression, RESPONSE_BUFFER_SIZE), 'convert'),
+            media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+            headers={**headers, "X-Cache": "MISS"}
+        )
 
+    except Exception as e:
+        logger.error(f"Conversion failed: {str(e)}", exc_info=True)
+        metrics.errors.inc(1, 'convert')
+        raise HTTPException(status_code=400, detail=f"Conversion failed: {str(e)}")
 
-def split_by_sections(preprocessed_text: str) -> Dict:
+
+@app.get("/cache")
+async def cache_stats():
     """
-    Split the preprocessed text into sections based on periods.
-    
-    Args:
-    preprocessed_text (str): The preprocessed Turtle format text.
-    
+    Hit and miss counts and size of the result cache.
+
     Returns:
-    Dict: A dictionary with subjects as keys and lists of statement parts as values.
+    dict: The cache counters, entry count and size in bytes.
     """
-    sections = split_by_periods_keep_quotes(preprocessed_text)
-    result = {}
-    
-    for section in sections:
-        if "[" in section:
-            continue
-        
-        stripped_section = section.strip()
-        statements = split_by_semicolons_keep_quotes(stripped_section)
-        subject = statements[0].split(" ")[0]
-        statements[0] = statements[0].replace(subject + " ", "")
-        result[subject] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-    return result
+    return result_cache.stats()
 
 
-def recursive_conversion(sections, predicate_chain, index_chain, object, subject):
+@app.post("/convert/batch")
+async def convert_batch(file: UploadFile = File(...),
+                        batch_format: str = Query('tar', alias='format')) -> StreamingResponse:
     """
-    Recursively convert nested triples to the new format.
+    Convert a tar or zip archive of TTL files in one request.
+
+    The members are read and converted one after another while the response
+    streams; the multiprocessed server converts them in parallel across its pool.
 
     Args:
-    sections (Dict): The dictionary of sections.
-    predicate_chain (List[str]): The current chain of predicates.
-    index_chain (List[str]): The current chain of indices.
-    object (str): The current object being processed.
-    subject (str): The original subject of the statement.
+    file (UploadFile): A zip or (optionally compressed) tar archive of TTL files.
+    batch_format (str): tar or zip for an archive with one output per file, or text for
+    the outputs concatenated behind `# file: <name>` markers.
+
+    Returns:
+    StreamingResponse: The converted batch as a downloadable response.
     """
-    if object not in sections:
-        return
+    try:
+        logger.info(f"Received batch: {file.filename}")
+        metrics.requests.inc(1, 'batch')
+        metrics.input_bytes.inc(file.size or 0, 'batch')
+        check_batch_format(batch_format)
+        members = await run_in_threadpool(open_archive, file.file)
+        return StreamingResponse(
+            metrics.metered(stream_batch(map(convert_member, members), batch_format, metrics, logger), 'batch'),
+            media_type=BATCH_MEDIA_TYPES[batch_format],
+            headers={"Content-Disposition": f'attachment; filename="{BATCH_FILENAMES[batch_format]}"'}
+        )
 
-    for triple in sections[object]:
-        new_predicate_chain = predicate_chain.copy()
-        new_index_chain = index_chain.copy()
-        new_predicate_chain.append(triple[0])
-        
-        if triple[0].startswith(TRIPLE_STATEMENT_PREFIX):
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                new_index = new_index_chain + [str(i)]
-                recursive_conversion(sections, new_predicate_chain, new_index, obj, subject)
-        else:
-            predicate = "|".join(new_predicate_chain)
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                new_index = new_index_chain + [str(i)]
-                index = ",".join(new_index)
-                answer.append(f'{subject} <{predicate}>[{index}] {obj}')
+    except Exception as e:
+        logger.error(f"Batch conversion failed: {str(e)}", exc_info=True)
+        metrics.errors.inc(1, 'batch')
+        raise HTTPException(status_code=400, detail=f"Batch conversion failed: {str(e)}")
 
 
-def convert_to_new_format(sections: Dict[str, List[List[str]]]) -> str:
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)) -> dict:
     """
-    Convert the parsed sections to the new format.
+    Queue a TTL file for conversion and return at once.
 
     Args:
-    sections (Dict[str, List[List[str]]]): The dictionary of parsed sections.
+    file (UploadFile): The uploaded TTL file, optionally gzip, bz2 or xz compressed.
 
     Returns:
-    str: The converted text in the new format.
+    dict: The job, whose id is polled at /jobs/{id}.
     """
-    global answer
-    answer = []
-    
-    for subject, triples in sections.items():
-        if subject.startswith(STATEMENT_PREFIX):
-            continue
-        
-        for triple in triples:
-            predicate_chain = [triple[0]]
-            index_chain = []
-            
-            if triple[0].startswith(TRIPLE_STATEMENT_PREFIX):
-                for i, obj in enumerate(triple[1:], start=1):
-                    obj = obj[:-1] if obj.endswith(',') else obj
-                    recursive_conversion(sections, predicate_chain, [str(i)], obj, subject)
-            else:
-                predicate = triple[0]
-                for i, obj in enumerate(triple[1:], start=1):
-                    obj = obj[:-1] if obj.endswith(',') else obj
-                    answer.append(f'{subject} <{predicate}>[{i}] {obj}')
-    
-    return "\n".join(answer)
+    metrics.requests.inc(1, 'jobs')
+    try:
+        job = await run_in_threadpool(job_manager.submit, file.file, file.filename or "")
+    except JobQueueFull as e:
+        logger.warning(f"Rejected job for {file.filename}: {str(e)}")
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later", headers={"Retry-After": "10"})
+    metrics.input_bytes.inc(job.bytes_total, 'jobs')
+    logger.info(f"Queued job {job.id} for {file.filename}")
+    return job.to_dict()
 
 
-@app.post("/convert")
-async def convert_ttl(file: UploadFile = File(...)) -> FileResponse:
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> dict:
     """
-    Convert uploaded TTL file to the new format.
+    Status and progress of a job.
 
     Args:
-    file (UploadFile): The uploaded TTL file.
+    job_id (str): The id returned by POST /jobs.
 
     Returns:
-    FileResponse: The converted file as a downloadable response.
+    dict: Status, bytes processed out of bytes uploaded, triples emitted and any error.
     """
-    try:
-        start_time = time.time()
-        logger.info(f"Received file: {file.filename}")
-        
-        contents = await file.read()
-        ttl_text = contents.decode("utf-8")
-        
-        TTLInput(ttl_text=ttl_text)
-        
-        logger.info("Starting TTL conversion")
-        preprocessed = preprocess_ttl(ttl_text)
-        logger.debug(f"Preprocessed TTL: {preprocessed}")
-        sections = split_by_sections(preprocessed)
-        logger.debug(f"Split sections: {sections}")
-        new_format = convert_to_new_format(sections)
-        logger.info("TTL conversion completed successfully")
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
-        end_time = time.time()
-        execution_time = end_time - start_time
 
-        logger.info(f"Conversion completed in {execution_time:.2f} seconds")
-
-        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.txt') as temp_file:
-            temp_file.write(new_format)
-            temp_file_path = temp_file.name
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, compression: Optional[str] = None) -> StreamingResponse:
+    """
+    The converted file of a finished job.
 
-        logger.info(f"Converted file saved to: {temp_file_path}")
+    Args:
+    job_id (str): The id returned by POST /jobs.
+    compression (str, optional): Compress the response with gzip, bz2 or xz.
 
-        return FileResponse(
-            temp_file_path,
-            media_type='text/plain',
-            filename="converted_ttl.txt",
-            headers={"X-Execution-Time": str(execution_time)}
-        )
+    Returns:
+    StreamingResponse: The converted file as a downloadable response.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    try:
+        check_compression(compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        metrics.metered(buffered_chunks(job_manager.result(job), compression, RESPONSE_BUFFER_SIZE), 'jobs'),
+        media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+        headers={"Content-Disposition":
+                 f'attachment; filename="converted_ttl.txt{COMPRESSION_SUFFIXES.get(compression, "")}"'}
+    )
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """
+    Stage timings, byte, triple and error counters and in-flight and queued
+    conversions in the Prometheus text format.
 
-    except Exception as e:
-        logger.error(f"Conversion failed: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=400, detail=f"Conversion failed: {str(e)}")
+    Returns:
+    Response: The metrics of this server process.
+    """
+    return Response(metrics.registry.render(), media_type=CONTENT_TYPE)
 
 
 @app.get("/health")
@@ -1,16 +1,28 @@
 import os
-import re
 import time
+import pickle
 import logging
-import tempfile
-from typing import Dict, List
-from multiprocessing import Pool, cpu_count
+from contextlib import asynccontextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from multiprocessing import Pool, cpu_count, resource_tracker, shared_memory
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, field_validator
+from fastapi import Depends, FastAPI, File, Header, Query, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from logging.handlers import RotatingFileHandler
 
+from ttl_api_common import (TTLInput, cache_options, converter, convert_member, filter_query, log_cuts, log_filter,
+                            parse_sections, stream_batch)
+from ttl_batch import BATCH_FILENAMES, BATCH_MEDIA_TYPES, check_batch_format, open_archive
+from ttl_cache import DEFAULT_MAX_BYTES, ResultCache, cache_key, etag_matches
+from ttl_converter import ExpansionCache
+from ttl_filter import TripleFilter
+from ttl_jobs import DONE, Job, JobManager, JobQueueFull, ProgressReader
+from ttl_metrics import CONTENT_TYPE, ConversionMetrics, StageTimer
+from ttl_profile import Profiler
+from ttl_sink import COMPRESSION_MEDIA_TYPES, COMPRESSION_SUFFIXES, buffered_chunks, check_compression
+from ttl_source import open_binary_source
+
 # Set up logging
 log_dir = os.path.dirname(os.path.abspath(__file__))
 log_file = os.path.join(log_dir, 'log.txt')
@@ -25,155 +37,296 @@ handler.setFormatter(formatter)
 
 logger.addHandler(handler)
 
-app = FastAPI()
-
-class TTLInput(BaseModel):
-    ttl_text: str
-
-    @field_validator('ttl_text')
-    @classmethod
-    def validate_ttl_text(cls, v: str) -> str:
-        if not v.strip():
-            raise ValueError('TTL text cannot be empty')
-        if not re.search(r'\w+:\w+', v):
-            raise ValueError('Invalid TTL format')
-        return v
-
-# Statement prefixes
-STATEMENT_PREFIX = ("v:", "s:")
-TRIPLE_STATEMENT_PREFIX = ("p:", "psv:")
-
-def preprocess_ttl(ttl_text: str) -> str:
-    preprocessed = re.sub(r'\s+', ' ', ttl_text)
-    preprocessed = re.sub(r'([;,])(?!\s)', r'\1 ', preprocessed)
-    preprocessed = re.sub(r'\s+\.', ' .', preprocessed)
-    preprocessed = preprocessed.strip()
-    if preprocessed.endswith('.'):
-        preprocessed = preprocessed[:-1]
-    return preprocessed
-
-def split_by_periods_keep_quotes(text: str) -> List[str]:
-    pattern = r'\.\s+(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    sections = re.split(pattern, text)
-    return [section.strip() for section in sections]
-
-def split_by_semicolons_keep_quotes(text: str) -> List[str]:
-    pattern = r';\s*(?=(?:[^"]*"[^"]*")*[^"]*$)'
-    statements = re.split(pattern, text)
-    return [statement.strip() for statement in statements]
-
-def split_by_spaces_keep_quotes(text: str) -> List[str]:
-    pattern = r'"(?:\\.|[^"\\])*"[^\s]*|"(?:\\.|[^"\\])*"|[^\s"]+'
-    return re.findall(pattern, text)
-
-def split_by_sections(preprocessed_text: str) -> Dict:
-    sections = split_by_periods_keep_quotes(preprocessed_text)
-    result = {}
-    
-    for section in sections:
-        if "[" in section:
-            continue
-        
-        stripped_section = section.strip()
-        statements = split_by_semicolons_keep_quotes(stripped_section)
-        subject = statements[0].split(" ")[0]
-        statements[0] = statements[0].replace(subject + " ", "")
-        result[subject] = [split_by_spaces_keep_quotes(statement) for statement in statements]
-    return result
-
-def recursive_conversion(sections, predicate_chain, index_chain, object, subject, local_answer):
-    if object not in sections:
-        return
-
-    for triple in sections[object]:
-        new_predicate_chain = predicate_chain.copy()
-        new_index_chain = index_chain.copy()
-        new_predicate_chain.append(triple[0])
-        
-        if triple[0].startswith(TRIPLE_STATEMENT_PREFIX):
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                new_index = new_index_chain + [str(i)]
-                recursive_conversion(sections, new_predicate_chain, new_index, obj, subject, local_answer)
-        else:
-            predicate = "|".join(new_predicate_chain)
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                new_index = new_index_chain + [str(i)]
-                index = ",".join(new_index)
-                local_answer.append(f'{subject} <{predicate}>[{index}] {obj}')
-
-def process_section(section_data, sections):
-    subject, triples = section_data
-    local_answer = []
-    
-    if subject.startswith(STATEMENT_PREFIX):
-        return local_answer
-    
-    for triple in triples:
-        predicate_chain = [triple[0]]
-        index_chain = []
-        
-        if triple[0].startswith(TRIPLE_STATEMENT_PREFIX):
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                recursive_conversion(sections, predicate_chain, [str(i)], obj, subject, local_answer)
-        else:
-            predicate = triple[0]
-            for i, obj in enumerate(triple[1:], start=1):
-                obj = obj[:-1] if obj.endswith(',') else obj
-                local_answer.append(f'{subject} <{predicate}>[{i}] {obj}')
-    
-    return local_answer
-
-def convert_to_new_format(sections: Dict[str, List[List[str]]]) -> str:
-    with Pool(processes=cpu_count()) as pool:
-        results = pool.starmap(process_section, [(item, sections) for item in sections.items()])
-    
-    answer = [item for sublist in results for item in sublist]
-    return "\n".join(answer)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pool for the lifetime of the server instead of one per request. The resource
+    # tracker is started first so workers share it and never unlink request buffers.
+    resource_tracker.ensure_running()
+    pool = Pool(processes=cpu_count())
+    app.state.pool = pool
+    # Disk state is set up here rather than on import, which every spawned worker repeats
+    result_cache.load()
+    job_manager.start()
+    try:
+        yield
+    finally:
+        pool.terminate()
+        pool.join()
+
+app = FastAPI(lifespan=lifespan)
+
+# Characters of converted text collected into each (optionally compressed) response chunk
+RESPONSE_BUFFER_SIZE = 1 << 16
+
+# Converted results are cached on disk, keyed by the upload and everything that shapes the output
+CACHE_DIR = os.environ.get('TTL_CACHE_DIR', os.path.join(log_dir, 'cache', 'ttl_converter_ftp_api_multiprocessed'))
+CACHE_MAX_BYTES = int(os.environ.get('TTL_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+CACHE_OPTIONS = {'converter': 'ttl_converter_ftp_api_multiprocessed', **converter.options()}
+result_cache = ResultCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+# Queued jobs are converted by a fixed number of worker threads; further submissions get 429
+JOBS_DIR = os.environ.get('TTL_JOBS_DIR', os.path.join(log_dir, 'jobs', 'ttl_converter_ftp_api_multiprocessed'))
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 16
+
+# Functions reported on their own for requests sent with an X-Profile header
+PROFILED_FUNCTIONS = (
+    'ttl_tokenizer._scan',
+    'ttl_tokenizer._finish_block',
+    'ttl_converter.split_by_sections',
+    'ttl_converter.convert',
+    'ttl_converter.expand',
+    'ttl_converter.recursive_conversion',
+)
+
+# Served at /metrics; the gauges and cache counters are read when scraped
+metrics = ConversionMetrics(
+    queued=lambda: job_manager.stats()['queued'],
+    cache_hits=lambda: result_cache.hits,
+    cache_misses=lambda: result_cache.misses,
+)
+
+# Number of archive members converted per pool task in a batch
+BATCH_CHUNK_SIZE = 16
+
+# Number of subjects converted per pool task
+SUBJECT_BATCH_SIZE = 256
+
+# Sections of the request a worker last converted, keyed by shared memory name
+_worker_sections: Dict[str, Dict[str, List[List[str]]]] = {}
+
+def load_sections(name: str) -> Dict[str, List[List[str]]]:
+    # Unpickled once per request and worker, then reused by every batch of that request
+    if name not in _worker_sections:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            sections = pickle.loads(shm.buf)
+        finally:
+            shm.close()
+        _worker_sections.clear()
+        _worker_sections[name] = sections
+    return _worker_sections[name]
+
+def process_batch(batch: Tuple[str, List[str]]) -> Tuple[str, Dict[str, int]]:
+    name, subjects = batch
+    cache = ExpansionCache()
+    text = converter.convert_to_text(load_sections(name), subjects, cache)
+    return text, cache.counts()
+
+def convert_to_new_format(sections: Dict[str, List[List[str]]], pool) -> Iterator[str]:
+    # Ship the sections once through shared memory; tasks only carry subject names
+    payload = pickle.dumps(sections, protocol=pickle.HIGHEST_PROTOCOL)
+    shm = shared_memory.SharedMemory(create=True, size=len(payload))
+    try:
+        shm.buf[:len(payload)] = payload
+        del payload
+        subjects = [subject for subject in sections if not converter.is_node(subject)]
+        batches = [(shm.name, subjects[i:i + SUBJECT_BATCH_SIZE]) for i in range(0, len(subjects), SUBJECT_BATCH_SIZE)]
+        totals = ExpansionCache(max_size=0)
+        # imap keeps the input order while later batches are still being converted
+        for text, counts in pool.imap(process_batch, batches):
+            totals.add_counts(counts)
+            if text:
+                yield text
+        log_cuts(totals, logger)
+    finally:
+        shm.close()
+        shm.unlink()
+
+def stream_conversion(sections: Dict[str, List[List[str]]], pool, start_time: float,
+                      timer: StageTimer) -> Iterator[str]:
+    # Only the time spent producing each block counts as convert_to_new_format, not the time suspended
+    with metrics.in_flight.track():
+        try:
+            blocks = convert_to_new_format(sections, pool)
+            while True:
+                with timer.stage('convert_to_new_format'):
+                    text = next(blocks, None)
+                if text is None:
+                    break
+                metrics.triples.inc(text.count("\n"))
+                yield text
+        finally:
+            timer.observe()
+    logger.info(f"Conversion completed in {time.time() - start_time:.2f} seconds")
+
+def profile_conversion(upload, include_summary: bool = False, triple_filter: Optional[TripleFilter] = None) -> Dict:
+    # Converted in this thread rather than the pool, where the profiler couldn't follow
+    with Profiler(PROFILED_FUNCTIONS) as profiler:
+        with profiler.stage('read_upload'):
+            source = open_binary_source(upload)
+            try:
+                ttl_text = source.read().decode("utf-8")
+            finally:
+                source.close()
+        TTLInput(ttl_text=ttl_text)
+        with profiler.stage('split_by_sections'):
+            sections = parse_sections(ttl_text, triple_filter)
+        with profiler.stage('convert_to_new_format'):
+            text = converter.convert_to_text(sections)
+    log_filter(triple_filter, metrics, logger)
+    report = profiler.report()
+    report['triples'] = text.count("\n")
+    report['output_bytes'] = len(text.encode("utf-8"))
+    if include_summary:
+        report['cprofile'] = profiler.summary()
+    return report
+
+def read_sections(upload, timer, triple_filter: Optional[TripleFilter] = None) -> Dict:
+    # Reads, decodes, validates and splits a whole upload, which takes time and memory in
+    # proportion to its size, so /convert runs it in a thread
+    with timer.stage('read_upload'):
+        try:
+            ttl_text = upload.read().decode("utf-8")
+        finally:
+            upload.close()
+    TTLInput(ttl_text=ttl_text)
+    with timer.stage('split_by_sections'):
+        return parse_sections(ttl_text, triple_filter)
+
+def run_job(job: Job) -> Iterator[str]:
+    start_time = time.time()
+    timer = metrics.timer()
+    try:
+        with metrics.in_flight.track():
+            with open(job.input_path, 'rb') as raw_upload:
+                sections = read_sections(ProgressReader(open_binary_source(raw_upload), job), timer)
+        yield from stream_conversion(sections, app.state.pool, start_time, timer)
+    except Exception:
+        metrics.errors.inc(1, 'jobs')
+        raise
+
+job_manager = JobManager(run_job, JOBS_DIR, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE)
 
 @app.post("/convert")
-async def convert_ttl(file: UploadFile = File(...)) -> FileResponse:
+async def convert_ttl(file: UploadFile = File(...), compression: Optional[str] = None,
+                      triple_filter: Optional[TripleFilter] = Depends(filter_query),
+                      if_none_match: Optional[str] = Header(None),
+                      x_profile: Optional[str] = Header(None)) -> Response:
     try:
         start_time = time.time()
         logger.info(f"Received file: {file.filename}")
+        metrics.requests.inc(1, 'convert')
+        metrics.input_bytes.inc(file.size or 0, 'convert')
+        check_compression(compression)
+
+        # X-Profile returns the profile of an uncached, in-process conversion instead of the output
+        if x_profile:
+            logger.info("Profiling TTL conversion")
+            report = await run_in_threadpool(profile_conversion, file.file, x_profile.lower() == 'cprofile',
+                                             triple_filter)
+            return JSONResponse(report)
+
+        # Results are cached by upload hash and filters; a client holding the ETag gets 304
+        key = await run_in_threadpool(cache_key, file.file, cache_options(CACHE_OPTIONS, triple_filter))
+        etag = f'"{key}{COMPRESSION_SUFFIXES.get(compression, "")}"'
+        if etag_matches(if_none_match, etag):
+            result_cache.revalidations += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        headers = {
+            "Content-Disposition": f'attachment; filename="converted_ttl.txt{COMPRESSION_SUFFIXES.get(compression, "")}"',
+            "ETag": etag,
+        }
+
+        cached = result_cache.get(key)
+        if cached is not None:
+            logger.info("Serving cached conversion")
+            return StreamingResponse(
+                metrics.metered(buffered_chunks(cached, compression, RESPONSE_BUFFER_SIZE), 'convert'),
+                media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+                headers={**headers, "X-Cache": "HIT"}
+            )
         
-        contents = await file.read()
-        ttl_text = contents.decode("utf-8")
-        
-        TTLInput(ttl_text=ttl_text)
-        
-        logger.info("Starting TTL conversion")
-        preprocessed = preprocess_ttl(ttl_text)
-        logger.debug(f"Preprocessed TTL: {preprocessed}")
-        sections = split_by_sections(preprocessed)
-        logger.debug(f"Split sections: {sections}")
-        new_format = convert_to_new_format(sections)
-        logger.info("TTL conversion completed successfully")
-
-        end_time = time.time()
-        execution_time = end_time - start_time
-
-        logger.info(f"Conversion completed in {execution_time:.2f} seconds")
-
-        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.txt') as temp_file:
-            temp_file.write(new_format)
-            temp_file_path = temp_file.name
-
-        logger.info(f"Converted file saved to: {temp_file_path}")
-
-        return FileResponse(
-            temp_file_path,
-            media_type='text/plain',
-            filename="converted_ttl.txt",
-            headers={"X-Execution-Time": str(execution_time)}
+        timer = metrics.timer()
+        with metrics.in_flight.track():
+            logger.info("Starting TTL conversion")
+            # Reading, decoding, validation, parsing and the pool round-trips run in threads
+            # so the event loop stays free; compressed uploads are decompressed in a background thread
+            sections = await run_in_threadpool(read_sections, open_binary_source(file.file), timer, triple_filter)
+            log_filter(triple_filter, metrics, logger)
+            logger.debug("Split %s sections", len(sections))
+
+        return StreamingResponse(
+            metrics.metered(buffered_chunks(
+                result_cache.store(key, stream_conversion(sections, app.state.pool, start_time, timer)),
+                compression, RESPONSE_BUFFER_SIZE), 'convert'),
+            media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+            headers={**headers, "X-Cache": "MISS"}
         )
 
     except Exception as e:
         logger.error(f"Conversion failed: {str(e)}", exc_info=True)
+        metrics.errors.inc(1, 'convert')
         raise HTTPException(status_code=400, detail=f"Conversion failed: {str(e)}")
 
+@app.get("/cache")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.post("/convert/batch")
+async def convert_batch(file: UploadFile = File(...),
+                        batch_format: str = Query('tar', alias='format')) -> StreamingResponse:
+    try:
+        logger.info(f"Received batch: {file.filename}")
+        metrics.requests.inc(1, 'batch')
+        metrics.input_bytes.inc(file.size or 0, 'batch')
+        check_batch_format(batch_format)
+        members = await run_in_threadpool(open_archive, file.file)
+        # Members are read lazily and converted across the pool; imap keeps the archive order
+        results = app.state.pool.imap(convert_member, members, chunksize=BATCH_CHUNK_SIZE)
+        return StreamingResponse(
+            metrics.metered(stream_batch(results, batch_format, metrics, logger), 'batch'),
+            media_type=BATCH_MEDIA_TYPES[batch_format],
+            headers={"Content-Disposition": f'attachment; filename="{BATCH_FILENAMES[batch_format]}"'}
+        )
+
+    except Exception as e:
+        logger.error(f"Batch conversion failed: {str(e)}", exc_info=True)
+        metrics.errors.inc(1, 'batch')
+        raise HTTPException(status_code=400, detail=f"Batch conversion failed: {str(e)}")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)) -> dict:
+    metrics.requests.inc(1, 'jobs')
+    try:
+        job = await run_in_threadpool(job_manager.submit, file.file, file.filename or "")
+    except JobQueueFull as e:
+        logger.warning(f"Rejected job for {file.filename}: {str(e)}")
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later", headers={"Retry-After": "10"})
+    metrics.input_bytes.inc(job.bytes_total, 'jobs')
+    logger.info(f"Queued job {job.id} for {file.filename}")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> dict:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, compression: Optional[str] = None) -> StreamingResponse:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    try:
+        check_compression(compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        metrics.metered(buffered_chunks(job_manager.result(job), compression, RESPONSE_BUFFER_SIZE), 'jobs'),
+        media_type=COMPRESSION_MEDIA_TYPES.get(compression, 'text/plain'),
+        headers={"Content-Disposition":
+                 f'attachment; filename="converted_ttl.txt{COMPRESSION_SUFFIXES.get(compression, "")}"'}
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    # Prometheus text format; pool workers record nothing, all metrics are kept in the server process
+    return Response(metrics.registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     logger.info("Health check endpoint accessed")
@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class Patterns:
+    """
+    Terms to match: a pattern ending in ':' or '*' matches every term starting with
+    it (without the '*'), any other pattern matches one term exactly.
+    """
+
+    def __init__(self, patterns: Iterable[str] = (), lowercase: bool = False):
+        self.patterns = tuple(pattern.lower() if lowercase else pattern for pattern in patterns)
+        self.lowercase = lowercase
+        self.exact = frozenset(pattern for pattern in self.patterns if not pattern.endswith(('*', ':')))
+        self.prefixes = tuple(pattern.rstrip('*') for pattern in self.patterns if pattern.endswith(('*', ':')))
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def __contains__(self, term: str) -> bool:
+        if self.lowercase:
+            term = term.lower()
+        return term in self.exact or term.startswith(self.prefixes)
+
+
+def literal_language(token: str) -> Optional[str]:
+    """
+    The language tag of a literal token, or None for a literal without one.
+    """
+    at = token.rfind('@')
+    if at > 0 and token[at - 1] in '"\'':
+        return token[at + 1:]
+    return None
+
+
+class TripleFilter:
+    """
+    Include and exclude patterns on subjects, predicates and literal languages,
+    applied while the input is tokenized, and counters of what was skipped.
+
+    Subject and predicate patterns select the subjects that are written and their
+    statements, so the predicate is the first one of every chain; the statement,
+    value, reference and blank nodes starting with node_prefix are always kept,
+    since they are only written through the subjects that reach them. Language
+    patterns apply to every literal with a language tag, at any depth; literals
+    without one are kept. An empty include list includes everything.
+
+    The counters make a filter specific to one conversion: create one per run.
+    """
+
+    def __init__(self, include_subjects: Iterable[str] = (), exclude_subjects: Iterable[str] = (),
+                 include_predicates: Iterable[str] = (), exclude_predicates: Iterable[str] = (),
+                 include_languages: Iterable[str] = (), exclude_languages: Iterable[str] = (),
+                 node_prefix: Tuple[str, ...] = ()):
+        self.include_subjects = Patterns(include_subjects)
+        self.exclude_subjects = Patterns(exclude_subjects)
+        self.include_predicates = Patterns(include_predicates)
+        self.exclude_predicates = Patterns(exclude_predicates)
+        self.include_languages = Patterns(include_languages, lowercase=True)
+        self.exclude_languages = Patterns(exclude_languages, lowercase=True)
+        self.node_prefix = tuple(node_prefix) + ('blank-node:',)
+        self.filters_literals = bool(self.include_languages or self.exclude_languages)
+        self.skipped_subjects = 0
+        self.skipped_statements = 0
+        self.skipped_literals = 0
+
+    def __bool__(self) -> bool:
+        return any((self.include_subjects, self.exclude_subjects, self.include_predicates,
+                    self.exclude_predicates, self.include_languages, self.exclude_languages))
+
+    def options(self) -> Dict:
+        """
+        The patterns, e.g. for keying cached results.
+        """
+        return {name: getattr(self, name).patterns for name in (
+            'include_subjects', 'exclude_subjects', 'include_predicates', 'exclude_predicates',
+            'include_languages', 'exclude_languages') if getattr(self, name)}
+
+    def is_node(self, subject: str) -> bool:
+        return subject.startswith(self.node_prefix)
+
+    def keeps_subject(self, subject: str) -> bool:
+        if (self.include_subjects and subject not in self.include_subjects) or subject in self.exclude_subjects:
+            self.skipped_subjects += 1
+            return False
+        return True
+
+    def keeps_predicate(self, predicate: str) -> bool:
+        if (self.include_predicates and predicate not in self.include_predicates) \
+                or predicate in self.exclude_predicates:
+            self.skipped_statements += 1
+            return False
+        return True
+
+    def keeps_literal(self, token: str) -> bool:
+        language = literal_language(token)
+        if language is None:
+            return True
+        if (self.include_languages and language not in self.include_languages) \
+                or language in self.exclude_languages:
+            self.skipped_literals += 1
+            return False
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        return {'skipped_subjects': self.skipped_subjects, 'skipped_statements': self.skipped_statements,
+                'skipped_literals': self.skipped_literals}
+
+    def add_counts(self, counts: Dict[str, int]):
+        """
+        Accumulate the counters of another filter, e.g. a copy used by a worker process.
+        """
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def print_report(self):
+        print(f"Filter skipped {self.skipped_subjects} subjects, {self.skipped_statements} statements "
+              f"and {self.skipped_literals} literals.")
@@ -0,0 +1,130 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Mapping, Set
+
+from ttl_cache import CACHE_VERSION
+
+
+def block_hash(statements: List[List[str]]) -> str:
+    """
+    Digest of a section's statements, as split_by_sections produced them.
+    """
+    # Unit and record separators don't occur in Turtle tokens outside escaped literals
+    text = '\x1e'.join(map('\x1f'.join, statements))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class IncrementalState:
+    """
+    Block hashes and converted rows of the previous run, kept in a JSON file.
+
+    Every section (subjects, statement and value nodes, blank nodes) has its hash;
+    every written subject has its rows as converted text. A state written by a
+    different cache version or with other converter options is ignored, so the
+    next run converts everything.
+    """
+
+    def __init__(self, path: str, options: Mapping):
+        self.path = path
+        # Normalized the way JSON returns it, e.g. tuples as lists
+        self.options = json.loads(json.dumps(options))
+        self.hashes: Dict[str, str] = {}
+        self.rows: Dict[str, str] = {}
+        self.converted = 0
+        self.reused = 0
+
+    @classmethod
+    def load(cls, path: str, options: Mapping) -> 'IncrementalState':
+        state = cls(path, options)
+        try:
+            with open(path, 'r', encoding='utf-8') as state_file:
+                saved = json.load(state_file)
+        except FileNotFoundError:
+            return state
+        if saved.get('version') == CACHE_VERSION and saved.get('options') == state.options:
+            state.hashes = saved['hashes']
+            state.rows = saved['rows']
+        return state
+
+    def save(self):
+        """
+        Replace the state file atomically, so an interrupted run leaves the previous one.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, partial = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as state_file:
+                json.dump({'version': CACHE_VERSION, 'options': self.options,
+                           'hashes': self.hashes, 'rows': self.rows}, state_file)
+            os.replace(partial, self.path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+
+    def print_report(self):
+        print(f"Incremental conversion: {self.converted} subjects converted, {self.reused} reused.")
+
+
+def dirty_subjects(sections: Mapping[str, List[List[str]]], hashes: Mapping[str, str],
+                   previous_hashes: Mapping[str, str], converter) -> Set[str]:
+    """
+    The written subjects whose rows may differ from the previous run's.
+
+    A section is changed when its hash differs or it was added or removed; a
+    subject is dirty when it is changed or reaches a changed section through the
+    triples the converter follows.
+    """
+    changed = [key for key, digest in hashes.items() if previous_hashes.get(key) != digest]
+    changed.extend(key for key in previous_hashes if key not in hashes)
+    if not changed:
+        return set()
+
+    # Followed objects point back to the sections that reference them
+    referrers = defaultdict(list)
+    for subject, statements in sections.items():
+        for triple in statements:
+            if converter.follows(triple):
+                for obj in triple[1:]:
+                    referrers[obj[:-1] if obj.endswith(',') else obj].append(subject)
+
+    seen = set(changed)
+    stack = list(changed)
+    while stack:
+        for subject in referrers.get(stack.pop(), ()):
+            if subject not in seen:
+                seen.add(subject)
+                stack.append(subject)
+    return {subject for subject in seen if subject in sections and not converter.is_node(subject)}
+
+
+def convert_incremental(converter, sections: Mapping[str, List[List[str]]], output_file,
+                        state: IncrementalState, cache=None):
+    """
+    Write the same rows as converter.convert(sections, output_file), converting only
+    the dirty subjects and reusing the state's rows for the others, then update the
+    state to this run.
+    """
+    hashes = {subject: block_hash(statements) for subject, statements in sections.items()}
+    dirty = dirty_subjects(sections, hashes, state.hashes, converter)
+
+    rows = {}
+    for subject in sections:
+        if converter.is_node(subject):
+            continue
+        text = None if subject in dirty else state.rows.get(subject)
+        if text is None:
+            buffer = io.StringIO()
+            converter.convert(sections, buffer, [subject], cache=cache)
+            text = buffer.getvalue()
+            state.converted += 1
+        else:
+            state.reused += 1
+        output_file.write(text)
+        rows[subject] = text
+
+    state.hashes = hashes
+    state.rows = rows
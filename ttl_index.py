@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import mmap
+import struct
+import sys
+from typing import List, Optional, Tuple
+
+from ttl_sink import row_subject
+
+INDEX_MAGIC = b'TTLINDEX'
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.idx'
+
+# magic, version, reserved, entry count
+_HEADER = struct.Struct('<8sIIQ')
+# subject hash, byte offset of the subject's first row, byte offset after its last row
+_ENTRY = struct.Struct('<QQQ')
+
+
+def subject_hash(subject: str) -> int:
+    """
+    Stable 64-bit hash of a subject; Python's hash() is salted per process.
+    """
+    return int.from_bytes(hashlib.blake2b(subject.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+class IndexingSink:
+    """
+    Text sink that records the byte range of each subject's rows while passing
+    the text on to another sink, and writes the ranges as a sidecar index on close.
+
+    The converter writes a subject's rows contiguously, usually in a single call,
+    so a write holding only rows of one subject is recorded without splitting it
+    into lines. A subject written in several separate ranges gets one entry each.
+    """
+
+    def __init__(self, sink, index_path: str):
+        self.sink = sink
+        self.index_path = index_path
+        self.entries: List[Tuple[int, int, int]] = []
+        self._subject: Optional[str] = None
+        self._start = 0
+        self._offset = 0
+
+    def write(self, text: str) -> int:
+        subject = row_subject(text)
+        if subject is not None and text.endswith('\n') \
+                and text.count('\n') == text.count('\n' + subject + ' <') + 1:
+            # The usual case: rows of a single subject
+            self._start_range(subject)
+            self._offset += _byte_length(text)
+        else:
+            lines = text.split('\n')
+            for number, line in enumerate(lines):
+                if number < len(lines) - 1:
+                    line += '\n'
+                elif not line:
+                    break
+                line_subject = row_subject(line)
+                if line_subject is None and line.strip() and not line.startswith('@'):
+                    # The continuation of a multi-line literal
+                    line_subject = self._subject
+                self._start_range(line_subject)
+                self._offset += _byte_length(line)
+        return self.sink.write(text)
+
+    def _start_range(self, subject: Optional[str]):
+        if subject != self._subject:
+            self._close_range()
+            self._subject = subject
+            self._start = self._offset
+
+    def _close_range(self):
+        if self._subject is not None and self._offset > self._start:
+            self.entries.append((subject_hash(self._subject), self._start, self._offset))
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self._close_range()
+        self.sink.close()
+        self.entries.sort()
+        with open(self.index_path, 'wb') as index_file:
+            index_file.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, len(self.entries)))
+            index_file.write(b''.join(_ENTRY.pack(*entry) for entry in self.entries))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SubjectIndex:
+    """
+    Random access to the rows of a subject in a text output file.
+
+    Both the output and its index are memory-mapped. The index entries are sorted
+    by subject hash, so a lookup is a binary search over the mapped entries and a
+    slice of the mapped output per range; a range whose first row belongs to
+    another subject (a hash collision) is skipped.
+    """
+
+    def __init__(self, output_path: str, index_path: Optional[str] = None):
+        self._files = []
+        self._maps = []
+        self.output = self._map(output_path)
+        self.index = self._map(index_path or output_path + INDEX_SUFFIX)
+        magic, version, _, count = _HEADER.unpack_from(self.index) if len(self.index) >= _HEADER.size \
+            else (b'', 0, 0, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{index_path or output_path + INDEX_SUFFIX} is not a subject index")
+        self.count = count
+
+    def _map(self, path: str):
+        data_file = open(path, 'rb')
+        self._files.append(data_file)
+        if not data_file.seek(0, 2):
+            # An empty file can't be mapped
+            return b''
+        mapped = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def _entry(self, position: int) -> Tuple[int, int, int]:
+        return _ENTRY.unpack_from(self.index, _HEADER.size + position * _ENTRY.size)
+
+    def ranges(self, subject: str) -> List[Tuple[int, int]]:
+        """
+        The byte ranges of the output holding the subject's rows.
+        """
+        key = subject_hash(subject)
+        # Leftmost entry with this hash
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        position = low
+        prefix = (subject + ' <').encode('utf-8')
+        ranges = []
+        while position < self.count:
+            entry_hash, start, end = self._entry(position)
+            if entry_hash != key:
+                break
+            if self.output[start:start + len(prefix)] == prefix:
+                ranges.append((start, end))
+            position += 1
+        return ranges
+
+    def rows(self, subject: str) -> str:
+        """
+        The subject's rows as they appear in the output, or an empty string.
+        """
+        return ''.join(str(self.output[start:end], 'utf-8') for start, end in self.ranges(subject))
+
+    def __contains__(self, subject: str) -> bool:
+        return bool(self.ranges(subject))
+
+    def close(self):
+        for mapped in self._maps:
+            mapped.close()
+        for data_file in self._files:
+            data_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the rows of subjects from an indexed output file.")
+    parser.add_argument('output', help="Output file written with --index")
+    parser.add_argument('subjects', nargs='+', help="Subjects to look up, e.g. wd:Q937")
+    parser.add_argument('--index', help=f"Index file (default: the output file name plus {INDEX_SUFFIX})")
+    args = parser.parse_args()
+
+    with SubjectIndex(args.output, args.index) as index:
+        for subject in args.subjects:
+            rows = index.rows(subject)
+            if not rows:
+                print(f"{subject} not found.", file=sys.stderr)
+            sys.stdout.write(rows)
+
+
+if __name__ == "__main__":
+    main()
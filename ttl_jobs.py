@@ -0,0 +1,190 @@
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional
+
+COPY_CHUNK_SIZE = 1 << 20
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue already holds max_queued jobs.
+    """
+
+
+class Job:
+    """
+    A conversion job and its progress, updated by the worker running it.
+    """
+
+    def __init__(self, job_id: str, filename: str, input_path: str, result_path: str):
+        self.id = job_id
+        self.filename = filename
+        self.input_path = input_path
+        self.result_path = result_path
+        self.status = QUEUED
+        self.bytes_total = 0
+        self.bytes_processed = 0
+        self.triples_emitted = 0
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'bytes_total': self.bytes_total,
+            'bytes_processed': self.bytes_processed,
+            'triples_emitted': self.triples_emitted,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class ProgressReader:
+    """
+    Binary reader that adds the bytes it returns to a job's bytes_processed.
+    """
+
+    def __init__(self, stream: BinaryIO, job: Job):
+        self.stream = stream
+        self.job = job
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.job.bytes_processed += len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+class JobManager:
+    """
+    Runs conversions in a fixed number of worker threads fed by a bounded queue.
+
+    submit() copies the upload into the job directory and queues it, or raises
+    JobQueueFull when max_queued jobs are already waiting, so the load a server
+    accepts is bounded and excess requests can be refused immediately. run(job)
+    yields the converted text, which is written to the job's result file; every
+    line of it is a converted triple. The newest max_finished finished jobs are
+    kept, older ones are forgotten and their files removed.
+    """
+
+    def __init__(self, run: Callable[[Job], Iterable[str]], directory: str, workers: int = 2,
+                 max_queued: int = 16, max_finished: int = 256):
+        self.run = run
+        self.directory = directory
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Job] = {}
+        self._finished: 'OrderedDict[str, Job]' = OrderedDict()
+        self._queue: queue.Queue = queue.Queue()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f'job-worker-{number}')
+                         for number in range(workers)]
+
+    def start(self):
+        """
+        Clear the job directory and start the workers. Called when the server
+        starts rather than on import, so worker processes never touch the jobs.
+        """
+        # Jobs only live in memory, so files left by a previous server are orphans
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, upload: BinaryIO, filename: str = '') -> Job:
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise JobQueueFull(f"{self._queued} jobs are already queued")
+            # The slot is reserved before the upload is copied, so a full queue is refused cheaply
+            self._queued += 1
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, filename, os.path.join(self.directory, job_id + '.ttl'),
+                  os.path.join(self.directory, job_id + '.txt'))
+        try:
+            with open(job.input_path, 'wb') as input_file:
+                shutil.copyfileobj(upload, input_file, COPY_CHUNK_SIZE)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            self._remove_files(job)
+            raise
+        job.bytes_total = os.path.getsize(job.input_path)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return {'queued': self._queued, 'running': running, 'workers': len(self._threads)}
+
+    def result(self, job: Job) -> Iterator[str]:
+        """
+        The converted text of a finished job, in chunks.
+        """
+        with open(job.result_path, 'r', encoding='utf-8', newline='') as result_file:
+            yield from iter(lambda: result_file.read(COPY_CHUNK_SIZE), '')
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._queued -= 1
+            job.status = RUNNING
+            job.started = time.time()
+            try:
+                with open(job.result_path, 'w', encoding='utf-8', newline='') as result_file:
+                    for chunk in self.run(job):
+                        result_file.write(chunk)
+                        job.triples_emitted += chunk.count('\n')
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished = time.time()
+                self._remove_file(job.input_path)
+                self._retire(job)
+
+    def _retire(self, job: Job):
+        with self._lock:
+            self._finished[job.id] = job
+            while len(self._finished) > self.max_finished:
+                _, old_job = self._finished.popitem(last=False)
+                del self._jobs[old_job.id]
+                self._remove_files(old_job)
+
+    def _remove_files(self, job: Job):
+        self._remove_file(job.input_path)
+        self._remove_file(job.result_path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
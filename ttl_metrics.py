@@ -0,0 +1,224 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; conversions range from milliseconds for one entity to minutes for dumps
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric:
+    """
+    A metric family: one value per combination of label values, updated under a lock.
+
+    Metrics are updated once per request or per streamed chunk, never per row, so a
+    lock per update costs nothing measurable next to the conversion itself.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _labels(self, labelvalues: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = tuple(zip(self.labelnames, labelvalues)) + extra
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            return [f'{self.name} {_format_value(self.function())}']
+        with self._lock:
+            return [f'{self.name}{self._labels(labelvalues)} {_format_value(value)}'
+                    for labelvalues, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount: float = 1, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, amount: float = 1, *labelvalues: str):
+        self.inc(-amount, *labelvalues)
+
+    def set(self, value: float, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    @contextmanager
+    def track(self, *labelvalues: str):
+        """
+        Count the enclosed block as in progress, also when it is a suspended generator.
+        """
+        self.inc(1, *labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(1, *labelvalues)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                # One count per bucket, then the sum of the observed values
+                counts = self._values[labelvalues] = [0] * len(self.buckets) + [0.0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+                    break
+            counts[-1] += value
+
+    def _samples(self) -> List[str]:
+        samples = []
+        with self._lock:
+            for labelvalues, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = self._labels(labelvalues, (('le', _format_value(bound)),))
+                    samples.append(f'{self.name}_bucket{labels} {cumulative}')
+                samples.append(f'{self.name}_sum{self._labels(labelvalues)} {_format_value(counts[-1])}')
+                samples.append(f'{self.name}_count{self._labels(labelvalues)} {cumulative}')
+        return samples
+
+
+class StageTimer:
+    """
+    Adds up the time one conversion spends in each stage and records the totals
+    in a histogram once it ends, so a stage entered per chunk is observed once.
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+
+    def observe(self):
+        for name, total in self.totals.items():
+            self.histogram.observe(total, name)
+        self.totals.clear()
+
+
+class Registry:
+    """
+    The metrics of one server process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+class ConversionMetrics:
+    """
+    The metrics both API servers expose at /metrics.
+
+    Stages are timed per request: split_by_sections (tokenizing and sectioning,
+    which replaced preprocess_ttl), convert_to_new_format, read_upload (reading,
+    decompressing and decoding the upload) and write_response (time the response
+    generator waits while a chunk is sent).
+    """
+
+    def __init__(self, queued: Callable[[], float], cache_hits: Callable[[], float],
+                 cache_misses: Callable[[], float]):
+        self.registry = Registry()
+        register = self.registry.register
+        self.stage_seconds = register(Histogram(
+            'ttl_stage_duration_seconds', 'Time a conversion spent in each stage.', ['stage']))
+        self.requests = register(Counter(
+            'ttl_conversion_requests_total', 'Conversion requests received, by endpoint.', ['endpoint']))
+        self.errors = register(Counter(
+            'ttl_conversion_errors_total', 'Conversions (or batch members) that failed, by endpoint.', ['endpoint']))
+        self.input_bytes = register(Counter(
+            'ttl_input_bytes_total', 'Bytes uploaded for conversion, by endpoint.', ['endpoint']))
+        self.output_bytes = register(Counter(
+            'ttl_output_bytes_total', 'Response bytes sent, by endpoint.', ['endpoint']))
+        self.triples = register(Counter(
+            'ttl_triples_emitted_total', 'Converted triples emitted.'))
+        self.filtered = register(Counter(
+            'ttl_filtered_total', 'Subjects, statements and literals left out by request filters.', ['kind']))
+        self.in_flight = register(Gauge(
+            'ttl_conversions_in_flight', 'Conversions currently running.'))
+        self.queued = register(Gauge(
+            'ttl_jobs_queued', 'Jobs waiting for a worker.', function=queued))
+        register(Counter('ttl_cache_hits_total', 'Result cache hits.', function=cache_hits))
+        register(Counter('ttl_cache_misses_total', 'Result cache misses.', function=cache_misses))
+
+    def timer(self) -> StageTimer:
+        return StageTimer(self.stage_seconds)
+
+    def metered(self, chunks: Iterable[bytes], endpoint: str) -> Iterator[bytes]:
+        """
+        Pass response chunks through, counting their bytes, the time spent sending
+        them and a conversion that fails mid-stream.
+        """
+        write_seconds = 0.0
+        try:
+            for chunk in chunks:
+                self.output_bytes.inc(len(chunk), endpoint)
+                start = time.perf_counter()
+                yield chunk
+                write_seconds += time.perf_counter() - start
+        except Exception:
+            self.errors.inc(1, endpoint)
+            raise
+        finally:
+            self.stage_seconds.observe(write_seconds, 'write_response')
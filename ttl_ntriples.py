@@ -0,0 +1,237 @@
+import os
+import re
+from multiprocessing import Pool
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from ttl_filter import TripleFilter
+from ttl_sink import compression_for_path
+from ttl_tokenizer import TTLSyntaxError
+
+# Formats read line by line; the graph of an N-Quads line is ignored
+LINE_FORMATS = ('ntriples', 'nquads')
+INPUT_FORMATS = ('turtle',) + LINE_FORMATS
+INPUT_FORMAT_EXTENSIONS = {'.nt': 'ntriples', '.nq': 'nquads'}
+
+# Namespaces of the Wikidata dumps, so IRIs get the prefixed names the Turtle dump uses
+WIKIDATA_PREFIXES = {
+    'cc': 'http://creativecommons.org/ns#',
+    'data': 'https://www.wikidata.org/wiki/Special:EntityData/',
+    'owl': 'http://www.w3.org/2002/07/owl#',
+    'p': 'http://www.wikidata.org/prop/',
+    'pq': 'http://www.wikidata.org/prop/qualifier/',
+    'pqn': 'http://www.wikidata.org/prop/qualifier/value-normalized/',
+    'pqv': 'http://www.wikidata.org/prop/qualifier/value/',
+    'pr': 'http://www.wikidata.org/prop/reference/',
+    'prn': 'http://www.wikidata.org/prop/reference/value-normalized/',
+    'prov': 'http://www.w3.org/ns/prov#',
+    'prv': 'http://www.wikidata.org/prop/reference/value/',
+    'ps': 'http://www.wikidata.org/prop/statement/',
+    'psn': 'http://www.wikidata.org/prop/statement/value-normalized/',
+    'psv': 'http://www.wikidata.org/prop/statement/value/',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'ref': 'http://www.wikidata.org/reference/',
+    's': 'http://www.wikidata.org/entity/statement/',
+    'schema1': 'http://schema.org/',
+    'skos': 'http://www.w3.org/2004/02/skos/core#',
+    'v': 'http://www.wikidata.org/value/',
+    'wd': 'http://www.wikidata.org/entity/',
+    'wdno': 'http://www.wikidata.org/prop/novalue/',
+    'wdt': 'http://www.wikidata.org/prop/direct/',
+    'wdtn': 'http://www.wikidata.org/prop/direct-normalized/',
+    'wikibase': 'http://wikiba.se/ontology#',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+}
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+# Datatypes Turtle writes as bare numbers or booleans when the lexical form allows it
+_ABBREVIATED = {
+    'http://www.w3.org/2001/XMLSchema#integer': re.compile(r'[+-]?[0-9]+'),
+    'http://www.w3.org/2001/XMLSchema#decimal': re.compile(r'[+-]?[0-9]*\.[0-9]+'),
+    'http://www.w3.org/2001/XMLSchema#double':
+        re.compile(r'[+-]?(?:[0-9]+\.[0-9]*[eE][+-]?[0-9]+|\.?[0-9]+[eE][+-]?[0-9]+)'),
+    'http://www.w3.org/2001/XMLSchema#boolean': re.compile(r'true|false'),
+}
+
+_IRI = r'<[^>]*>'
+_BLANK_NODE = r'_:[A-Za-z0-9_](?:[A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?'
+_LITERAL = r'"(?:[^"\\]|\\.)*"(?:@[A-Za-z]+(?:-[A-Za-z0-9]+)*|\^\^<[^>]*>)?'
+
+# subject predicate object [graph] . [# comment]
+_LINE_RE = re.compile(
+    rf'[ \t]*({_IRI}|{_BLANK_NODE})[ \t]*({_IRI})[ \t]*({_IRI}|{_BLANK_NODE}|{_LITERAL})'
+    rf'(?:[ \t]*(?:{_IRI}|{_BLANK_NODE}))?[ \t]*\.[ \t]*(?:#.*)?'
+)
+
+# Local names written after a prefix; others keep the full IRI
+_LOCAL_NAME_RE = re.compile(r'(?:[A-Za-z0-9_](?:[A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?)?')
+
+
+def input_format_for_path(path: str) -> str:
+    """
+    The input format implied by a file name, looking past a compression extension.
+    """
+    root, extension = os.path.splitext(path)
+    if compression_for_path(path):
+        extension = os.path.splitext(root)[1]
+    return INPUT_FORMAT_EXTENSIONS.get(extension.lower(), 'turtle')
+
+
+class _Compactor:
+    """
+    Writes N-Triples terms the way the Turtle tokenizer reads them: prefixed names,
+    `a` for rdf:type, abbreviated numbers and `blank-node:` labels.
+    """
+
+    def __init__(self, prefixes: Mapping[str, str]):
+        self.namespaces = {namespace: prefix for prefix, namespace in prefixes.items()}
+        self._iris: Dict[str, str] = {}
+
+    def iri(self, term: str) -> str:
+        name = self._iris.get(term)
+        if name is None:
+            iri = term[1:-1]
+            split = max(iri.rfind('/'), iri.rfind('#')) + 1
+            prefix = self.namespaces.get(iri[:split])
+            if prefix is not None and _LOCAL_NAME_RE.fullmatch(iri, split):
+                name = f'{prefix}:{iri[split:]}'
+            else:
+                name = term
+            self._iris[term] = name
+        return name
+
+    def node(self, term: str) -> str:
+        if term[0] == '_':
+            return 'blank-node:' + term[2:]
+        return self.iri(term)
+
+    def predicate(self, term: str) -> str:
+        return 'a' if term[1:-1] == RDF_TYPE else self.iri(term)
+
+    def object(self, term: str) -> str:
+        if term[0] != '"':
+            return self.node(term)
+        if not term.endswith('>'):
+            return term
+        lexical, _, datatype = term.rpartition('^^')
+        pattern = _ABBREVIATED.get(datatype[1:-1])
+        if pattern is not None and pattern.fullmatch(lexical, 1, len(lexical) - 1):
+            return lexical[1:-1]
+        return f'{lexical}^^{self.iri(datatype)}'
+
+
+def parse_lines(shard: Tuple[str, int, Mapping[str, str], Optional[TripleFilter]]) \
+        -> Tuple[Dict[str, Dict[str, List[str]]], Dict[str, int]]:
+    """
+    The objects of each subject and predicate in a run of N-Triples or N-Quads lines,
+    and the counters of the filter, if any.
+
+    Lines carry no state between them, so any run of whole lines can be parsed on its
+    own; first_line only numbers the lines in error messages. Only literals are filtered
+    here: a subject's triples can be spread over several runs, so its subject and
+    predicates are filtered once the runs are merged.
+    """
+    text, first_line, prefixes, triple_filter = shard
+    triple_filter = triple_filter if triple_filter else None
+    filters_literals = triple_filter is not None and triple_filter.filters_literals
+    compactor = _Compactor(prefixes)
+    match_line = _LINE_RE.fullmatch
+    subjects: Dict[str, Dict[str, List[str]]] = {}
+    for number, line in enumerate(text.split('\n'), start=first_line):
+        match = match_line(line.rstrip('\r'))
+        if match is None:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            raise TTLSyntaxError(f"Not an N-Triples statement: {stripped[:100]!r}", line=number)
+        subject, predicate, obj = match.groups()
+        if filters_literals and obj[0] == '"' and not triple_filter.keeps_literal(obj):
+            continue
+        predicates = subjects.get(subject)
+        if predicates is None:
+            predicates = subjects[subject] = {}
+        objects = predicates.get(predicate)
+        if objects is None:
+            objects = predicates[predicate] = []
+        objects.append(compactor.object(obj))
+
+    # Terms are compacted once per subject and predicate rather than once per line
+    parsed = {compactor.node(subject): {compactor.predicate(predicate): objects
+                                        for predicate, objects in predicates.items()}
+              for subject, predicates in subjects.items()}
+    return parsed, triple_filter.counts() if triple_filter is not None else {}
+
+
+def filter_subjects(subjects: Dict[str, Dict[str, List[str]]],
+                    triple_filter: TripleFilter) -> Dict[str, Dict[str, List[str]]]:
+    """
+    The subjects and predicates the filter keeps; nodes keep all their predicates.
+    """
+    kept = {}
+    for subject, predicates in subjects.items():
+        if triple_filter.is_node(subject):
+            kept[subject] = predicates
+        elif triple_filter.keeps_subject(subject):
+            kept[subject] = {predicate: objects for predicate, objects in predicates.items()
+                             if triple_filter.keeps_predicate(predicate)}
+    return kept
+
+
+def split_lines(text: str, shards: int) -> List[Tuple[str, int]]:
+    """
+    Cut the text into up to shards runs of whole lines, with the number of each run's first line.
+    """
+    runs = []
+    start, first_line = 0, 1
+    for shard in range(1, shards + 1):
+        end = len(text) if shard == shards else text.find('\n', max(len(text) * shard // shards, start))
+        if end == -1:
+            end = len(text)
+        elif end < len(text):
+            end += 1
+        if end > start:
+            runs.append((text[start:end], first_line))
+            first_line += text.count('\n', start, end)
+        start = end
+    return runs
+
+
+def read_ntriples(text: str, workers: int = 1, prefixes: Mapping[str, str] = WIKIDATA_PREFIXES,
+                  triple_filter: Optional[TripleFilter] = None) -> Tuple[Dict[str, List[List[str]]], str]:
+    """
+    Sections and the @prefix header for N-Triples or N-Quads text, like split_by_sections returns
+    for Turtle: every triple of a subject is grouped under it, and the objects of a predicate
+    become the objects of one statement, in the order they appear.
+
+    With several workers, runs of lines are parsed in that many processes and merged in order.
+    A triple_filter drops what it rejects and sums the workers' counters; subjects and
+    predicates are filtered after the merge, so each is counted once however the lines are split.
+    """
+    shards = [(run, first_line, prefixes, triple_filter)
+              for run, first_line in split_lines(text, max(workers, 1))]
+    if len(shards) > 1:
+        with Pool(len(shards)) as pool:
+            results = pool.map(parse_lines, shards)
+        if triple_filter is not None:
+            for _, counts in results:
+                triple_filter.add_counts(counts)
+    else:
+        results = [parse_lines(shard) for shard in shards]
+    parts = [part for part, _ in results]
+
+    merged = parts[0] if parts else {}
+    for part in parts[1:]:
+        for subject, predicates in part.items():
+            target = merged.get(subject)
+            if target is None:
+                merged[subject] = predicates
+                continue
+            for predicate, objects in predicates.items():
+                target.setdefault(predicate, []).extend(objects)
+    if triple_filter is not None:
+        merged = filter_subjects(merged, triple_filter)
+
+    sections = {subject: [[predicate] + objects for predicate, objects in predicates.items()]
+                for subject, predicates in merged.items()}
+    header = "\n".join(f"@prefix {prefix}: <{namespace}> ." for prefix, namespace in sorted(prefixes.items()))
+    return sections, header
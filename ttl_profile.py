@@ -0,0 +1,139 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+# Hot functions of the command line converter, as `module.function`
+CLI_HOT_FUNCTIONS = (
+    'ttl_tokenizer.feed',
+    'ttl_tokenizer._scan',
+    'ttl_tokenizer._finish_block',
+    'ttl_converter.split_by_sections',
+    'ttl_ntriples.parse_lines',
+    'ttl_converter.convert',
+    'ttl_converter.expand',
+    'ttl_converter.splice',
+    'ttl_converter.recursive_conversion',
+    'ttl_converter.add_block',
+    'ttl_incremental.dirty_subjects',
+    'ttl_store.add',
+    'ttl_store.__getitem__',
+)
+
+# Number of functions listed in the cProfile summary, by cumulative time
+CPROFILE_SUMMARY_SIZE = 30
+
+# tracemalloc is process-wide, so profiled conversions run one at a time
+_profiling = threading.Lock()
+
+
+class Profiler:
+    """
+    Time spent in each stage of a conversion and in its hot functions, and its peak memory.
+
+    Stages are timed with stage(); functions are measured by cProfile, which only
+    sees the thread that started the profiler, and hot_functions selects the ones
+    reported. Peak memory is what tracemalloc traced between start() and stop().
+    Both slow the conversion down, so timings are for comparing, not for absolutes.
+    """
+
+    def __init__(self, hot_functions: Iterable[str] = CLI_HOT_FUNCTIONS, trace_memory: bool = True):
+        self.hot_functions = tuple(hot_functions)
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, float] = {}
+        self.peak_memory: Optional[int] = None
+        self._profile: Optional[cProfile.Profile] = None
+
+    def start(self):
+        _profiling.acquire()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _profiling.release()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def functions(self) -> Dict[str, Dict[str, float]]:
+        """
+        Calls, cumulative seconds and own seconds of each hot function that ran.
+        """
+        if self._profile is None:
+            return {}
+        wanted = {}
+        for qualified in self.hot_functions:
+            module, _, name = qualified.rpartition('.')
+            wanted[(module + '.py', name)] = qualified
+
+        functions = {}
+        for (filename, _, name), (_, calls, own, cumulative, _) in pstats.Stats(self._profile).stats.items():
+            qualified = wanted.get((os.path.basename(filename), name))
+            if qualified is None:
+                continue
+            totals = functions.setdefault(qualified, {'calls': 0, 'seconds': 0.0, 'own_seconds': 0.0})
+            totals['calls'] += calls
+            totals['seconds'] += cumulative
+            totals['own_seconds'] += own
+        # In the order they were listed, which follows the pipeline
+        return {qualified: functions[qualified] for qualified in self.hot_functions if qualified in functions}
+
+    def summary(self, limit: int = CPROFILE_SUMMARY_SIZE) -> str:
+        """
+        The cProfile listing of the functions with the most cumulative time.
+        """
+        stream = io.StringIO()
+        pstats.Stats(self._profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def report(self) -> Dict:
+        return {
+            'stages': dict(self.stages),
+            'functions': self.functions(),
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+    def dump(self, path: str):
+        """
+        Write the cProfile statistics, for `python -m pstats` or a viewer like snakeviz.
+        """
+        self._profile.dump_stats(path)
+
+    def print_report(self, file=None):
+        file = file or sys.stdout
+        print("Profile (timings include the profiler's overhead):", file=file)
+        print(f"  {'Stage':<44}{'Seconds':>12}", file=file)
+        for name, seconds in self.stages.items():
+            print(f"  {name:<44}{seconds:>12.3f}", file=file)
+        functions = self.functions()
+        if functions:
+            print(f"  {'Function':<44}{'Calls':>12}{'Seconds':>12}{'Own seconds':>14}", file=file)
+            for name, totals in functions.items():
+                print(f"  {name:<44}{totals['calls']:>12}{totals['seconds']:>12.3f}{totals['own_seconds']:>14.3f}",
+                      file=file)
+        if self.peak_memory is not None:
+            print(f"  Peak traced memory: {self.peak_memory / (1 << 20):.1f} MiB", file=file)
@@ -0,0 +1,163 @@
+import heapq
+import tempfile
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO
+
+from ttl_sink import parse_row, row_subject
+
+# Fields the output can be sorted by
+SORT_KEYS = ('subject', 'chain', 'object')
+
+# Bytes of rows held in memory before they are sorted and spilled as a run
+DEFAULT_MEMORY_BUDGET = 256 << 20
+
+# Estimated bytes a held row takes beyond its characters: the str object and its list slot
+ROW_OVERHEAD = 64
+
+# Spilled runs merged at once; more are first merged into one run, so open files stay bounded
+MAX_OPEN_RUNS = 64
+
+def _subject(row: str) -> str:
+    return row.partition(' ')[0]
+
+
+def _chain(row: str) -> str:
+    parsed = parse_row(row)
+    return parsed[1] if parsed else ''
+
+
+def _object(row: str) -> str:
+    parsed = parse_row(row)
+    return parsed[3] if parsed else row
+
+
+SORT_KEY_FUNCTIONS = {'subject': _subject, 'chain': _chain, 'object': _object}
+
+
+def read_rows(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Rows from lines ending in newlines, joining the continuation lines of multi-line literals.
+    """
+    row = None
+    for line in lines:
+        if row is not None and row_subject(line) is None:
+            row += line
+            continue
+        if row is not None:
+            yield row
+        row = line
+    if row is not None:
+        yield row
+
+
+class SortingSink:
+    """
+    Text sink that writes the rows passed to it to another sink sorted by subject,
+    chain or object, holding at most about memory_budget bytes of rows.
+
+    Rows are collected until the budget is reached, then sorted and spilled to a
+    temporary file as a run; on close the runs and the rows still held are merged
+    with a k-way merge and written in order. Output that fits the budget is sorted
+    in memory without touching the disk. Sorting is stable: rows with the same key
+    keep the order they were written in, so a subject's rows stay in conversion
+    order when sorting by subject. Lines written before the first row, such as the
+    @prefix header, are passed on unsorted.
+    """
+
+    def __init__(self, sink, key: str = 'subject', memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 directory: Optional[str] = None):
+        if key not in SORT_KEY_FUNCTIONS:
+            raise ValueError(f"Unknown sort key {key!r}, expected one of {', '.join(SORT_KEYS)}")
+        self.sink = sink
+        self.key: Callable[[str], str] = SORT_KEY_FUNCTIONS[key]
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.runs_spilled = 0
+        self._runs: List[TextIO] = []
+        self._rows: List[str] = []
+        self._size = 0
+        self._row: Optional[str] = None
+        self._partial = ''
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line + '\n')
+        return len(text)
+
+    def _add_line(self, line: str):
+        if row_subject(line) is None:
+            if self._row is None:
+                # Still in the header
+                self.sink.write(line)
+            else:
+                self._row += line
+            return
+        if self._row is not None:
+            self._add(self._row)
+        self._row = line
+
+    def writelines(self, lines: Iterable[str]):
+        for line in lines:
+            self.write(line)
+
+    def _add(self, row: str):
+        self._rows.append(row)
+        self._size += len(row) + ROW_OVERHEAD
+        if self._size >= self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        self._rows.sort(key=self.key)
+        self._runs.append(self._write_run(self._rows))
+        self._rows = []
+        self._size = 0
+        if len(self._runs) >= MAX_OPEN_RUNS:
+            runs, self._runs = self._runs, []
+            self._runs.append(self._write_run(self._merge(runs)))
+
+    def _write_run(self, rows: Iterable[str]) -> TextIO:
+        run = tempfile.TemporaryFile('w+', encoding='utf-8', newline='', dir=self.directory)
+        run.writelines(rows)
+        run.seek(0)
+        self.runs_spilled += 1
+        return run
+
+    def _merge(self, runs: List[TextIO], rows: Iterable[str] = ()) -> Iterator[str]:
+        # heapq.merge takes equal keys from the earlier iterable first; runs are in write order
+        try:
+            yield from heapq.merge(*(read_rows(run) for run in runs), rows, key=self.key)
+        finally:
+            for run in runs:
+                run.close()
+
+    def _finish(self):
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ''
+        if self._row is not None:
+            self._add(self._row)
+            self._row = None
+        self._rows.sort(key=self.key)
+        rows, self._rows = self._rows, []
+        for row in self._merge(self._runs, rows) if self._runs else rows:
+            self.sink.write(row)
+        self._runs = []
+
+    def flush(self):
+        # Rows can only be written in order once all of them are known
+        pass
+
+    def close(self):
+        try:
+            self._finish()
+        finally:
+            for run in self._runs:
+                run.close()
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,142 @@
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+from typing import BinaryIO, Optional, TextIO
+
+from ttl_sink import check_compression
+
+# Magic bytes at the start of each compressed format
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+# Decompressed bytes per queue item, and queue items held ahead of the parser
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_QUEUE_SIZE = 8
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """
+    The compression of a stream from its first bytes, or None for plain text.
+    The gzip and xz signatures contain bytes that are not valid at the start of
+    Turtle text; the bz2 one is only accepted with its block size digit.
+    """
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            if compression == 'bz2' and not head[3:4].isdigit():
+                continue
+            return compression
+    return None
+
+
+def _peek(stream: BinaryIO, size: int) -> bytes:
+    if hasattr(stream, 'peek'):
+        return stream.peek(size)[:size]
+    position = stream.tell()
+    head = stream.read(size)
+    stream.seek(position)
+    return head
+
+
+class PipelinedReader(io.RawIOBase):
+    """
+    Binary reader that decompresses its source in a background thread.
+
+    The thread pushes decompressed chunks into a bounded queue, so decompression
+    of the next chunks overlaps with parsing of the current one (zlib, bz2 and lzma
+    release the GIL while they work) and at most queue_size chunks are held ahead.
+    Errors raised by the decompressor are re-raised by read().
+    """
+
+    def __init__(self, source: BinaryIO, compression: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, close_source: bool = False):
+        super().__init__()
+        check_compression(compression)
+        self.source = source
+        self.close_source = close_source
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._chunk = b''
+        self._eof = False
+        self._thread = threading.Thread(target=self._decompress, args=(compression, chunk_size), daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        # Give up once the reader is closed, so an abandoned reader never blocks the thread forever
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decompress(self, compression: str, chunk_size: int):
+        try:
+            with _OPENERS[compression](self.source, 'rb') as decompressed:
+                for chunk in iter(lambda: decompressed.read(chunk_size), b''):
+                    if not self._put(chunk):
+                        return
+            self._put(b'')
+        except Exception as e:
+            self._put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and not self._eof:
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            if item == b'':
+                self._eof = True
+            self._chunk = item
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stopped.set()
+            self._thread.join()
+            if self.close_source:
+                self.source.close()
+        super().close()
+
+
+def open_binary_source(source: BinaryIO, compression: Optional[str] = None, close_source: bool = False,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, queue_size: int = DEFAULT_QUEUE_SIZE) -> BinaryIO:
+    """
+    Wrap a binary stream so reads return decompressed bytes.
+
+    The compression is detected from the magic bytes unless given; plain streams are
+    returned unchanged. Compressed ones are decompressed by a PipelinedReader.
+    """
+    check_compression(compression)
+    compression = compression or detect_compression(_peek(source, 6))
+    if compression is None:
+        return source
+    return io.BufferedReader(PipelinedReader(source, compression, chunk_size, queue_size, close_source),
+                             buffer_size=chunk_size)
+
+
+def open_source(path: str, compression: Optional[str] = None, encoding: str = 'utf-8') -> TextIO:
+    """
+    Open a TTL file for reading as text, decompressing .gz, .bz2 and .xz files on the fly.
+    """
+    source = open(path, 'rb')
+    try:
+        stream = open_binary_source(source, compression, close_source=True)
+    except BaseException:
+        source.close()
+        raise
+    return io.TextIOWrapper(stream, encoding=encoding)
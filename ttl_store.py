@@ -0,0 +1,148 @@
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, List
+
+# Typecode of the id columns: 4-byte unsigned integers
+ID_TYPECODE = 'I'
+
+
+class TripleStore(Mapping):
+    """
+    Interned, column-oriented store of parsed sections.
+
+    Every distinct term is stored once in a term dictionary; each object of a
+    statement becomes one row of integer ids in the subject, predicate, object and
+    position columns. Position is the 1-based index of the object within its
+    statement, so a row with position 1 starts a new statement.
+
+    The store is a read-only Mapping from subject to statements, the same shape as
+    the Dict[str, List[List[str]]] built by split_by_sections, so it can be passed
+    directly to convert_and_write_to_file. Statements without objects are dropped,
+    as they produce no output. A subject added again, as when it opens several
+    blocks, gets the new statements after its earlier ones.
+    """
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.subjects = array(ID_TYPECODE)
+        self.predicates = array(ID_TYPECODE)
+        self.objects = array(ID_TYPECODE)
+        self.positions = array(ID_TYPECODE)
+        self._block_starts = array(ID_TYPECODE)
+        self._blocks: Dict[int, int] = {}
+        # Later blocks of repeated subjects, which are rare, by subject id
+        self._more_blocks: Dict[int, List[int]] = {}
+
+    def intern(self, term: str) -> int:
+        """
+        Return the id of a term, adding it to the term dictionary if needed.
+        """
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.term_ids[term] = term_id
+        return term_id
+
+    def add(self, subject: str, statements: List[List[str]]):
+        """
+        Append the statements of a subject, after those of earlier blocks of the same subject.
+        """
+        subject_id = self.intern(subject)
+        block = len(self._block_starts)
+        if subject_id in self._blocks:
+            self._more_blocks.setdefault(subject_id, []).append(block)
+        else:
+            self._blocks[subject_id] = block
+        self._block_starts.append(len(self.objects))
+        for statement in statements:
+            predicate_id = self.intern(statement[0])
+            for position, obj in enumerate(statement[1:], start=1):
+                self.subjects.append(subject_id)
+                self.predicates.append(predicate_id)
+                self.objects.append(self.intern(obj))
+                self.positions.append(position)
+
+    def update(self, sections: Mapping):
+        """
+        Append every subject of a sections mapping.
+        """
+        for subject, statements in sections.items():
+            self.add(subject, statements)
+
+    def __getitem__(self, subject: str) -> List[List[str]]:
+        subject_id = self.term_ids.get(subject, -1)
+        block = self._blocks.get(subject_id)
+        if block is None:
+            raise KeyError(subject)
+        statements = []
+        self._add_block_statements(block, statements)
+        for block in self._more_blocks.get(subject_id, ()):
+            self._add_block_statements(block, statements)
+        return statements
+
+    def _add_block_statements(self, block: int, statements: List[List[str]]):
+        start = self._block_starts[block]
+        end = self._block_starts[block + 1] if block + 1 < len(self._block_starts) else len(self.objects)
+
+        terms = self.terms
+        for predicate_id, object_id, position in zip(self.predicates[start:end], self.objects[start:end],
+                                                     self.positions[start:end]):
+            if position == 1:
+                statements.append([terms[predicate_id]])
+            statements[-1].append(terms[object_id])
+
+    def __contains__(self, subject) -> bool:
+        return self.term_ids.get(subject, -1) in self._blocks
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.terms[subject_id] for subject_id in self._blocks)
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def memory_report(self) -> Dict[str, float]:
+        """
+        Approximate memory held by the store, in bytes, and per stored triple.
+        """
+        columns = (self.subjects, self.predicates, self.objects, self.positions, self._block_starts)
+        column_bytes = sum(sys.getsizeof(column) for column in columns)
+        term_bytes = sys.getsizeof(self.terms) + sum(sys.getsizeof(term) for term in self.terms)
+        index_bytes = sys.getsizeof(self.term_ids) + sys.getsizeof(self._blocks) + sys.getsizeof(self._more_blocks)
+        total = column_bytes + term_bytes + index_bytes
+        triples = len(self.objects)
+        return {
+            'triples': triples,
+            'terms': len(self.terms),
+            'column_bytes': column_bytes,
+            'term_bytes': term_bytes,
+            'index_bytes': index_bytes,
+            'total_bytes': total,
+            'bytes_per_triple': total / triples if triples else 0.0,
+        }
+
+
+def sections_memory_report(sections: Dict[str, List[List[str]]]) -> Dict[str, float]:
+    """
+    The same report for the Dict[str, List[List[str]]] representation, for comparison.
+    Strings shared between statements are counted once.
+    """
+    seen = set()
+    total = sys.getsizeof(sections)
+    triples = 0
+    for subject, statements in sections.items():
+        total += sys.getsizeof(statements)
+        for term in [subject] + [term for statement in statements for term in statement]:
+            if id(term) not in seen:
+                seen.add(id(term))
+                total += sys.getsizeof(term)
+        for statement in statements:
+            total += sys.getsizeof(statement)
+            triples += len(statement) - 1
+    return {
+        'triples': triples,
+        'total_bytes': total,
+        'bytes_per_triple': total / triples if triples else 0.0,
+    }
@@ -0,0 +1,364 @@
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from ttl_filter import TripleFilter
+
+# A parsed subject block: (subject, statements, blank-node sections found inside the block)
+Block = Tuple[str, List[List[str]], Dict[str, List[List[str]]]]
+
+# String literal forms: long strings first so `"""` is never read as an empty short string
+_STRING = '|'.join((
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""',
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''",
+    r'"(?:[^"\\\n]|\\.)*"(?!")',
+    r"'(?:[^'\\\n]|\\.)*'(?!')",
+))
+
+# One alternation per lexer state. Leading whitespace is folded into every match so the
+# scanner touches each character once; `error` catches anything no other state accepts.
+_TOKEN_RE = re.compile(r'''
+    \s*
+    (?:
+        (?P<comment>\#[^\n]*)
+      | (?P<literal>(?:''' + _STRING + r''')(?:@[A-Za-z0-9-]+|\^\^(?:<[^>\s]*>|[^\s;,\[\]"'<>\#]*))?)
+      | (?P<iri><[^>\s]*>)
+      | (?P<punct>[;,\[\]])
+      | (?P<word>[^\s;,\[\]"'<>\#]+)
+      | (?P<error>\S)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+
+class TTLSyntaxError(ValueError):
+    """
+    Raised when the input cannot be tokenized as Turtle.
+
+    line and column (1-based, in characters) and offset (0-based, in UTF-8 bytes
+    of the text given to the tokenizer) locate the error when they are known.
+    """
+
+    def __init__(self, message: str, line: Optional[int] = None, column: Optional[int] = None,
+                 offset: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+        self.column = column
+        self.offset = offset
+
+    def __str__(self) -> str:
+        if self.line is None:
+            return self.message
+        position = f"line {self.line}"
+        if self.column is not None:
+            position += f", column {self.column}"
+        if self.offset is not None:
+            position += f" (byte offset {self.offset})"
+        return f"{self.message} at {position}"
+
+
+class TTLTokenizer:
+    """
+    Incremental single-pass Turtle lexer.
+
+    Text is fed in arbitrary chunks; every call returns the subject blocks whose
+    terminating period has been seen. Quotes, escapes, long strings, <IRI>s, `#`
+    comments and `[ ]` nesting are tracked in the same scan, so each character is
+    examined once regardless of document size.
+
+    Blank nodes get deterministic labels derived from the block subject, the
+    number of the block among the blocks of that subject and their closing order,
+    `blank-node:<subject>-<occurrence>-<n>`, so identical input always produces
+    identical sections and a subject repeated in several blocks never reuses a
+    label. Blocks whose subject is itself a blank node are numbered instead;
+    label_prefix keeps the labels apart when several tokenizers parse parts of
+    one document. With max_tracked_subjects, only the subjects of that many of
+    the latest blocks holding blank nodes are counted, so the count doesn't grow
+    with the document; a subject seen again after that is numbered from 1 again,
+    which a streaming caller makes harmless by tracking more subjects than it lets
+    wait before writing them.
+
+    Structural errors (an unexpected character, a string left open on its line,
+    unbalanced brackets) raise TTLSyntaxError with the error's position as soon
+    as the chunk holding them is fed, so malformed input is rejected without
+    reading the rest of it.
+
+    With a triple_filter, a rejected subject or predicate skips the rest of its
+    block or statement: its tokens are scanned but never stored, and neither are
+    its blank nodes. Rejected literals are dropped on their own.
+    """
+
+    def __init__(self, label_prefix: str = "", triple_filter: Optional[TripleFilter] = None,
+                 max_tracked_subjects: Optional[int] = None):
+        self.prefixes: List[str] = []
+        self.label_prefix = label_prefix
+        # A filter without patterns keeps everything, so it isn't consulted at all
+        self.triple_filter = triple_filter if triple_filter else None
+        self._skipping: Optional[str] = None
+        self._filter_predicates = False
+        if self.triple_filter is not None:
+            self._add_token = self._add_filtered_token
+        self._buffer = ""
+        self._stack: List[List[List[str]]] = [[[]]]
+        # Where each open '[' is, for the error if it is never closed: its index in the
+        # buffer while that is scanned, then its (line, column, offset)
+        self._brackets: List[Union[int, Tuple[int, int, int]]] = []
+        self._blank_nodes: Dict[str, List[List[str]]] = {}
+        self._anonymous_blocks = 0
+        # Blocks seen per subject, least recently seen first; only subjects whose blocks
+        # hold blank nodes are counted
+        self._occurrences: OrderedDict = OrderedDict()
+        self.max_tracked_subjects = max_tracked_subjects
+        self._block_anchor = ""
+        # Position of the start of the buffer in the text fed so far
+        self._line = 1
+        self._column = 0
+        self._offset = 0
+
+    def feed(self, text: str) -> List[Block]:
+        """
+        Consume a chunk of text and return the blocks completed by it.
+        """
+        self._buffer += text
+        # Tokens never span lines (long strings are retried below), so only scan whole lines
+        end = self._buffer.rfind('\n') + 1
+        return self._scan(end, final=False) if end else []
+
+    def close(self) -> List[Block]:
+        """
+        Flush the remaining input. A missing final period is tolerated.
+        """
+        blocks = self._scan(len(self._buffer), final=True)
+        if len(self._stack) > 1:
+            raise TTLSyntaxError("Unbalanced '[': blank node is never closed", *self._brackets[-1])
+        block = self._finish_block()
+        if block:
+            blocks.append(block)
+        return blocks
+
+    def _scan(self, end: int, final: bool) -> List[Block]:
+        buffer = self._buffer
+        blocks = []
+        pos = end
+        match = None
+        try:
+            for match in _TOKEN_RE.finditer(buffer, 0, end):
+                kind = match.lastgroup
+                if kind == 'word':
+                    token = match.group(kind)
+                    if token.endswith('.'):
+                        # A trailing period ends the block; prefixed names and numbers can't end with one
+                        token = token.rstrip('.')
+                        if token:
+                            self._add_token(token)
+                        block = self._end_of_block()
+                        if block:
+                            blocks.append(block)
+                    else:
+                        self._add_token(token)
+                elif kind == 'literal':
+                    token = match.group(kind)
+                    if token.endswith('.'):
+                        # Only a prefixed datatype can absorb the block's period
+                        self._add_token(token.rstrip('.'))
+                        block = self._end_of_block()
+                        if block:
+                            blocks.append(block)
+                    else:
+                        self._add_token(token)
+                elif kind == 'iri':
+                    self._add_token(match.group(kind))
+                elif kind == 'punct':
+                    self._punctuation(match.group(kind), match.start(kind))
+                elif kind == 'error':
+                    start = match.start(kind)
+                    if not final and buffer.startswith(('"""', "'''"), start):
+                        # A long string continuing on the next lines: wait for more input
+                        pos = start
+                        break
+                    if buffer[start] in '"\'':
+                        # A short string can't span lines, so more input can't close it
+                        raise TTLSyntaxError("Unterminated string")
+                    raise TTLSyntaxError(f"Unexpected character {buffer[start]!r}")
+        except TTLSyntaxError as error:
+            if error.line is not None:
+                raise
+            raise self._error(error.message, buffer, match.start(match.lastgroup)) from None
+        # The buffer is about to be dropped, so locate the brackets still open in it
+        for i, bracket in enumerate(self._brackets):
+            if isinstance(bracket, int):
+                self._brackets[i] = self._position(buffer, bracket)
+        self._advance(buffer, pos)
+        self._buffer = buffer[pos:]
+        return blocks
+
+    def _advance(self, buffer: str, pos: int):
+        # Move the buffer's position past buffer[:pos], which is about to be dropped
+        newlines = buffer.count('\n', 0, pos)
+        if newlines:
+            self._line += newlines
+            self._column = pos - buffer.rfind('\n', 0, pos) - 1
+        else:
+            self._column += pos
+        self._offset += pos if buffer.isascii() else len(buffer[:pos].encode('utf-8', 'surrogatepass'))
+
+    def _position(self, buffer: str, index: int) -> Tuple[int, int, int]:
+        # Locate buffer[index] in the text fed so far
+        line_start = buffer.rfind('\n', 0, index) + 1
+        column = index - line_start + 1 + (self._column if line_start == 0 else 0)
+        offset = self._offset + len(buffer[:index].encode('utf-8', 'surrogatepass'))
+        return self._line + buffer.count('\n', 0, index), column, offset
+
+    def _error(self, message: str, buffer: str, index: int) -> TTLSyntaxError:
+        return TTLSyntaxError(message, *self._position(buffer, index))
+
+    def _add_token(self, token: str):
+        statement = self._stack[-1][-1]
+        statement.append(token)
+        # SPARQL-style PREFIX/BASE directives have no terminating period
+        if len(self._stack) == 1 and len(self._stack[0]) == 1 and statement[0] in ('PREFIX', 'BASE'):
+            if len(statement) == (3 if statement[0] == 'PREFIX' else 2):
+                self.prefixes.append(f"@{statement[0].lower()} {' '.join(statement[1:])} .")
+                self._stack[0] = [[]]
+
+    def _add_filtered_token(self, token: str):
+        # Replaces _add_token when there is a filter, so unfiltered parsing pays nothing for it
+        if self._skipping or not self._keeps(token, self._stack[-1][-1]):
+            return
+        TTLTokenizer._add_token(self, token)
+
+    def _keeps(self, token: str, statement: List[str]) -> bool:
+        triple_filter = self.triple_filter
+        if len(self._stack) == 1:
+            first = len(self._stack[0]) == 1
+            if first and not statement:
+                # The block's subject; directives and nodes are never filtered
+                self._filter_predicates = False
+                if token[0] == '@' or token in ('PREFIX', 'BASE') or triple_filter.is_node(token):
+                    return True
+                if not triple_filter.keeps_subject(token):
+                    self._skipping = 'block'
+                    return False
+                self._filter_predicates = True
+                return True
+            if self._filter_predicates and len(statement) == (1 if first else 0):
+                if not triple_filter.keeps_predicate(token):
+                    self._skipping = 'statement'
+                    return False
+                return True
+        if triple_filter.filters_literals and token[0] in '"\'':
+            return triple_filter.keeps_literal(token)
+        return True
+
+    def _punctuation(self, char: str, index: int):
+        if char == ';':
+            if self._skipping == 'statement' and len(self._stack) == 1:
+                self._skipping = None
+            self._stack[-1].append([])
+        elif char == '[':
+            self._stack.append([[]])
+            self._brackets.append(index)
+        elif char == ']':
+            if len(self._stack) == 1:
+                raise TTLSyntaxError("Unbalanced ']' outside of a blank node")
+            statements = [statement for statement in self._stack.pop() if statement]
+            self._brackets.pop()
+            if self._skipping:
+                return
+            label = self._blank_node_label()
+            self._blank_nodes[label] = statements
+            self._stack[-1][-1].append(label)
+        # ',' only separates objects; tokens already delimit them
+
+    def _blank_node_label(self) -> str:
+        if not self._blank_nodes:
+            # The block's first blank node fixes the anchor of all of its labels
+            block_statement = self._stack[0][0]
+            if block_statement:
+                anchor = block_statement[0]
+                if anchor.startswith("blank-node:"):
+                    anchor = anchor[len("blank-node:"):]
+                occurrence = self._occurrences.pop(anchor, 0) + 1
+                self._occurrences[anchor] = occurrence
+                if self.max_tracked_subjects is not None and len(self._occurrences) > self.max_tracked_subjects:
+                    self._occurrences.popitem(last=False)
+            else:
+                # The subject is the blank node being closed (or contains it)
+                self._anonymous_blocks += 1
+                anchor = f"_{self._anonymous_blocks}"
+                occurrence = 1
+            self._block_anchor = f"{self.label_prefix}{anchor}-{occurrence}"
+        return f"blank-node:{self._block_anchor}-{len(self._blank_nodes) + 1}"
+
+    def _end_of_block(self):
+        if len(self._stack) > 1:
+            raise TTLSyntaxError("Period inside a blank node")
+        return self._finish_block()
+
+    def _finish_block(self):
+        statements = [statement for statement in self._stack[0] if statement]
+        blank_nodes = self._blank_nodes
+        self._stack = [[[]]]
+        self._blank_nodes = {}
+        self._skipping = None
+        self._filter_predicates = False
+        if not statements:
+            return None
+
+        first = statements[0]
+        if first[0] in ('@prefix', '@base'):
+            self.prefixes.append(' '.join(first) + ' .')
+            return None
+
+        subject = first[0]
+        statements[0] = first[1:]
+        if self.triple_filter is not None:
+            # Statements whose objects were all filtered out
+            return subject, [statement for statement in statements if len(statement) > 1], blank_nodes
+        return subject, [statement for statement in statements if statement], blank_nodes
+
+
+def tokenize(ttl_text: str, label_prefix: str = "",
+             triple_filter: Optional[TripleFilter] = None) -> Tuple[List[Block], List[str]]:
+    """
+    Tokenize a complete document into subject blocks and prefix directives.
+    """
+    tokenizer = TTLTokenizer(label_prefix, triple_filter)
+    blocks = tokenizer.feed(ttl_text)
+    blocks.extend(tokenizer.close())
+    return blocks, tokenizer.prefixes
+
+
+# A period closing a line, followed by a line that starts in column 0 with a term
+_BOUNDARY_RE = re.compile(r'\.[ \t]*\r?\n(?=[^\s#])')
+
+
+def find_block_boundaries(ttl_text: str, shards: int) -> List[int]:
+    """
+    Find up to shards - 1 offsets where the text can be cut between subject blocks.
+
+    Candidates are searched from evenly spaced targets with a C-level regex, so the
+    document is not tokenized. A short string, IRI or comment can't contain a line
+    break, and a blank node can't contain a block period, so a line-final period
+    is a block end unless it sits in a comment line or inside a long string.
+    """
+    boundaries = []
+    # Long-string quotes seen before counted_to; candidates only move forward, so the
+    # parity is carried on rather than recounted from the start of the text
+    counted_to = double_quotes = single_quotes = 0
+    for shard in range(1, shards):
+        start = max(len(ttl_text) * shard // shards, boundaries[-1] if boundaries else 0)
+        for match in _BOUNDARY_RE.finditer(ttl_text, start):
+            line_start = ttl_text.rfind('\n', 0, match.start()) + 1
+            if ttl_text[line_start:match.start()].lstrip().startswith('#'):
+                continue
+            # Counted ranges end at a period, so no run of quotes is split between two of them
+            double_quotes += ttl_text.count('"""', counted_to, match.start())
+            single_quotes += ttl_text.count("'''", counted_to, match.start())
+            counted_to = match.start()
+            if double_quotes % 2 or single_quotes % 2:
+                continue
+            if match.end() not in boundaries:
+                boundaries.append(match.end())
+            break
+    return boundaries